@@ -2,16 +2,65 @@
 AMS Bypass Web Query Application
 Main Flask application
 """
-from flask import Flask, render_template, request, flash, redirect, url_for, jsonify
-from datetime import datetime, timedelta
+from flask import (Flask, render_template, request, flash, redirect, url_for, jsonify, make_response, send_file,
+                   send_from_directory, abort, Response, stream_with_context, get_flashed_messages, g)
+from jinja2 import FileSystemBytecodeCache
+from werkzeug.security import safe_join
+from datetime import datetime, timedelta, timezone
+import hmac
+import os
+import time
 import traceback
 from config import Config
-from utils.db import init_db_pool, execute_query, count_query, test_connection
-from utils.parser import parse_json_data
+from utils.db import (init_db_pool, execute_query, range_validator,
+                      estimate_query_rows, fetch_records_after, initial_cursor,
+                      fetch_fleet_records_after, initial_fleet_cursors, test_connection,
+                      fetch_fleet_record_ids_between, fetch_records_by_ids,
+                      cancel_query, is_cancelled, QueryCancelled, PoolExhausted,
+                      start_query_capture, stop_query_capture, explain_analyze)
+from utils.parser import build_table_rows, build_table_rows_parallel
+from utils.cache import ResultCache, make_etag
+from utils.admission import AdmissionController, AdmissionRejected, range_width_hours
+from utils.timestamps import get_timezone, is_valid_timezone, local_to_utc
+from utils.assets import asset_digest, hashed_filename, split_hashed_filename
+from utils.profiling import SamplingProfiler, SlowRequestStore, summarize_profile
+from utils.changes import ChangeTracker
 
 app = Flask(__name__)
 app.config.from_object(Config)
 
+# Compiled templates survive restarts (skips Jinja compilation on cold start)
+if Config.TEMPLATE_BYTECODE_CACHE_DIR:
+    os.makedirs(Config.TEMPLATE_BYTECODE_CACHE_DIR, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(Config.TEMPLATE_BYTECODE_CACHE_DIR)
+
+# Processed rows for closed (historical) search ranges
+result_cache = ResultCache(
+    max_entries=Config.HISTORICAL_CACHE_MAX_ENTRIES,
+    max_rows=Config.HISTORICAL_CACHE_MAX_ROWS
+)
+
+# Limits concurrent heavy (wide range) searches
+search_admission = AdmissionController(
+    max_concurrent=Config.HEAVY_SEARCH_MAX_CONCURRENT,
+    max_queue=Config.HEAVY_SEARCH_MAX_QUEUE,
+    queue_timeout=Config.HEAVY_SEARCH_QUEUE_TIMEOUT
+)
+
+# Slow-request capture for the query-heavy endpoints (browsable at /admin/slow-requests)
+SLOW_REQUEST_ENDPOINTS = ('search', 'search_api', 'realtime_api', 'fleet_realtime_api')
+request_profiler = SamplingProfiler(interval=Config.PROFILE_SAMPLE_INTERVAL_MS / 1000.0)
+slow_requests = SlowRequestStore(Config.SLOW_REQUEST_DIR, max_entries=Config.SLOW_REQUEST_MAX_ENTRIES)
+
+# Last-sent tag values of change-only RealTime clients
+change_tracker = ChangeTracker(
+    max_streams=Config.REALTIME_CHANGE_MAX_STREAMS,
+    max_tags=Config.REALTIME_CHANGE_MAX_TAGS,
+    max_entries=Config.REALTIME_CHANGE_MAX_ENTRIES,
+    keyframe_seconds=Config.REALTIME_KEYFRAME_SECONDS,
+    deadband=Config.REALTIME_DEADBAND
+)
+
 
 def validate_inputs(ship_id, from_date, to_date):
     """
@@ -69,6 +118,287 @@ def validate_inputs(ship_id, from_date, to_date):
     return True, None
 
 
+def get_request_timezone():
+    """
+    Get the time zone name the request's local date/times are in
+
+    Order: 'tz' request value, 'tz' cookie (set by the search page from the
+    browser's zone), Config.DISPLAY_TIMEZONE. Unknown names are ignored.
+
+    Returns:
+        IANA zone name, or '' for the server's zone
+    """
+    for name in (request.values.get('tz'), request.cookies.get('tz'), Config.DISPLAY_TIMEZONE):
+        name = (name or '').strip()
+        if name and is_valid_timezone(name):
+            return name
+    return ''
+
+
+def convert_local_to_utc(date_str, tz_name=''):
+    """
+    Convert a datetime-local value (user local time) to UTC
+
+    Args:
+        date_str: Date string in YYYY-MM-DDTHH:MM (converted) or YYYY-MM-DD (returned as-is)
+        tz_name: Zone the value is in (default: server zone), DST is applied per value
+
+    Returns:
+        UTC date string in the same format
+    """
+    if not date_str or 'T' not in date_str:
+        return date_str
+
+    try:
+        # Parse as local time
+        local_dt = datetime.strptime(date_str, '%Y-%m-%dT%H:%M')
+        utc_dt = local_to_utc(local_dt, get_timezone(tz_name))
+        return utc_dt.strftime('%Y-%m-%dT%H:%M')
+    except Exception as e:
+        app.logger.warning(f"Error converting {date_str} to UTC: {e}")
+        return date_str
+
+
+def is_historical_window(to_date_utc):
+    """
+    Check whether a search range is closed (To Date is safely in the past)
+
+    Args:
+        to_date_utc: To Date in UTC (YYYY-MM-DDTHH:MM or YYYY-MM-DD)
+
+    Returns:
+        True if no new records are expected inside the range
+    """
+    if not to_date_utc:
+        return False
+
+    try:
+        if 'T' in to_date_utc:
+            range_end = datetime.strptime(to_date_utc, '%Y-%m-%dT%H:%M') + timedelta(minutes=1)
+        else:
+            range_end = datetime.strptime(to_date_utc, '%Y-%m-%d') + timedelta(days=1)
+    except ValueError:
+        return False
+
+    settle = timedelta(seconds=Config.HISTORICAL_SETTLE_SECONDS)
+    now_utc = datetime.now(timezone.utc).replace(tzinfo=None)
+    return range_end + settle <= now_utc
+
+
+def get_search_validator(ship_id, from_date_utc, to_date_utc):
+    """
+    Get the change validator for a closed (historical) search range
+
+    Returns:
+        Validator dictionary from range_validator, or None for open ranges
+    """
+    if not is_historical_window(to_date_utc):
+        return None
+    
+    return range_validator(
+        ship_id=ship_id,
+        interface_id=None,
+        from_date=from_date_utc,
+        to_date=to_date_utc
+    )
+
+
+def is_heavy_search(ship_id, from_date_utc, to_date_utc):
+    """
+    Estimate whether a search is heavy (needs an admission slot)
+
+    Uses the planner's row estimate when HEAVY_SEARCH_COST_SOURCE is 'explain',
+    otherwise (or if EXPLAIN fails) the width of the date range.
+    """
+    if Config.HEAVY_SEARCH_COST_SOURCE == 'explain':
+        try:
+            estimated_rows = estimate_query_rows(
+                ship_id=ship_id,
+                interface_id=None,
+                from_date=from_date_utc,
+                to_date=to_date_utc
+            )
+            return estimated_rows >= Config.HEAVY_SEARCH_ROW_ESTIMATE
+        except Exception as e:
+            app.logger.warning(f"EXPLAIN cost estimate failed, using range width: {e}")
+    
+    return range_width_hours(from_date_utc, to_date_utc) >= Config.HEAVY_SEARCH_RANGE_HOURS
+
+
+def note_request_stats(**values):
+    """Record per-request figures (records, rows, parse time) for slow-request captures"""
+    if 'capture_started' in g:
+        g.setdefault('request_stats', {}).update(values)
+
+
+def load_search_rows(ship_id, from_date_utc, to_date_utc, validator=None, cancel_token=None):
+    """
+    Load and process all table rows for a search range
+
+    When a validator is given (closed range), rows are served from the result
+    cache as long as the range is unchanged. Heavy searches run under admission
+    control and can be cancelled with cancel_token.
+
+    Returns:
+        List of table row dictionaries
+
+    Raises:
+        AdmissionRejected: Too many heavy searches are running
+        QueryCancelled: The search was cancelled (client left)
+    """
+    cache_key = (ship_id, from_date_utc, to_date_utc)
+    
+    if validator is not None:
+        cached_rows = result_cache.get(cache_key, validator)
+        if cached_rows is not None:
+            app.logger.info(f"Result cache hit: ship_id={ship_id}, {from_date_utc} - {to_date_utc} (UTC)")
+            note_request_stats(cache='hit')
+            return cached_rows
+    
+    heavy = is_heavy_search(ship_id, from_date_utc, to_date_utc)
+    with search_admission.admit(heavy=heavy):
+        # Get all records (with reasonable limit for safety)
+        # Use UTC times for query
+        all_records = execute_query(
+            ship_id=ship_id,
+            interface_id=None,  # Interface ID removed
+            from_date=from_date_utc,
+            to_date=to_date_utc,
+            limit=10000,  # Safety limit
+            offset=0,
+            cancel_token=cancel_token
+        )
+        app.logger.info(f"Query returned {len(all_records)} records (heavy={heavy})")
+        
+        # Don't spend CPU parsing for a client that already left
+        if is_cancelled(cancel_token):
+            raise QueryCancelled(f"Search {cancel_token} was cancelled")
+        
+        parse_started = time.perf_counter()
+        all_table_rows = build_table_rows_parallel(
+            all_records,
+            threshold=Config.PARSE_PARALLEL_THRESHOLD,
+            chunk_size=Config.PARSE_CHUNK_SIZE,
+            max_workers=Config.PARSE_WORKERS
+        )
+        note_request_stats(cache='miss', heavy=heavy, records=len(all_records),
+                           parse_ms=round((time.perf_counter() - parse_started) * 1000, 1))
+    
+    if validator is not None:
+        result_cache.put(cache_key, validator, all_table_rows)
+    
+    return all_table_rows
+
+
+def canonical_request_path():
+    """Request path and query string without per-request parameters (used for ETags)"""
+    args = sorted((key, value) for key, value in request.args.items(multi=True) if key != 'request_token')
+    return request.path + '?' + '&'.join(f"{key}={value}" for key, value in args)
+
+
+def validator_headers(validator, *etag_parts):
+    """
+    Build (etag, last_modified) for a closed range response
+
+    Returns:
+        (None, None) if the range is not cacheable
+    """
+    if validator is None:
+        return None, None
+
+    etag = make_etag(*etag_parts, validator.get('max_id'), validator.get('total'))
+    last_modified = validator.get('last_modified')
+    if isinstance(last_modified, datetime):
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        last_modified = last_modified.replace(microsecond=0)
+    else:
+        last_modified = None
+    return etag, last_modified
+
+
+def is_not_modified(etag, last_modified):
+    """Check conditional GET headers against the current validator"""
+    if etag is None or request.method != 'GET':
+        return False
+    
+    if request.if_none_match:
+        # If-None-Match takes precedence over If-Modified-Since
+        return request.if_none_match.contains(etag)
+    
+    if last_modified is not None and request.if_modified_since is not None:
+        return last_modified <= request.if_modified_since
+    
+    return False
+
+
+def apply_cache_headers(response, etag, last_modified):
+    """Attach validator headers; clients must revalidate on every use"""
+    if etag is not None:
+        response.set_etag(etag)
+        if last_modified is not None:
+            response.last_modified = last_modified
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def not_modified_response(etag, last_modified):
+    """Build an empty 304 response"""
+    return apply_cache_headers(make_response('', 304), etag, last_modified)
+
+
+@app.template_global()
+def asset_url(filename):
+    """
+    URL of a static asset with its content hash in the file name
+
+    The hashed URL changes whenever the file does, so it is served with far-future
+    cache headers (see static_asset).
+    """
+    digest = asset_digest(app.static_folder, filename)
+    if digest is None:
+        return url_for('static', filename=filename)
+    return url_for('static_asset', filename=hashed_filename(filename, digest))
+
+
+@app.route('/assets/<path:filename>')
+def static_asset(filename):
+    """Serve a content-hashed static asset (css/style.<hash>.css)"""
+    parts = split_hashed_filename(filename)
+    if parts is None:
+        abort(404)
+    original, digest = parts
+    # Reject paths leaving the static folder before anything is opened or hashed
+    if safe_join(app.static_folder, original) is None:
+        abort(404)
+    current = asset_digest(app.static_folder, original)
+    if current is None:
+        abort(404)
+
+    response = send_from_directory(app.static_folder, original)
+    if digest == current:
+        response.headers['Cache-Control'] = f'public, max-age={Config.ASSET_MAX_AGE}, immutable'
+    else:
+        # Stale hash from an old page: serve the current file but do not pin it
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def stream_page(template_name, **context):
+    """
+    Render a template as a streamed response
+
+    The page is sent in chunks while the table is rendered instead of being built
+    in memory first, so the browser gets the head and form right away.
+    """
+    # Pop flashed messages now: the session cookie is written before streaming starts
+    get_flashed_messages(with_categories=True)
+    app.update_template_context(context)
+    stream = app.jinja_env.get_template(template_name).stream(context)
+    stream.enable_buffering(Config.TEMPLATE_STREAM_BUFFER)
+    return Response(stream_with_context(stream), mimetype='text/html')
+
+
 @app.route('/')
 def index():
     """Home page - show search form"""
@@ -81,64 +411,34 @@ def search():
     """Handle search request"""
     try:
         # Get form data (from POST or GET for pagination)
-        from datetime import datetime
+        tz_name = get_request_timezone()
         # Default to local time now
-        today = datetime.now().strftime('%Y-%m-%dT%H:%M')
+        today = datetime.now(get_timezone(tz_name)).strftime('%Y-%m-%dT%H:%M')
         
         if request.method == 'POST':
             ship_id = request.form.get('ship_id', '').strip()
             from_date = request.form.get('from_date', '').strip() or today
             to_date = request.form.get('to_date', '').strip() or today
             refresh_interval = request.form.get('refresh_interval', '5').strip() or '5'
+            request_token = request.form.get('request_token', '').strip() or None
             page = 1
         else:  # GET request for pagination
             ship_id = request.args.get('ship_id', '').strip()
             from_date = request.args.get('from_date', '').strip() or today
             to_date = request.args.get('to_date', '').strip() or today
             refresh_interval = request.args.get('refresh_interval', '5').strip() or '5'
+            request_token = request.args.get('request_token', '').strip() or None
             page = int(request.args.get('page', 1))
         
         # Note: from_date and to_date are in local time (datetime-local format)
         # But DB's created_time is in UTC, so we need to convert local time to UTC for query
-        
-        # Convert local time to UTC for database query
-        from datetime import timezone
-        from_date_utc = from_date
-        to_date_utc = to_date
-        
-        if from_date and 'T' in from_date:
-            try:
-                # Parse as local time
-                local_dt = datetime.strptime(from_date, '%Y-%m-%dT%H:%M')
-                # Convert to UTC (assume local timezone, server's timezone)
-                # Get timezone offset
-                local_tz = datetime.now().astimezone().tzinfo
-                local_dt = local_dt.replace(tzinfo=local_tz)
-                utc_dt = local_dt.astimezone(timezone.utc)
-                from_date_utc = utc_dt.strftime('%Y-%m-%dT%H:%M')
-            except Exception as e:
-                app.logger.warning(f"Error converting from_date to UTC: {e}")
-                from_date_utc = from_date
-        
-        if to_date and 'T' in to_date:
-            try:
-                # Parse as local time
-                local_dt = datetime.strptime(to_date, '%Y-%m-%dT%H:%M')
-                # Convert to UTC
-                local_tz = datetime.now().astimezone().tzinfo
-                local_dt = local_dt.replace(tzinfo=local_tz)
-                utc_dt = local_dt.astimezone(timezone.utc)
-                to_date_utc = utc_dt.strftime('%Y-%m-%dT%H:%M')
-            except Exception as e:
-                app.logger.warning(f"Error converting to_date to UTC: {e}")
-                to_date_utc = to_date
+        from_date_utc = convert_local_to_utc(from_date, tz_name)
+        to_date_utc = convert_local_to_utc(to_date, tz_name)
         
         # Validate inputs (use original local time for validation)
         is_valid, error_message = validate_inputs(ship_id, from_date, to_date)
         if not is_valid:
             flash(error_message, 'error')
-            from datetime import datetime
-            today = datetime.now().strftime('%Y-%m-%dT%H:%M')
             return render_template('search.html',
                                  ship_id=ship_id,
                                  from_date=from_date or today,
@@ -153,81 +453,45 @@ def search():
         # Execute query to get all records and process into rows
         # We need to process all records to count rows accurately for pagination
         try:
-            # Get all records (with reasonable limit for safety)
             # Use UTC times for query
             app.logger.info(f"Executing query: ship_id={ship_id}, from_date={from_date} (local) -> {from_date_utc} (UTC), to_date={to_date} (local) -> {to_date_utc} (UTC)")
-            all_records = execute_query(
-                ship_id=ship_id,
-                interface_id=None,  # Interface ID removed
-                from_date=from_date_utc,
-                to_date=to_date_utc,
-                limit=10000,  # Safety limit
-                offset=0
-            )
-            app.logger.info(f"Query returned {len(all_records)} records")
+            validator = get_search_validator(ship_id, from_date_utc, to_date_utc)
+            
+            # Closed ranges are immutable: answer conditional GETs without querying rows
+            etag, last_modified = validator_headers(validator, canonical_request_path(), tz_name)
+            if is_not_modified(etag, last_modified):
+                return not_modified_response(etag, last_modified)
             
-            # Process all records into table rows
-            all_table_rows = []
-            for record in all_records:
-                ship_id_val = record.get('ship_id')
-                created_time_val = record.get('created_time')
-                
-                # Parse JSON data
-                parsed_json = parse_json_data(record.get('json_data', ''))
-                
-                # Extract $ship_posixmicros value for this record
-                posix_micros_value = ''
-                for json_row in parsed_json:
-                    if json_row.get('key') == '$ship_posixmicros':
-                        posix_micros_value = json_row.get('value', '')
-                        break
-                
-                if parsed_json:
-                    # Create a row for each JSON key
-                    for json_row in parsed_json:
-                        tag_name = json_row.get('key')
-                        
-                        # Skip $ship_posixmicros as a separate row, it's shown in its own column
-                        if tag_name == '$ship_posixmicros':
-                            continue
-                        
-                        all_table_rows.append({
-                            'ship_id': ship_id_val,
-                            'tag_name': tag_name,
-                            'value': json_row.get('value'),
-                            'description': json_row.get('description'),
-                            'unit': json_row.get('unit'),
-                            'posix_micros': posix_micros_value,
-                            'created_time': created_time_val,
-                            'value_type': json_row.get('value_type', 'str')
-                        })
-                
-                # If no JSON data or only $ship_posixmicros, create at least one row
-                if not parsed_json or (len(parsed_json) == 1 and parsed_json[0].get('key') == '$ship_posixmicros'):
-                    all_table_rows.append({
-                        'ship_id': ship_id_val,
-                        'tag_name': '',
-                        'value': '',
-                        'description': '',
-                        'unit': '',
-                        'posix_micros': posix_micros_value,
-                        'created_time': created_time_val,
-                        'value_type': 'str'
-                    })
+            all_table_rows = load_search_rows(ship_id, from_date_utc, to_date_utc, validator,
+                                              cancel_token=request_token)
             
             # Get total count of rows
             total_count = len(all_table_rows)
+            note_request_stats(rows=total_count)
             
             # Get paginated rows for current page
             table_rows = all_table_rows[rows_offset:rows_offset + rows_per_page]
             
             # Calculate pagination info
             total_pages = (total_count + rows_per_page - 1) // rows_per_page if total_count > 0 else 1
+        except (AdmissionRejected, PoolExhausted) as e:
+            flash(f"Server busy: {str(e)}", 'error')
+            app.logger.warning(f"Search rejected: ship_id={ship_id}, {from_date_utc} - {to_date_utc} (UTC): {e}")
+            response = make_response(render_template('search.html',
+                                 ship_id=ship_id,
+                                 from_date=from_date,
+                                 to_date=to_date,
+                                 refresh_interval=refresh_interval,
+                                 today_date=''), 503)
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response
+        except QueryCancelled as e:
+            # The client left the page; nobody will read the response
+            app.logger.info(f"Search cancelled: {e}")
+            return '', 204
         except Exception as e:
             flash(f"Database error: {str(e)}", 'error')
             app.logger.error(f"Database error in search: {traceback.format_exc()}")
-            from datetime import datetime
-            today = datetime.now().strftime('%Y-%m-%dT%H:%M')
             return render_template('search.html',
                                  ship_id=ship_id,
                                  from_date=from_date or today,
@@ -238,9 +502,7 @@ def search():
         if not table_rows:
             flash("No data found", 'info')
         
-        from datetime import datetime
-        today = datetime.now().strftime('%Y-%m-%dT%H:%M')
-        return render_template('search.html',
+        response = stream_page('search.html',
                              ship_id=ship_id,
                              from_date=from_date or today,
                              to_date=to_date or today,
@@ -250,22 +512,357 @@ def search():
                              page=page,
                              total_pages=total_pages,
                              total_count=total_count,
-                             records_per_page=rows_per_page)
+                             records_per_page=rows_per_page,
+                             client_pagination=Config.CLIENT_PAGINATION)
+        return apply_cache_headers(response, etag, last_modified)
     
     except Exception as e:
-        from datetime import datetime
         today = datetime.now().strftime('%Y-%m-%dT%H:%M')
         app.logger.error(f"Error in search: {traceback.format_exc()}")
         flash(f"An error occurred: {str(e)}", 'error')
         return render_template('search.html', today_date=today)
 
 
+@app.route('/api/search', methods=['GET'])
+def search_api():
+    """Search API endpoint - returns one page of table rows as JSON"""
+    try:
+        # Get parameters
+        ship_id = request.args.get('ship_id', '').strip()
+        from_date = request.args.get('from_date', '').strip()
+        to_date = request.args.get('to_date', '').strip()
+        request_token = request.args.get('request_token', '').strip() or None
+        tz_name = get_request_timezone()
+        
+        try:
+            page = max(int(request.args.get('page', 1)), 1)
+        except ValueError:
+            page = 1
+        
+        # Validation
+        is_valid, error_message = validate_inputs(ship_id, from_date, to_date)
+        if not is_valid:
+            return jsonify({
+                'success': False,
+                'error': error_message
+            }), 400
+        
+        from_date_utc = convert_local_to_utc(from_date, tz_name)
+        to_date_utc = convert_local_to_utc(to_date, tz_name)
+        
+        rows_per_page = 100
+        rows_offset = (page - 1) * rows_per_page
+        
+        try:
+            validator = get_search_validator(ship_id, from_date_utc, to_date_utc)
+            
+            etag, last_modified = validator_headers(validator, canonical_request_path(), tz_name)
+            if is_not_modified(etag, last_modified):
+                return not_modified_response(etag, last_modified)
+            
+            all_table_rows = load_search_rows(ship_id, from_date_utc, to_date_utc, validator,
+                                              cancel_token=request_token)
+        except (AdmissionRejected, PoolExhausted) as e:
+            response = jsonify({
+                'success': False,
+                'error': str(e)
+            })
+            response.status_code = 503
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response
+        except QueryCancelled as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 409
+        except Exception as e:
+            app.logger.error(f"Database error in search_api: {e}")
+            return jsonify({
+                'success': False,
+                'error': f'Database error: {str(e)}'
+            }), 500
+        
+        total_count = len(all_table_rows)
+        note_request_stats(rows=total_count)
+        total_pages = (total_count + rows_per_page - 1) // rows_per_page if total_count > 0 else 1
+        
+        rows = []
+        for row in all_table_rows[rows_offset:rows_offset + rows_per_page]:
+            row = dict(row)
+            row['created_time'] = str(row['created_time']) if row.get('created_time') else ''
+            rows.append(row)
+        
+        response = jsonify({
+            'success': True,
+            'rows': rows,
+            'page': page,
+            'total_pages': total_pages,
+            'total_count': total_count,
+            'records_per_page': rows_per_page
+        })
+        return apply_cache_headers(response, etag, last_modified)
+    
+    except Exception as e:
+        app.logger.error(f"Error in search_api: {traceback.format_exc()}")
+        return jsonify({
+            'success': False,
+            'error': f'Internal error: {str(e)}'
+        }), 500
+
+
+@app.route('/api/export', methods=['GET'])
+def export_api():
+    """Export API endpoint - downloads the search range as a Parquet file"""
+    # Imported here so pyarrow is only loaded when export is used
+    from utils.export import ExportUnavailable, export_range
+    
+    try:
+        # Get parameters
+        ship_id = request.args.get('ship_id', '').strip()
+        from_date = request.args.get('from_date', '').strip()
+        to_date = request.args.get('to_date', '').strip()
+        layout = request.args.get('layout', 'long').strip()
+        
+        # Validation
+        is_valid, error_message = validate_inputs(ship_id, from_date, to_date)
+        if is_valid and (not from_date or not to_date):
+            is_valid, error_message = False, "From Date and To Date are required for export"
+        if is_valid and layout not in ('long', 'wide'):
+            is_valid, error_message = False, "layout must be 'long' or 'wide'"
+        if not is_valid:
+            return jsonify({
+                'success': False,
+                'error': error_message
+            }), 400
+        
+        # Same range semantics as search: local time, To Date minute is inclusive
+        tz_name = get_request_timezone()
+        from_date_utc = convert_local_to_utc(from_date, tz_name)
+        to_date_utc = convert_local_to_utc(to_date, tz_name)
+        start = parse_export_datetime(from_date_utc)
+        end = parse_export_datetime(to_date_utc) + (timedelta(minutes=1) if 'T' in to_date_utc else timedelta(days=1))
+        
+        import shutil
+        import tempfile
+        
+        out_dir = tempfile.mkdtemp(prefix='amsbypass_export_')
+        try:
+            with search_admission.admit(heavy=True):
+                result = export_range(
+                    ship_id=ship_id,
+                    start=start,
+                    end=end,
+                    out_dir=out_dir,
+                    layout=layout,
+                    batch_size=Config.EXPORT_BATCH_SIZE
+                )
+        except (AdmissionRejected, PoolExhausted) as e:
+            shutil.rmtree(out_dir, ignore_errors=True)
+            response = jsonify({
+                'success': False,
+                'error': str(e)
+            })
+            response.status_code = 503
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response
+        except Exception:
+            shutil.rmtree(out_dir, ignore_errors=True)
+            raise
+        
+        app.logger.info(f"Export: ship_id={ship_id}, {start} - {end} (UTC), {result['records']} records in {result['seconds']:.1f}s")
+        
+        if not result['files']:
+            shutil.rmtree(out_dir, ignore_errors=True)
+            return jsonify({
+                'success': False,
+                'error': 'No data found'
+            }), 404
+        
+        # Wide layout may produce several files (schema changes); long layout one
+        if len(result['files']) == 1:
+            path = result['files'][0]
+            download_name = f"{ship_id}_{from_date_utc}_{to_date_utc}_{layout}.parquet".replace(':', '')
+            mimetype = 'application/vnd.apache.parquet'
+        else:
+            # Archive next to (not inside) the directory being archived
+            path = shutil.make_archive(out_dir + '_bundle', 'zip', out_dir)
+            download_name = f"{ship_id}_{from_date_utc}_{to_date_utc}_{layout}.zip".replace(':', '')
+            mimetype = 'application/zip'
+        
+        # The open handle keeps the data readable after the temporary directory is removed
+        export_file = open(path, 'rb')
+        shutil.rmtree(out_dir, ignore_errors=True)
+        if not path.startswith(out_dir + os.sep):
+            os.remove(path)
+        return send_file(export_file, mimetype=mimetype, as_attachment=True, download_name=download_name)
+    
+    except ExportUnavailable as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 501
+    except Exception as e:
+        app.logger.error(f"Error in export_api: {traceback.format_exc()}")
+        return jsonify({
+            'success': False,
+            'error': f'Internal error: {str(e)}'
+        }), 500
+
+
+def parse_export_datetime(date_str):
+    """Parse YYYY-MM-DDTHH:MM or YYYY-MM-DD into a naive datetime"""
+    if 'T' in date_str:
+        return datetime.strptime(date_str, '%Y-%m-%dT%H:%M')
+    return datetime.strptime(date_str, '%Y-%m-%d')
+
+
+@app.route('/api/search/cancel', methods=['POST'])
+def cancel_search_api():
+    """Cancel a running search by its request token (sent with navigator.sendBeacon)"""
+    token = (request.form.get('request_token') or request.args.get('request_token') or
+             request.get_data(as_text=True) or '').strip()
+    if not token:
+        return jsonify({
+            'success': False,
+            'error': 'request_token is required'
+        }), 400
+    
+    cancelled = cancel_query(token)
+    app.logger.info(f"Cancel requested for search {token} (running={cancelled})")
+    return jsonify({
+        'success': True,
+        'cancelled': cancelled
+    })
+
+
+def parse_last_timestamp(last_timestamp_str, tz_name=''):
+    """
+    Parse the legacy last_timestamp parameter into a UTC datetime
+
+    Accepts 'YYYY-MM-DD HH:MM:SS' in local time (tz_name, default: server zone)
+    or an ISO timestamp (UTC if no offset is given). Falls back to 1 minute ago.
+    """
+    default = datetime.now(timezone.utc) - timedelta(minutes=1)
+    if not last_timestamp_str:
+        return default
+
+    try:
+        # Try format: 'YYYY-MM-DD HH:MM:SS' (local time)
+        local_timestamp = datetime.strptime(last_timestamp_str, '%Y-%m-%d %H:%M:%S')
+        return local_to_utc(local_timestamp, get_timezone(tz_name))
+    except ValueError:
+        pass
+
+    try:
+        # Try ISO format
+        parsed = datetime.fromisoformat(last_timestamp_str.replace('Z', '+00:00').replace(' ', 'T'))
+        if parsed.tzinfo is None:
+            # Assume UTC if no timezone info
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.astimezone(timezone.utc)
+    except (ValueError, AttributeError) as e:
+        app.logger.warning(f"Error parsing last_timestamp: {e}")
+        return default
+
+
+def parse_change_params():
+    """
+    Parse the change-only RealTime parameters (changes=1&stream=<id>&deadband=<n>)
+    
+    Returns:
+        (stream_id, deadband), stream_id is None when change-only mode is off
+    
+    Raises:
+        ValueError: stream is missing or deadband is not a non-negative number
+    """
+    if request.args.get('changes', '').strip() not in ('1', 'true'):
+        return None, None
+    
+    stream_id = request.args.get('stream', '').strip()
+    if not stream_id or len(stream_id) > 64:
+        raise ValueError('stream is required for changes mode (at most 64 characters)')
+    
+    deadband_str = request.args.get('deadband', '').strip()
+    if not deadband_str:
+        return stream_id, None
+    try:
+        deadband = float(deadband_str)
+    except ValueError:
+        deadband = -1.0
+    if not deadband >= 0:
+        raise ValueError('deadband must be a non-negative number')
+    return stream_id, deadband
+
+
+def parse_recheck_params(recheck_str, seen_str, missing_str, cursor):
+    """
+    Parse the late-commit parameters of a RealTime poll (recheck=<id>&seen=<n>&missing=<id,id>)
+    
+    Ids are assigned before commit, so a record with a lower id can become visible
+    after a higher one was delivered. Clients send the cursor they held
+    REALTIME_CURSOR_OVERLAP_SECONDS ago (recheck) and how many records they have
+    in (recheck, cursor] (seen); when the count differs, the response lists the ids
+    of that range (recheck_ids) and the client asks for the ones it lacks (missing).
+    
+    Returns:
+        (recheck, seen, missing) - recheck is None for no recheck; missing is a list
+        of at most REALTIME_BATCH_SIZE ids at or below the cursor
+    
+    Raises:
+        ValueError: recheck, seen or a missing id is not an integer
+    """
+    if cursor is None:
+        return None, 0, []
+    missing = [int(value) for value in missing_str.split(',') if value.strip()] if missing_str else []
+    missing = [record_id for record_id in missing if record_id <= cursor][:Config.REALTIME_BATCH_SIZE]
+    if not recheck_str:
+        return None, 0, missing
+    recheck = int(recheck_str)
+    seen = int(seen_str) if seen_str else 0
+    if recheck >= cursor:
+        return None, 0, missing
+    return recheck, seen, missing
+
+
+def find_late_commits(rechecks, cursors):
+    """
+    Compare the record count of each ship's recheck range with what the client has
+    
+    Only ids are read (one query for all ships); full records are fetched later,
+    for the ids the client reports missing.
+    
+    Args:
+        rechecks: Dictionary of ship_id -> (recheck, seen)
+        cursors: Dictionary of ship_id -> cursor
+    
+    Returns:
+        Dictionary of ship_id -> ids in (recheck, cursor] for ships whose count differs
+    """
+    if not rechecks:
+        return {}
+    ids_by_ship = fetch_fleet_record_ids_between(
+        {ship_id: (recheck, cursors[ship_id]) for ship_id, (recheck, _) in rechecks.items()}
+    )
+    late = {}
+    for ship_id, (recheck, seen) in rechecks.items():
+        ids = ids_by_ship.get(ship_id, [])
+        if len(ids) != seen:
+            app.logger.info(f"Realtime recheck: ship_id={ship_id} has {len(ids)} records in "
+                            f"({recheck}, {cursors[ship_id]}], client has {seen}")
+            late[ship_id] = ids
+    return late
+
+
 @app.route('/api/realtime', methods=['GET'])
 def realtime_api():
-    """RealTime API endpoint - returns new records since last_timestamp"""
+    """RealTime API endpoint - returns records inserted after the client's cursor"""
     try:
         # Get parameters
         ship_id = request.args.get('ship_id', '').strip()
+        cursor_str = request.args.get('cursor', '').strip()
+        recheck_str = request.args.get('recheck', '').strip()
+        seen_str = request.args.get('seen', '').strip()
+        missing_str = request.args.get('missing', '').strip()
         last_timestamp_str = request.args.get('last_timestamp', '').strip()
         
         # Validation
@@ -275,79 +872,68 @@ def realtime_api():
                 'error': 'ship_id is required'
             }), 400
         
-        # Parse last_timestamp or use default (1 minute ago)
-        # last_timestamp_str is in local time, but DB's created_time is in UTC
-        from datetime import timezone
-        if last_timestamp_str:
+        if cursor_str:
             try:
-                # Try format: 'YYYY-MM-DD HH:MM:SS' (local time)
-                try:
-                    local_timestamp = datetime.strptime(last_timestamp_str, '%Y-%m-%d %H:%M:%S')
-                    # Convert local time to UTC
-                    local_tz = datetime.now().astimezone().tzinfo
-                    local_timestamp = local_timestamp.replace(tzinfo=local_tz)
-                    last_timestamp = local_timestamp.astimezone(timezone.utc)
-                    app.logger.info(f"Parsed last_timestamp: local={last_timestamp_str} -> UTC={last_timestamp}")
-                except ValueError:
-                    # Try ISO format
-                    try:
-                        last_timestamp = datetime.fromisoformat(last_timestamp_str.replace('Z', '+00:00').replace(' ', 'T'))
-                        if last_timestamp.tzinfo is None:
-                            # Assume UTC if no timezone info
-                            last_timestamp = last_timestamp.replace(tzinfo=timezone.utc)
-                        app.logger.info(f"Parsed last_timestamp (ISO): {last_timestamp}")
-                    except (ValueError, AttributeError) as e:
-                        app.logger.warning(f"Error parsing last_timestamp (ISO): {e}")
-                        # Default to 1 minute ago in UTC
-                        last_timestamp = datetime.now(timezone.utc) - timedelta(minutes=1)
-            except Exception as e:
-                app.logger.warning(f"Error parsing last_timestamp: {e}")
-                # Default to 1 minute ago in UTC
-                last_timestamp = datetime.now(timezone.utc) - timedelta(minutes=1)
+                cursor = int(cursor_str)
+            except ValueError:
+                return jsonify({
+                    'success': False,
+                    'error': 'cursor must be an integer'
+                }), 400
         else:
-            # First request: get data from last 1 minute (UTC)
-            last_timestamp = datetime.now(timezone.utc) - timedelta(minutes=1)
-            app.logger.info(f"No last_timestamp provided, using: {last_timestamp}")
+            cursor = None
+        
+        try:
+            recheck, seen, missing = parse_recheck_params(recheck_str, seen_str, missing_str, cursor)
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'error': 'recheck, seen and missing must be integers'
+            }), 400
+        
+        try:
+            change_stream, deadband = parse_change_params()
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
         
         # Query for new records
-        # last_timestamp is already in UTC (datetime object with timezone)
         try:
-            # Format last_timestamp for PostgreSQL (UTC timestamp)
-            if isinstance(last_timestamp, datetime):
-                # Convert to string format for PostgreSQL
-                last_timestamp_str = last_timestamp.strftime('%Y-%m-%d %H:%M:%S')
-            else:
-                last_timestamp_str = str(last_timestamp)
-            
-            query = f"""
-                SELECT 
-                    id,
-                    ship_id,
-                    interface_id,
-                    json_data,
-                    created_time,
-                    server_created_time
-                FROM {Config().DB_SCHEMA}.{Config().DB_TABLE}
-                WHERE ship_id = %s
-                    AND created_time > %s::timestamp
-            """
-            
-            params = [ship_id, last_timestamp_str]
-            
-            query += " ORDER BY created_time DESC LIMIT 100"
-            
-            app.logger.info(f"Realtime query: ship_id={ship_id}, last_timestamp (UTC)={last_timestamp_str}")
+            if cursor is None:
+                # First request: start from records created after last_timestamp (default: 1 minute ago)
+                since = parse_last_timestamp(last_timestamp_str, get_request_timezone())
+                cursor = initial_cursor(ship_id, since.strftime('%Y-%m-%d %H:%M:%S'))
+                app.logger.info(f"No cursor provided, starting at id {cursor} (created_time > {since} UTC)")
             
-            from utils.db import get_db_connection
-            from psycopg2.extras import RealDictCursor
+            # Late commits: ids of the recheck range only, full records only for missing ids
+            late = find_late_commits({ship_id: (recheck, seen)} if recheck is not None else {},
+                                     {ship_id: cursor})
+            records = fetch_records_by_ids([ship_id], missing)
             
-            with get_db_connection() as conn:
-                with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-                    cursor.execute(query, params)
-                    results = cursor.fetchall()
-                    records = [dict(row) for row in results]
-                    app.logger.info(f"Realtime query returned {len(records)} records")
+            # Drain the backlog in id order, one page at a time
+            has_more = False
+            batch_size = Config.REALTIME_BATCH_SIZE
+            for _ in range(Config.REALTIME_MAX_BATCHES):
+                batch = fetch_records_after(ship_id, cursor, limit=batch_size)
+                records.extend(batch)
+                if batch:
+                    cursor = batch[-1]['id']
+                has_more = len(batch) == batch_size
+                if not has_more:
+                    break
             
+            app.logger.info(f"Realtime query: ship_id={ship_id} returned {len(records)} records, cursor={cursor}, has_more={has_more}")
+        
+        except PoolExhausted as e:
+            response = jsonify({
+                'success': False,
+                'error': f'Server busy: {str(e)}'
+            })
+            response.status_code = 503
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response
         except Exception as e:
             app.logger.error(f"Database error in realtime_api: {e}")
             return jsonify({
@@ -355,120 +941,37 @@ def realtime_api():
                 'error': f'Database error: {str(e)}'
             }), 500
         
-        # Process records into table rows
-        new_rows = []
-        # Initialize latest_timestamp to last_timestamp, but will update if we find newer records
-        latest_timestamp = last_timestamp
-        found_newer_records = False
+        # Process records into table rows (oldest first)
+        new_rows = build_table_rows(records, with_record_id=True)
+        for row in new_rows:
+            row['created_time'] = str(row['created_time']) if row.get('created_time') else ''
+        total_rows = len(new_rows)
         
-        for record in records:
-            ship_id_val = record.get('ship_id')
-            created_time_val = record.get('created_time')
-            
-            # Update latest timestamp
-            if created_time_val:
-                from datetime import timezone
-                record_timestamp = None
-                
-                if isinstance(created_time_val, datetime):
-                    # Ensure it's timezone-aware
-                    if created_time_val.tzinfo is None:
-                        # Assume UTC if no timezone info
-                        record_timestamp = created_time_val.replace(tzinfo=timezone.utc)
-                    elif created_time_val.tzinfo != timezone.utc:
-                        record_timestamp = created_time_val.astimezone(timezone.utc)
-                    else:
-                        record_timestamp = created_time_val
-                elif isinstance(created_time_val, str):
-                    try:
-                        # Try to parse as UTC
-                        dt = datetime.fromisoformat(created_time_val.replace('Z', '+00:00'))
-                        if dt.tzinfo is None:
-                            record_timestamp = dt.replace(tzinfo=timezone.utc)
-                        elif dt.tzinfo != timezone.utc:
-                            record_timestamp = dt.astimezone(timezone.utc)
-                        else:
-                            record_timestamp = dt
-                    except Exception as e:
-                        app.logger.warning(f"Error parsing created_time: {e}")
-                        record_timestamp = None
-                
-                # Update latest_timestamp if this record is newer
-                if record_timestamp and record_timestamp > latest_timestamp:
-                    latest_timestamp = record_timestamp
-                    found_newer_records = True
-            
-            # Parse JSON data
-            parsed_json = parse_json_data(record.get('json_data', ''))
-            
-            # Extract $ship_posixmicros value for this record
-            posix_micros_value = ''
-            for json_row in parsed_json:
-                if json_row.get('key') == '$ship_posixmicros':
-                    posix_micros_value = json_row.get('value', '')
-                    break
-            
-            if parsed_json:
-                # Create a row for each JSON key
-                for json_row in parsed_json:
-                    tag_name = json_row.get('key')
-                    
-                    # Skip $ship_posixmicros as a separate row
-                    if tag_name == '$ship_posixmicros':
-                        continue
-                    
-                    new_rows.append({
-                        'ship_id': ship_id_val,
-                        'tag_name': tag_name,
-                        'value': json_row.get('value'),
-                        'description': json_row.get('description'),
-                        'unit': json_row.get('unit'),
-                        'posix_micros': posix_micros_value,
-                        'created_time': str(created_time_val) if created_time_val else '',
-                        'value_type': json_row.get('value_type', 'str')
-                    })
-            
-            # If no JSON data or only $ship_posixmicros, create at least one row
-            if not parsed_json or (len(parsed_json) == 1 and parsed_json[0].get('key') == '$ship_posixmicros'):
-                new_rows.append({
-                    'ship_id': ship_id_val,
-                    'tag_name': '',
-                    'value': '',
-                    'description': '',
-                    'unit': '',
-                    'posix_micros': posix_micros_value,
-                    'created_time': str(created_time_val) if created_time_val else '',
-                    'value_type': 'str'
-                })
-        
-        # Format latest timestamp for response (in UTC)
-        # If no newer records found, use current UTC time minus 1 second to avoid missing data
-        from datetime import timezone
-        if not found_newer_records and len(records) == 0:
-            # No records found, advance timestamp slightly to avoid infinite loop
-            latest_timestamp = datetime.now(timezone.utc) - timedelta(seconds=1)
-            app.logger.info(f"No new records found, advancing timestamp to: {latest_timestamp}")
-        
-        # Convert to UTC string if it's a datetime object
-        if isinstance(latest_timestamp, datetime):
-            # Ensure it's in UTC
-            if latest_timestamp.tzinfo is None:
-                # Assume UTC
-                latest_timestamp = latest_timestamp.replace(tzinfo=timezone.utc)
-            elif latest_timestamp.tzinfo != timezone.utc:
-                latest_timestamp = latest_timestamp.astimezone(timezone.utc)
-            last_timestamp_str = latest_timestamp.strftime('%Y-%m-%d %H:%M:%S')
-        else:
-            last_timestamp_str = str(latest_timestamp)
+        # Change-only mode: drop tags whose value did not change since the last poll
+        keyframe = False
+        if change_stream:
+            new_rows, keyframe = change_tracker.apply(change_stream, new_rows, deadband)
+        note_request_stats(records=len(records), rows=len(new_rows), total_rows=total_rows)
         
-        app.logger.info(f"Realtime API: found {len(new_rows)} new rows from {len(records)} records, last_timestamp={last_timestamp_str}")
+        # created_time of the newest record, kept for display and legacy clients
+        last_timestamp_str = ''
+        if records and isinstance(records[-1].get('created_time'), datetime):
+            last_timestamp_str = records[-1]['created_time'].strftime('%Y-%m-%d %H:%M:%S')
         
-        return jsonify({
+        response = {
             'success': True,
             'new_rows': new_rows,
             'count': len(new_rows),
+            'cursor': cursor,
+            'record_ids': [record['id'] for record in records],
+            'has_more': has_more,
             'last_timestamp': last_timestamp_str
-        })
+        }
+        if ship_id in late:
+            response['recheck_ids'] = late[ship_id]
+        if change_stream:
+            response.update(mode='changes', keyframe=keyframe, total_rows=total_rows)
+        return jsonify(response)
     
     except Exception as e:
         app.logger.error(f"Error in realtime_api: {traceback.format_exc()}")
@@ -478,12 +981,307 @@ def realtime_api():
         }), 500
 
 
+@app.route('/api/fleet/realtime', methods=['GET'])
+def fleet_realtime_api():
+    """
+    Fleet RealTime API endpoint - returns new records for several ships in one batched query
+
+    Query parameters are repeated and positional: ship_id=A&cursor=10&ship_id=B&cursor=
+    (an empty cursor starts that ship from last_timestamp, default 1 minute ago).
+    recheck, seen and missing are positional in the same way (see parse_recheck_params).
+    """
+    try:
+        # Get parameters
+        ship_ids = [ship_id.strip() for ship_id in request.args.getlist('ship_id')]
+        cursor_strs = request.args.getlist('cursor')
+        recheck_strs = request.args.getlist('recheck')
+        seen_strs = request.args.getlist('seen')
+        missing_strs = request.args.getlist('missing')
+        last_timestamp_str = request.args.get('last_timestamp', '').strip()
+        
+        # A repeated ship_id is watched once (in first-seen order), with the cursor of its
+        # first occurrence; otherwise its records would be fetched and sent twice
+        first_index = {}
+        for index, ship_id in enumerate(ship_ids):
+            first_index.setdefault(ship_id, index)
+        ship_ids = list(dict.fromkeys(ship_ids))
+        
+        # Validation
+        if not ship_ids or not all(ship_ids):
+            return jsonify({
+                'success': False,
+                'error': 'ship_id is required'
+            }), 400
+        
+        if len(ship_ids) > Config.FLEET_MAX_SHIPS:
+            return jsonify({
+                'success': False,
+                'error': f'At most {Config.FLEET_MAX_SHIPS} ships can be watched at once'
+            }), 400
+        
+        cursors = {}
+        rechecks = {}  # ship_id -> (recheck, seen)
+        missing_ids = []
+        new_ship_ids = []
+        for ship_id in ship_ids:
+            index = first_index[ship_id]
+            cursor_str = cursor_strs[index].strip() if index < len(cursor_strs) else ''
+            if not cursor_str:
+                new_ship_ids.append(ship_id)
+                continue
+            try:
+                cursors[ship_id] = int(cursor_str)
+            except ValueError:
+                return jsonify({
+                    'success': False,
+                    'error': f'cursor for {ship_id} must be an integer'
+                }), 400
+            try:
+                recheck, seen, missing = parse_recheck_params(
+                    recheck_strs[index].strip() if index < len(recheck_strs) else '',
+                    seen_strs[index].strip() if index < len(seen_strs) else '',
+                    missing_strs[index].strip() if index < len(missing_strs) else '',
+                    cursors[ship_id]
+                )
+            except ValueError:
+                return jsonify({
+                    'success': False,
+                    'error': f'recheck, seen and missing for {ship_id} must be integers'
+                }), 400
+            if recheck is not None:
+                rechecks[ship_id] = (recheck, seen)
+            missing_ids.extend(missing)
+        
+        try:
+            change_stream, deadband = parse_change_params()
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
+        # Query for new records
+        try:
+            if new_ship_ids:
+                since = parse_last_timestamp(last_timestamp_str, get_request_timezone())
+                cursors.update(initial_fleet_cursors(new_ship_ids, since.strftime('%Y-%m-%d %H:%M:%S')))
+            
+            # Late commits: ids of the recheck ranges only, full records only for missing ids
+            late = find_late_commits(rechecks, cursors)
+            records = fetch_records_by_ids(ship_ids, missing_ids[:Config.REALTIME_BATCH_SIZE])
+            
+            # Drain the backlog in id order, one page at a time, all ships per query
+            has_more = False
+            batch_size = Config.REALTIME_BATCH_SIZE
+            for _ in range(Config.REALTIME_MAX_BATCHES):
+                batch = fetch_fleet_records_after(cursors, limit=batch_size)
+                records.extend(batch)
+                for record in batch:
+                    cursors[record['ship_id']] = record['id']
+                has_more = len(batch) == batch_size
+                if not has_more:
+                    break
+            
+            app.logger.info(f"Fleet realtime query: {len(ship_ids)} ships returned {len(records)} records, has_more={has_more}")
+        
+        except PoolExhausted as e:
+            response = jsonify({
+                'success': False,
+                'error': f'Server busy: {str(e)}'
+            })
+            response.status_code = 503
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response
+        except Exception as e:
+            app.logger.error(f"Database error in fleet_realtime_api: {e}")
+            return jsonify({
+                'success': False,
+                'error': f'Database error: {str(e)}'
+            }), 500
+        
+        # Group records per ship, keeping id order inside each group
+        records_by_ship = {ship_id: [] for ship_id in ship_ids}
+        for record in records:
+            records_by_ship.setdefault(record['ship_id'], []).append(record)
+        
+        rows_by_ship = {}
+        total_rows = 0
+        for ship_id in ship_ids:
+            new_rows = build_table_rows(records_by_ship[ship_id], with_record_id=True)
+            for row in new_rows:
+                row['created_time'] = str(row['created_time']) if row.get('created_time') else ''
+            total_rows += len(new_rows)
+            rows_by_ship[ship_id] = new_rows
+        
+        # Change-only mode: one stream covers the whole fleet, so a keyframe resends every ship
+        keyframe = False
+        if change_stream:
+            all_rows = [row for ship_id in ship_ids for row in rows_by_ship[ship_id]]
+            changed_rows, keyframe = change_tracker.apply(change_stream, all_rows, deadband)
+            rows_by_ship = {ship_id: [] for ship_id in ship_ids}
+            for row in changed_rows:
+                rows_by_ship.setdefault(row['ship_id'], []).append(row)
+        
+        ships = {}
+        sent_rows = 0
+        for ship_id in ship_ids:
+            new_rows = rows_by_ship[ship_id]
+            sent_rows += len(new_rows)
+            ships[ship_id] = {
+                'new_rows': new_rows,
+                'count': len(new_rows),
+                'cursor': cursors.get(ship_id),
+                'record_ids': [record['id'] for record in records_by_ship[ship_id]]
+            }
+            if ship_id in late:
+                ships[ship_id]['recheck_ids'] = late[ship_id]
+        
+        note_request_stats(ships=len(ship_ids), records=len(records), rows=sent_rows, total_rows=total_rows)
+        response = {
+            'success': True,
+            'ships': ships,
+            'count': sent_rows,
+            'has_more': has_more
+        }
+        if change_stream:
+            response.update(mode='changes', keyframe=keyframe, total_rows=total_rows)
+        return jsonify(response)
+    
+    except Exception as e:
+        app.logger.error(f"Error in fleet_realtime_api: {traceback.format_exc()}")
+        return jsonify({
+            'success': False,
+            'error': f'Internal error: {str(e)}'
+        }), 500
+
+
 @app.route('/reset', methods=['POST'])
 def reset():
     """Reset form"""
     return redirect(url_for('index'))
 
 
+@app.before_request
+def start_slow_request_capture():
+    """Start SQL capture and stack sampling for the endpoints in SLOW_REQUEST_ENDPOINTS"""
+    if Config.SLOW_REQUEST_THRESHOLD_MS <= 0 or request.endpoint not in SLOW_REQUEST_ENDPOINTS:
+        return
+    g.capture_started = time.perf_counter()
+    start_query_capture()
+    request_profiler.start()
+
+
+@app.after_request
+def remember_response_status(response):
+    if 'capture_started' in g:
+        g.capture_status = response.status_code
+    return response
+
+
+@app.teardown_request
+def finish_slow_request_capture(error=None):
+    """
+    Store the capture if the request took longer than SLOW_REQUEST_THRESHOLD_MS
+
+    Runs after a streamed page has been sent, so rendering time is included.
+    """
+    started = g.pop('capture_started', None)
+    if started is None:
+        return
+    samples = request_profiler.stop()
+    queries = stop_query_capture()
+    duration_ms = (time.perf_counter() - started) * 1000
+    if duration_ms < Config.SLOW_REQUEST_THRESHOLD_MS:
+        return
+
+    try:
+        params = {key: value for key, value in request.values.items() if key != 'request_token'}
+        range_hours = None
+        if params.get('from_date'):
+            range_hours = range_width_hours(params.get('from_date'), params.get('to_date'))
+        record = {
+            'time': datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC'),
+            'endpoint': request.endpoint,
+            'method': request.method,
+            'path': request.path,
+            'status': g.get('capture_status'),
+            'error': repr(error) if error else None,
+            'duration_ms': round(duration_ms, 1),
+            'ship_id': params.get('ship_id', ''),
+            'range_hours': round(range_hours, 2) if range_hours not in (None, float('inf')) else None,
+            'params': params,
+            'stats': g.get('request_stats', {}),
+            'queries': queries,
+            'profile': summarize_profile(samples, request_profiler.interval)
+        }
+        record_id = slow_requests.save(record)
+        app.logger.warning(f"Slow request {request.endpoint} took {duration_ms:.0f} ms, captured as {record_id}")
+    except Exception as e:
+        app.logger.error(f"Error saving slow request capture: {e}")
+
+
+def require_admin():
+    """
+    Allow admin pages only with the X-Admin-Token header matching ADMIN_TOKEN
+    
+    Admin pages are disabled when ADMIN_TOKEN is not set: the client address cannot
+    be trusted behind a reverse proxy. The token is never read from the URL, where
+    it would end up in access logs and browser history.
+    """
+    supplied = request.headers.get('X-Admin-Token', '')
+    if not Config.ADMIN_TOKEN or not hmac.compare_digest(supplied.encode('utf-8'),
+                                                         Config.ADMIN_TOKEN.encode('utf-8')):
+        abort(403)
+
+
+@app.route('/admin/slow-requests', methods=['GET'])
+def slow_requests_list():
+    """List captured slow requests, newest first"""
+    require_admin()
+    records = slow_requests.list()
+    if request.args.get('format') == 'json':
+        return jsonify({'success': True, 'records': records})
+    return render_template('admin_slow_requests.html', records=records, record=None)
+
+
+@app.route('/admin/slow-requests/<record_id>', methods=['GET'])
+def slow_request_detail(record_id):
+    """Show one capture: parameters, SQL (with EXPLAIN if run) and stack profile"""
+    require_admin()
+    record = slow_requests.get(record_id)
+    if record is None:
+        abort(404)
+    if request.args.get('format') == 'json':
+        return jsonify({'success': True, 'record': record})
+    return render_template('admin_slow_requests.html', records=None, record=record)
+
+
+@app.route('/admin/slow-requests/<record_id>/explain', methods=['POST'])
+def slow_request_explain(record_id):
+    """Run EXPLAIN (ANALYZE, BUFFERS) for one captured query and store the plan with the capture"""
+    require_admin()
+    record = slow_requests.get(record_id)
+    if record is None:
+        abort(404)
+
+    try:
+        index = int(request.form.get('query', ''))
+        query = record['queries'][index]
+    except (ValueError, IndexError):
+        return jsonify({
+            'success': False,
+            'error': 'query must be the index of a captured query'
+        }), 400
+
+    try:
+        query['explain'] = explain_analyze(query['sql'])
+    except Exception as e:
+        query['explain'] = f"EXPLAIN failed: {e}"
+    slow_requests.update(record)
+
+    return redirect(url_for('slow_request_detail', record_id=record_id))
+
+
 @app.errorhandler(404)
 def not_found(error):
     """Handle 404 errors"""
@@ -20,6 +20,134 @@ class Config:
     DB_SCHEMA = 'tenant'
     DB_TABLE = 'ams_bypass'
     
+    # Read replicas (comma-separated host or host:port), empty to use the primary only
+    DB_REPLICA_HOSTS = os.getenv('DB_REPLICA_HOSTS', '')
+    DB_REPLICA_LAG_CHECK_INTERVAL = 5  # seconds between replica lag checks
+    
+    # Bulk ingest (python -m utils.ingest): --workers is capped at the ingest pool size
+    INGEST_MAX_WORKERS = int(os.getenv('INGEST_MAX_WORKERS', '4'))
+    
+    # Connection pools per workload class
+    # - maxconn / statement_timeout_ms: pool size and per-statement limit (0 = no limit)
+    # - pool_wait_seconds: how long to wait for a free connection before failing
+    # - use_replicas / max_replica_lag: route to a replica no further behind than this
+    #   many seconds (None = any lag)
+    DB_WORKLOADS = {
+        'realtime': {
+            'minconn': 1, 'maxconn': 5, 'statement_timeout_ms': 5000, 'pool_wait_seconds': 2,
+            'use_replicas': True, 'max_replica_lag': 2
+        },
+        'search': {
+            'minconn': 1, 'maxconn': 8, 'statement_timeout_ms': 60000, 'pool_wait_seconds': 5,
+            'use_replicas': True, 'max_replica_lag': 60
+        },
+        'export': {
+            'minconn': 0, 'maxconn': 2, 'statement_timeout_ms': 0, 'pool_wait_seconds': 30,
+            'use_replicas': True, 'max_replica_lag': None
+        },
+        # Schema tooling (python -m utils.partitions): DDL on the primary, one connection
+        'maintenance': {
+            'minconn': 0, 'maxconn': 1, 'statement_timeout_ms': 0, 'pool_wait_seconds': 60,
+            'use_replicas': False, 'max_replica_lag': None
+        },
+        # Bulk ingest (python -m utils.ingest) writes, so it always uses the primary
+        'ingest': {
+            'minconn': 0, 'maxconn': INGEST_MAX_WORKERS, 'statement_timeout_ms': 0,
+            'pool_wait_seconds': 60, 'use_replicas': False, 'max_replica_lag': None
+        },
+    }
+    
+    # Historical result cache configuration
+    # A search whose To Date ended more than HISTORICAL_SETTLE_SECONDS ago is treated as
+    # a closed range: responses carry ETag/Last-Modified and processed rows are cached
+    HISTORICAL_SETTLE_SECONDS = int(os.getenv('HISTORICAL_SETTLE_SECONDS', '60'))
+    HISTORICAL_CACHE_MAX_ENTRIES = int(os.getenv('HISTORICAL_CACHE_MAX_ENTRIES', '32'))
+    HISTORICAL_CACHE_MAX_ROWS = int(os.getenv('HISTORICAL_CACHE_MAX_ROWS', '500000'))
+    
+    # Heavy search admission control
+    # A search is heavy when its cost estimate exceeds the threshold: either the range
+    # width ('range') or the planner's row estimate from EXPLAIN ('explain')
+    HEAVY_SEARCH_COST_SOURCE = os.getenv('HEAVY_SEARCH_COST_SOURCE', 'range')
+    HEAVY_SEARCH_RANGE_HOURS = 6
+    HEAVY_SEARCH_ROW_ESTIMATE = 2000
+    # At most MAX_CONCURRENT heavy searches run at once, MAX_QUEUE more may wait
+    # QUEUE_TIMEOUT seconds; the rest get 503 immediately
+    HEAVY_SEARCH_MAX_CONCURRENT = 2
+    HEAVY_SEARCH_MAX_QUEUE = 4
+    HEAVY_SEARCH_QUEUE_TIMEOUT = 10
+    
+    # Parallel parsing of large search results (process pool)
+    # Results with fewer than PARSE_PARALLEL_THRESHOLD records are parsed inline
+    PARSE_PARALLEL_THRESHOLD = int(os.getenv('PARSE_PARALLEL_THRESHOLD', '2000'))
+    PARSE_CHUNK_SIZE = int(os.getenv('PARSE_CHUNK_SIZE', '500'))
+    PARSE_WORKERS = int(os.getenv('PARSE_WORKERS', '0')) or None  # None = CPU count
+    
+    # Time zone for datetime-local inputs when the browser does not send one
+    # (IANA name, e.g. Asia/Seoul; empty = server's zone)
+    DISPLAY_TIMEZONE = os.getenv('DISPLAY_TIMEZONE', '')
+    
+    # Parquet export: records fetched per server-side cursor round trip
+    EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '5000'))
+    
+    # Bulk ingest: records per COPY + INSERT ... ON CONFLICT round trip
+    INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', '10000'))
+    
+    # Time partitioning of ams_bypass (python -m utils.partitions)
+    # PARTITION_INTERVAL: daily or monthly; PARTITION_PREMAKE: future periods created ahead
+    # PARTITION_RETENTION: past periods kept by 'maintain' (0 = keep all), detached or dropped
+    PARTITION_INTERVAL = os.getenv('PARTITION_INTERVAL', 'daily')
+    PARTITION_PREMAKE = int(os.getenv('PARTITION_PREMAKE', '7'))
+    PARTITION_RETENTION = int(os.getenv('PARTITION_RETENTION', '0'))
+    PARTITION_RETENTION_DROP = os.getenv('PARTITION_RETENTION_DROP', 'false').lower() == 'true'
+    
+    # Slow-request capture (/search, /api/search, /api/realtime, /api/fleet/realtime)
+    # Requests slower than SLOW_REQUEST_THRESHOLD_MS (0 = off) are stored with their SQL
+    # and a sampled stack profile in SLOW_REQUEST_DIR (newest SLOW_REQUEST_MAX_ENTRIES kept)
+    SLOW_REQUEST_THRESHOLD_MS = int(os.getenv('SLOW_REQUEST_THRESHOLD_MS', '2000'))
+    SLOW_REQUEST_DIR = os.getenv('SLOW_REQUEST_DIR',
+                                 os.path.join(os.path.dirname(os.path.abspath(__file__)), 'slow_requests'))
+    SLOW_REQUEST_MAX_ENTRIES = int(os.getenv('SLOW_REQUEST_MAX_ENTRIES', '200'))
+    PROFILE_SAMPLE_INTERVAL_MS = int(os.getenv('PROFILE_SAMPLE_INTERVAL_MS', '10'))
+    # Token for /admin pages, sent in the X-Admin-Token header only; empty = admin pages disabled
+    ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
+    
+    # Page rendering
+    # Search result pages are streamed; template output is flushed every TEMPLATE_STREAM_BUFFER chunks
+    TEMPLATE_STREAM_BUFFER = int(os.getenv('TEMPLATE_STREAM_BUFFER', '64'))
+    # Directory for compiled template bytecode (empty = compile on each start)
+    TEMPLATE_BYTECODE_CACHE_DIR = os.getenv('TEMPLATE_BYTECODE_CACHE_DIR', '')
+    # Cache lifetime of content-hashed static assets (/assets/...), in seconds
+    ASSET_MAX_AGE = int(os.getenv('ASSET_MAX_AGE', str(365 * 24 * 3600)))
+    # Pagination fetches /api/search and renders the page in the browser (false = full page reload)
+    CLIENT_PAGINATION = os.getenv('CLIENT_PAGINATION', 'true').lower() == 'true'
+    
+    # RealTime configuration
+    # Each poll drains new records in id order, REALTIME_BATCH_SIZE records per page,
+    # up to REALTIME_MAX_BATCHES pages; the client polls again at once when has_more is set
+    REALTIME_BATCH_SIZE = int(os.getenv('REALTIME_BATCH_SIZE', '200'))
+    REALTIME_MAX_BATCHES = int(os.getenv('REALTIME_MAX_BATCHES', '5'))
+    # Only look for new realtime records created within this many hours (0 = no limit);
+    # the created_time bound lets id-cursor polls and initial cursors skip old partitions
+    REALTIME_LOOKBACK_HOURS = int(os.getenv('REALTIME_LOOKBACK_HOURS', '24'))
+    # Record ids are allocated before commit, so a lower id can become visible after a
+    # higher one was delivered: clients re-check the ids received in the last
+    # REALTIME_CURSOR_OVERLAP_SECONDS and drop rows of records they already have
+    REALTIME_CURSOR_OVERLAP_SECONDS = int(os.getenv('REALTIME_CURSOR_OVERLAP_SECONDS', '10'))
+    # Change-only RealTime (changes=1): only tags whose value changed (numeric values by
+    # more than REALTIME_DEADBAND) are sent, plus a full keyframe every REALTIME_KEYFRAME_SECONDS.
+    # Last-sent values are kept per process for at most REALTIME_CHANGE_MAX_STREAMS clients,
+    # REALTIME_CHANGE_MAX_TAGS (ship_id, tag) pairs per client and REALTIME_CHANGE_MAX_ENTRIES
+    # pairs in total (least recently polled clients are dropped first); about 300 bytes per
+    # pair, so about 30 MB per worker process at the defaults
+    REALTIME_DEADBAND = float(os.getenv('REALTIME_DEADBAND', '0'))
+    REALTIME_KEYFRAME_SECONDS = int(os.getenv('REALTIME_KEYFRAME_SECONDS', '60'))
+    REALTIME_CHANGE_MAX_STREAMS = int(os.getenv('REALTIME_CHANGE_MAX_STREAMS', '50'))
+    REALTIME_CHANGE_MAX_TAGS = int(os.getenv('REALTIME_CHANGE_MAX_TAGS', '5000'))
+    REALTIME_CHANGE_MAX_ENTRIES = int(os.getenv('REALTIME_CHANGE_MAX_ENTRIES', '100000'))
+    
+    # Fleet RealTime: maximum number of ships watched by one /api/fleet/realtime poll
+    FLEET_MAX_SHIPS = int(os.getenv('FLEET_MAX_SHIPS', '100'))
+    
     @property
     def DATABASE_URL(self):
         """Construct database connection URL"""
@@ -0,0 +1,939 @@
+/* AMS Bypass Query Application - search page */
+
+// RealTime variables
+let realtimeMode = false;
+let pollInterval = null;
+let lastTimestamp = null;
+let realtimeCursor = null; // Last record id received (server-side cursor)
+let realtimeCursors = {}; // Fleet mode: ship_id -> last record id received
+let fleetShipIds = []; // Fleet mode: ships watched by one batched poll (empty for single ship)
+let realtimeStream = null; // Change-only mode: id of this client's stream of last-sent values
+let realtimeCursorHistory = []; // Oldest first: {at, cursors} after each poll, for late-commit rechecks
+let realtimeSeenIds = {}; // ship_id -> Set of record ids received above the oldest recheck point
+let realtimeMissing = {}; // ship_id -> late-committed record ids to fetch with the next poll
+let realtimeDraining = false; // The next poll fetches the rest of a backlog or missing records (no recheck)
+let pollInFlight = false;
+const MAX_ROWS = 5000; // Ring buffer capacity in realtime mode (oldest rows are dropped)
+const VIRTUAL_OVERSCAN = 10; // Extra rows rendered above/below the visible window
+const ALL_SHIPS_TAB = ''; // Buffer/tab key for the combined view
+let rowBuffers = null; // Tab key -> RowRingBuffer holding realtime rows
+let activeTab = ALL_SHIPS_TAB;
+let pendingRows = []; // Rows received but not yet rendered
+let pendingNewCount = 0;
+let pendingCountUpdate = false; // Result count needs refresh after a poll
+let renderScheduled = false;
+let rowHeight = 28; // Estimated row height in px, measured after first render
+let currentBatch = 0; // Incremented for every rendered batch of new rows
+let highlightBatch = -1; // Rows of this batch are highlighted as new
+
+// Tell the server which zone datetime-local values are in (DST-aware conversion)
+try {
+    const browserZone = Intl.DateTimeFormat().resolvedOptions().timeZone;
+    if (browserZone) {
+        document.cookie = `tz=${browserZone}; path=/; max-age=31536000; SameSite=Lax`;
+    }
+} catch (e) {
+    // No Intl support: the server falls back to DISPLAY_TIMEZONE / its own zone
+}
+let POLL_INTERVAL = 5000; // Default 5 seconds
+
+// Set today's date/time as default if not already set
+window.onload = function() {
+    const now = new Date();
+    // Format as datetime-local (YYYY-MM-DDTHH:MM) in local time
+    // Convert UTC to local for display
+    const year = now.getFullYear();
+    const month = String(now.getMonth() + 1).padStart(2, '0');
+    const day = String(now.getDate()).padStart(2, '0');
+    const hours = String(now.getHours()).padStart(2, '0');
+    const minutes = String(now.getMinutes()).padStart(2, '0');
+    const today = `${year}-${month}-${day}T${hours}:${minutes}`;
+
+    const fromDate = document.getElementById('from_date');
+    const toDate = document.getElementById('to_date');
+
+    if (!fromDate.value) {
+        fromDate.value = today;
+    }
+    if (!toDate.value) {
+        toDate.value = today;
+    }
+};
+
+function resetForm() {
+    const now = new Date();
+    // Format as datetime-local in local time
+    const year = now.getFullYear();
+    const month = String(now.getMonth() + 1).padStart(2, '0');
+    const day = String(now.getDate()).padStart(2, '0');
+    const hours = String(now.getHours()).padStart(2, '0');
+    const minutes = String(now.getMinutes()).padStart(2, '0');
+    const today = `${year}-${month}-${day}T${hours}:${minutes}`;
+
+    document.getElementById('ship_id').value = '';
+    document.getElementById('from_date').value = today;
+    document.getElementById('to_date').value = today;
+    document.getElementById('refresh_interval').value = '5';
+
+    // Stop realtime if active
+    if (realtimeMode) {
+        stopRealtime();
+    }
+}
+
+// RealTime functions
+function toggleRealtime() {
+    if (realtimeMode) {
+        stopRealtime();
+    } else {
+        startRealtime();
+    }
+}
+
+function startRealtime() {
+    const shipIds = getShipIds();
+    if (shipIds.length === 0) {
+        alert('Please enter Ship ID first');
+        return;
+    }
+    // Several comma-separated ships: watch them all through one batched fleet poll
+    fleetShipIds = shipIds.length > 1 ? shipIds : [];
+
+    // Get refresh interval from input
+    const refreshIntervalInput = document.getElementById('refresh_interval');
+    const intervalSeconds = parseInt(refreshIntervalInput.value) || 5;
+    POLL_INTERVAL = intervalSeconds * 1000; // Convert to milliseconds
+
+    realtimeMode = true;
+    const realtimeBtn = document.getElementById('realtime-btn');
+    const realtimeText = document.getElementById('realtime-text');
+    const realtimeStatus = document.getElementById('realtime-status');
+    const searchForm = document.querySelector('.search-form-inline');
+    const pagination = document.querySelector('.pagination');
+    const tableBody = document.getElementById('table-body');
+    const resultsSection = document.getElementById('results-section');
+    const resultCount = document.getElementById('result-count');
+
+    // Create results section and table if they don't exist (for direct RealTime without Search)
+    if (!resultsSection) {
+        // Find the container
+        const container = document.querySelector('.container');
+        if (container) {
+            // Create results section
+            const newResultsSection = document.createElement('section');
+            newResultsSection.className = 'results-section';
+            newResultsSection.id = 'results-section';
+            newResultsSection.innerHTML = `
+                <h2>📊 Search Results</h2>
+                <p class="result-count" id="result-count">RealTime Mode: Waiting for new data...</p>
+                <div class="table-container">
+                    <table class="excel-table" id="data-table">
+                        <thead>
+                            <tr>
+                                <th>Ship ID</th>
+                                <th>TagName</th>
+                                <th>Value</th>
+                                <th>Description</th>
+                                <th>Unit</th>
+                                <th>CreatedTime (UTC)</th>
+                            </tr>
+                        </thead>
+                        <tbody id="table-body"></tbody>
+                    </table>
+                </div>
+            `;
+            // Insert before footer
+            const footer = document.querySelector('footer');
+            if (footer) {
+                container.insertBefore(newResultsSection, footer);
+            } else {
+                container.appendChild(newResultsSection);
+            }
+        }
+    } else {
+        // Clear existing table rows if table exists
+        const tableBodyEl = document.getElementById('table-body');
+        if (tableBodyEl) {
+            tableBodyEl.innerHTML = '';
+        }
+        // Show results section if it exists
+        resultsSection.style.display = 'block';
+    }
+
+    // Update result count
+    const resultCountEl = document.getElementById('result-count');
+    if (resultCountEl) {
+        resultCountEl.textContent = 'RealTime Mode: Waiting for new data...';
+    }
+
+    // Reset the virtualized realtime table
+    initVirtualTable();
+
+    // Update UI
+    realtimeBtn.classList.add('active');
+    realtimeText.textContent = '▶️ RealTime ON';
+    realtimeStatus.style.display = 'inline-flex';
+
+    // Disable search form inputs (but keep RealTime button clickable)
+    const formInputs = searchForm.querySelectorAll('input, button[type="submit"], button#reset-btn');
+    formInputs.forEach(input => {
+        input.disabled = true;
+        input.style.opacity = '0.6';
+        input.style.cursor = 'not-allowed';
+    });
+
+    // Ensure RealTime button remains clickable
+    realtimeBtn.style.pointerEvents = 'auto';
+    realtimeBtn.style.opacity = '1';
+    realtimeBtn.disabled = false;
+
+    // Hide pagination
+    if (pagination) {
+        pagination.style.display = 'none';
+    }
+
+    // Initialize last timestamp (1 minute ago in local timezone - to get recent data)
+    const now = new Date();
+    const oneMinuteAgo = new Date(now.getTime() - 60 * 1000); // 1 minute ago
+    // Use local time
+    const year = oneMinuteAgo.getFullYear();
+    const month = String(oneMinuteAgo.getMonth() + 1).padStart(2, '0');
+    const day = String(oneMinuteAgo.getDate()).padStart(2, '0');
+    const hours = String(oneMinuteAgo.getHours()).padStart(2, '0');
+    const minutes = String(oneMinuteAgo.getMinutes()).padStart(2, '0');
+    const seconds = String(oneMinuteAgo.getSeconds()).padStart(2, '0');
+    lastTimestamp = `${year}-${month}-${day} ${hours}:${minutes}:${seconds}`;
+    realtimeCursor = null;
+    realtimeCursors = {};
+    realtimeCursorHistory = [];
+    realtimeSeenIds = {};
+    realtimeMissing = {};
+    realtimeDraining = false;
+
+    // Change-only mode: the server remembers the values sent to this stream, a new
+    // stream id makes the first poll a full keyframe
+    const changesOnly = document.getElementById('changes_only');
+    realtimeStream = changesOnly && changesOnly.checked
+        ? `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 10)}`
+        : null;
+
+    // Start polling immediately
+    pollRealtimeData();
+    pollInterval = setInterval(pollRealtimeData, POLL_INTERVAL);
+}
+
+function stopRealtime() {
+    realtimeMode = false;
+    const realtimeBtn = document.getElementById('realtime-btn');
+    const realtimeText = document.getElementById('realtime-text');
+    const realtimeStatus = document.getElementById('realtime-status');
+    const searchForm = document.querySelector('.search-form-inline');
+    const pagination = document.querySelector('.pagination');
+
+    // Clear interval
+    if (pollInterval) {
+        clearInterval(pollInterval);
+        pollInterval = null;
+    }
+
+    // Update UI
+    realtimeBtn.classList.remove('active');
+    realtimeText.textContent = '⏸️ RealTime';
+    realtimeStatus.style.display = 'none';
+
+    // Enable search form inputs
+    const formInputs = searchForm.querySelectorAll('input, button[type="submit"], button#reset-btn');
+    formInputs.forEach(input => {
+        input.disabled = false;
+        input.style.opacity = '1';
+        input.style.cursor = '';
+    });
+
+    // Reset RealTime button style
+    realtimeBtn.style.pointerEvents = '';
+    realtimeBtn.style.opacity = '';
+
+    // Show pagination
+    if (pagination) {
+        pagination.style.display = 'block';
+    }
+
+    const resultsSection = document.getElementById('results-section');
+    if (resultsSection) {
+        resultsSection.classList.remove('realtime-mode');
+    }
+
+    lastTimestamp = null;
+    realtimeCursor = null;
+    realtimeCursors = {};
+    realtimeCursorHistory = [];
+    realtimeSeenIds = {};
+    realtimeMissing = {};
+    realtimeDraining = false;
+    realtimeStream = null;
+}
+
+function getShipIds() {
+    // Ship ID input accepts a comma-separated list for fleet RealTime
+    const ids = document.getElementById('ship_id').value.split(',')
+        .map(id => id.trim())
+        .filter(id => id.length > 0);
+    return [...new Set(ids)];
+}
+
+function currentCursors() {
+    // ship_id -> last record id received
+    if (fleetShipIds.length > 0) {
+        return Object.assign({}, realtimeCursors);
+    }
+    return realtimeCursor !== null ? { [getShipIds()[0]]: realtimeCursor } : {};
+}
+
+function recheckCursors() {
+    // Cursors held REALTIME_CURSOR_OVERLAP_SECONDS ago: record ids are allocated before
+    // commit, so records below the current cursor may still appear in that window
+    const overlap = parseInt(document.getElementById('realtime-btn').dataset.cursorOverlap, 10) || 0;
+    if (overlap <= 0 || realtimeCursorHistory.length === 0) return null;
+    const cutoff = Date.now() - overlap * 1000;
+    let entry = realtimeCursorHistory[0];
+    for (let i = 1; i < realtimeCursorHistory.length && realtimeCursorHistory[i].at <= cutoff; i++) {
+        entry = realtimeCursorHistory[i];
+    }
+    return entry.cursors;
+}
+
+function recordCursorHistory() {
+    // Keep the newest snapshot older than the overlap window and everything after it,
+    // and forget seen record ids no recheck can return any more
+    const overlap = parseInt(document.getElementById('realtime-btn').dataset.cursorOverlap, 10) || 0;
+    realtimeCursorHistory.push({ at: Date.now(), cursors: currentCursors() });
+    const cutoff = Date.now() - overlap * 1000;
+    while (realtimeCursorHistory.length > 1 && realtimeCursorHistory[1].at <= cutoff) {
+        realtimeCursorHistory.shift();
+    }
+    const oldest = realtimeCursorHistory[0].cursors;
+    Object.keys(realtimeSeenIds).forEach(id => {
+        if (oldest[id] === undefined) return;
+        realtimeSeenIds[id].forEach(recordId => {
+            if (recordId <= oldest[id]) realtimeSeenIds[id].delete(recordId);
+        });
+    });
+}
+
+function countSeenIds(shipId, low, high) {
+    // Record ids of this ship received in (low, high]
+    let count = 0;
+    (realtimeSeenIds[shipId] || new Set()).forEach(recordId => {
+        if (recordId > low && recordId <= high) count++;
+    });
+    return count;
+}
+
+function noteRecheckIds(shipId, recheckIds) {
+    // The server found a different number of records below the cursor than we have:
+    // ask for the ones we lack (full rows) with the next poll
+    if (!recheckIds) return false;
+    const seen = realtimeSeenIds[shipId] || new Set();
+    const missing = recheckIds.filter(recordId => !seen.has(recordId));
+    if (missing.length === 0) return false;
+    realtimeMissing[shipId] = missing;
+    return true;
+}
+
+function takeNewRows(shipId, rows, recordIds) {
+    // Rechecked records may be sent again: drop the rows of records we already have
+    const seen = realtimeSeenIds[shipId] || (realtimeSeenIds[shipId] = new Set());
+    const duplicates = new Set();
+    (recordIds || []).forEach(recordId => {
+        if (seen.has(recordId)) {
+            duplicates.add(recordId);
+        } else {
+            seen.add(recordId);
+        }
+    });
+    return duplicates.size > 0 ? rows.filter(row => !duplicates.has(row.record_id)) : rows;
+}
+
+function buildRealtimeUrl(recheck) {
+    // The server returns cursors (last record id) that we echo back, so each poll
+    // fetches the records inserted since the previous one; recheck/seen ask it to
+    // count the ids of the overlap window, missing fetches late commits it reported
+    const params = new URLSearchParams();
+    const missing = realtimeMissing;
+    realtimeMissing = {};
+    const appendRecheck = (id, cursor) => {
+        const low = recheck && cursor !== null ? recheck[id] : undefined;
+        params.append('recheck', low !== undefined ? low : '');
+        params.append('seen', low !== undefined ? countSeenIds(id, low, cursor) : '');
+        params.append('missing', missing[id] ? missing[id].join(',') : '');
+    };
+    if (fleetShipIds.length > 0) {
+        // Repeated, positional ship_id/cursor/recheck/seen/missing; one DB query for the whole fleet
+        fleetShipIds.forEach(id => {
+            const cursor = realtimeCursors[id] !== undefined ? realtimeCursors[id] : null;
+            params.append('ship_id', id);
+            params.append('cursor', cursor !== null ? cursor : '');
+            appendRecheck(id, cursor);
+        });
+    } else {
+        params.append('ship_id', getShipIds()[0]);
+        if (realtimeCursor !== null) {
+            params.append('cursor', realtimeCursor);
+            appendRecheck(getShipIds()[0], realtimeCursor);
+        }
+    }
+    if (lastTimestamp && (realtimeCursor === null || fleetShipIds.length > 0)) {
+        params.append('last_timestamp', lastTimestamp);
+    }
+    if (realtimeStream) {
+        // Only tags whose value changed since the last poll (plus periodic keyframes)
+        params.append('changes', '1');
+        params.append('stream', realtimeStream);
+    }
+    const endpoint = fleetShipIds.length > 0 ? '/api/fleet/realtime' : '/api/realtime';
+    return `${endpoint}?${params.toString()}`;
+}
+
+async function pollRealtimeData() {
+    if (!realtimeMode) return;
+    // Never run two polls at once: both would start from the same cursor
+    if (pollInFlight) return;
+
+    if (getShipIds().length === 0) {
+        stopRealtime();
+        return;
+    }
+
+    pollInFlight = true;
+    let drainMore = false;
+    try {
+        // Fetch new data (no recheck while a backlog or missing records are being fetched)
+        const response = await fetch(buildRealtimeUrl(realtimeDraining ? null : recheckCursors()));
+        const data = await response.json();
+
+        if (!data.success) {
+            console.error('Realtime API error:', data.error);
+            return;
+        }
+
+        // Ignore responses that arrive after RealTime was stopped
+        if (!realtimeMode) return;
+
+        // Always update last update time
+        updateLastUpdateTime();
+
+        // Advance cursor(s) and collect new rows
+        let newRows = [];
+        if (data.ships) {
+            // Fleet response: one row group per ship
+            Object.keys(data.ships).forEach(id => {
+                const group = data.ships[id];
+                if (group.cursor !== undefined && group.cursor !== null) {
+                    realtimeCursors[id] = group.cursor;
+                }
+                const groupRows = takeNewRows(id, group.new_rows, group.record_ids);
+                if (noteRecheckIds(id, group.recheck_ids)) drainMore = true;
+                for (let i = 0; i < groupRows.length; i++) {
+                    newRows.push(groupRows[i]);
+                }
+            });
+        } else {
+            newRows = takeNewRows(getShipIds()[0], data.new_rows || [], data.record_ids);
+            if (noteRecheckIds(getShipIds()[0], data.recheck_ids)) drainMore = true;
+            if (data.cursor !== undefined && data.cursor !== null) {
+                realtimeCursor = data.cursor;
+            }
+        }
+        drainMore = drainMore || !!data.has_more;
+        realtimeDraining = drainMore;
+        if (!drainMore) {
+            recordCursorHistory();
+        }
+
+        // Get count of new rows added in this refresh
+        const newRowsCount = newRows.length;
+
+        // Update table with new rows
+        if (newRowsCount > 0) {
+            updateTableWithNewRows(newRows, newRowsCount);
+        } else {
+            // No new rows: clear previous highlight and update result count
+            updateTableWithNewRows([], 0);
+        }
+    } catch (error) {
+        console.error('Error polling realtime data:', error);
+    } finally {
+        pollInFlight = false;
+    }
+
+    // Backlog not fully drained yet: fetch the next page right away
+    if (drainMore && realtimeMode) {
+        setTimeout(pollRealtimeData, 0);
+    }
+}
+
+// Fixed-capacity ring buffer; index 0 is the newest row
+class RowRingBuffer {
+    constructor(capacity) {
+        this.capacity = capacity;
+        this.items = new Array(capacity);
+        this.start = 0; // Index of the oldest entry
+        this.length = 0;
+    }
+
+    push(row, batch) {
+        const entry = { row: row, batch: batch };
+        if (this.length < this.capacity) {
+            this.items[(this.start + this.length) % this.capacity] = entry;
+            this.length++;
+        } else {
+            // Overwrite the oldest entry
+            this.items[this.start] = entry;
+            this.start = (this.start + 1) % this.capacity;
+        }
+    }
+
+    get(index) {
+        const newest = this.start + this.length - 1;
+        return this.items[(newest - index) % this.capacity];
+    }
+}
+
+function initVirtualTable() {
+    rowBuffers = {};
+    rowBuffers[ALL_SHIPS_TAB] = new RowRingBuffer(MAX_ROWS);
+    fleetShipIds.forEach(id => {
+        rowBuffers[id] = new RowRingBuffer(MAX_ROWS);
+    });
+    activeTab = ALL_SHIPS_TAB;
+    pendingRows = [];
+    pendingNewCount = 0;
+    pendingCountUpdate = false;
+    highlightBatch = -1;
+
+    const resultsSection = document.getElementById('results-section');
+    if (resultsSection) {
+        resultsSection.classList.add('realtime-mode');
+    }
+    renderFleetTabs();
+
+    const tableContainer = document.querySelector('#results-section .table-container');
+    if (tableContainer && !tableContainer.dataset.virtualScroll) {
+        // Re-render only the visible window when the user scrolls
+        tableContainer.addEventListener('scroll', scheduleRender, { passive: true });
+        tableContainer.dataset.virtualScroll = '1';
+        tableContainer.scrollTop = 0;
+    }
+
+    const tbody = document.getElementById('table-body');
+    if (tbody) {
+        tbody.innerHTML = '';
+    }
+}
+
+function activeBuffer() {
+    if (!rowBuffers) return null;
+    return rowBuffers[activeTab] || rowBuffers[ALL_SHIPS_TAB];
+}
+
+function renderFleetTabs() {
+    // Tabbed view for fleet mode: "All ships" plus one tab per ship
+    let tabs = document.getElementById('fleet-tabs');
+    if (fleetShipIds.length === 0) {
+        if (tabs) tabs.remove();
+        return;
+    }
+
+    const tableContainer = document.querySelector('#results-section .table-container');
+    if (!tableContainer) return;
+    if (!tabs) {
+        tabs = document.createElement('div');
+        tabs.id = 'fleet-tabs';
+        tabs.className = 'fleet-tabs';
+        tabs.addEventListener('click', function(e) {
+            const button = e.target.closest('button[data-tab]');
+            if (!button) return;
+            selectFleetTab(button.dataset.tab);
+        });
+        tableContainer.parentNode.insertBefore(tabs, tableContainer);
+    }
+
+    const keys = [ALL_SHIPS_TAB].concat(fleetShipIds);
+    tabs.innerHTML = keys.map(key => {
+        const label = key === ALL_SHIPS_TAB ? 'All ships' : escapeHtml(key);
+        const active = key === activeTab ? ' active' : '';
+        return `<button type="button" class="fleet-tab${active}" data-tab="${escapeHtml(key)}">${label}</button>`;
+    }).join('');
+}
+
+function selectFleetTab(key) {
+    activeTab = key;
+    renderFleetTabs();
+    const tableContainer = document.querySelector('#results-section .table-container');
+    if (tableContainer) {
+        tableContainer.scrollTop = 0;
+    }
+    pendingCountUpdate = true;
+    scheduleRender();
+}
+
+function updateTableWithNewRows(newRows, newRowsCount) {
+    if (!rowBuffers) {
+        initVirtualTable();
+    }
+
+    // Queue rows; all rows received before the next frame are rendered together
+    for (let i = 0; i < newRows.length; i++) {
+        pendingRows.push(newRows[i]);
+    }
+    pendingNewCount += newRowsCount;
+    pendingCountUpdate = true;
+    if (newRows.length === 0) {
+        // Previous batch is no longer new
+        highlightBatch = -1;
+    }
+    scheduleRender();
+}
+
+function scheduleRender() {
+    if (renderScheduled) return;
+    renderScheduled = true;
+    requestAnimationFrame(flushAndRender);
+}
+
+function flushAndRender() {
+    renderScheduled = false;
+    if (!rowBuffers) return;
+
+    const tableContainer = document.querySelector('#results-section .table-container');
+    const addedCount = pendingRows.length;
+    const newRowsCount = pendingNewCount;
+    let scrollTop = tableContainer ? tableContainer.scrollTop : 0;
+
+    if (addedCount > 0) {
+        // Rows arrive oldest first, so the last one ends up on top
+        currentBatch++;
+        highlightBatch = currentBatch;
+        let addedToActive = 0;
+        for (let i = 0; i < addedCount; i++) {
+            const row = pendingRows[i];
+            rowBuffers[ALL_SHIPS_TAB].push(row, currentBatch);
+            const shipBuffer = fleetShipIds.length > 0 ? rowBuffers[row.ship_id] : null;
+            if (shipBuffer) {
+                shipBuffer.push(row, currentBatch);
+            }
+            if (activeTab === ALL_SHIPS_TAB || row.ship_id === activeTab) {
+                addedToActive++;
+            }
+        }
+        pendingRows = [];
+        pendingNewCount = 0;
+
+        // Keep the rows the user is looking at in place while new rows are added on top
+        if (scrollTop > 0) {
+            scrollTop += Math.min(addedToActive, activeBuffer().length) * rowHeight;
+        }
+
+        // Ensure results section is visible
+        const resultsSection = document.getElementById('results-section');
+        if (resultsSection) {
+            resultsSection.style.display = 'block';
+        }
+    }
+
+    renderVisibleRows(tableContainer, scrollTop);
+    if (tableContainer && tableContainer.scrollTop !== scrollTop) {
+        tableContainer.scrollTop = scrollTop;
+    }
+
+    if (pendingCountUpdate) {
+        pendingCountUpdate = false;
+        updateResultCount(activeBuffer().length, newRowsCount);
+    }
+}
+
+function renderVisibleRows(tableContainer, scrollTop) {
+    const tbody = document.getElementById('table-body');
+    const rowBuffer = activeBuffer();
+    if (!tbody || !rowBuffer) return;
+
+    const total = rowBuffer.length;
+    const viewportHeight = tableContainer ? tableContainer.clientHeight : window.innerHeight;
+
+    const first = Math.max(0, Math.floor(scrollTop / rowHeight) - VIRTUAL_OVERSCAN);
+    const last = Math.min(total, Math.ceil((scrollTop + viewportHeight) / rowHeight) + VIRTUAL_OVERSCAN);
+
+    // Build the visible window as one string and write it to the DOM once
+    const parts = [];
+    if (first > 0) {
+        parts.push(`<tr class="virtual-spacer" style="height: ${first * rowHeight}px"><td colspan="6"></td></tr>`);
+    }
+    for (let i = first; i < last; i++) {
+        const entry = rowBuffer.get(i);
+        parts.push(buildRowHtml(entry.row, entry.batch === highlightBatch));
+    }
+    if (last < total) {
+        parts.push(`<tr class="virtual-spacer" style="height: ${(total - last) * rowHeight}px"><td colspan="6"></td></tr>`);
+    }
+    tbody.innerHTML = parts.join('');
+
+    // Measure real row height once rows are on screen
+    const sample = tbody.querySelector('tr:not(.virtual-spacer)');
+    if (sample && sample.offsetHeight > 0 && sample.offsetHeight !== rowHeight) {
+        rowHeight = sample.offsetHeight;
+    }
+}
+
+function buildRowHtml(row, highlighted) {
+    // Format value based on type
+    let valueHtml = '';
+    const valueType = row.value_type || 'str';
+    if (valueType === 'bool') {
+        const boolClass = row.value ? 'true' : 'false';
+        valueHtml = `<span class="value-boolean value-${boolClass}">${escapeHtml(row.value)}</span>`;
+    } else if (valueType === 'int' || valueType === 'float') {
+        valueHtml = `<span class="value-number">${escapeHtml(row.value)}</span>`;
+    } else {
+        valueHtml = `<span class="value-text">${escapeHtml(row.value)}</span>`;
+    }
+
+    return `<tr${highlighted ? ' class="new-row-highlight"' : ''}>` +
+        `<td>${escapeHtml(row.ship_id || '')}</td>` +
+        `<td><strong>${escapeHtml(row.tag_name || '')}</strong></td>` +
+        `<td>${valueHtml}</td>` +
+        `<td>${escapeHtml(row.description || '')}</td>` +
+        `<td>${escapeHtml(row.unit || '')}</td>` +
+        `<td>${escapeHtml(row.posix_micros || '')}</td>` +
+        `</tr>`;
+}
+
+// Helper function to escape HTML
+const HTML_ESCAPES = { '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;' };
+function escapeHtml(text) {
+    if (text === null || text === undefined) return '';
+    return String(text).replace(/[&<>"']/g, ch => HTML_ESCAPES[ch]);
+}
+
+function updateResultCount(totalCount, newRowsCount) {
+    const resultCount = document.getElementById('result-count');
+    if (resultCount) {
+        if (realtimeMode) {
+            if (newRowsCount > 0) {
+                resultCount.innerHTML = `Total: <strong>${totalCount}</strong> row(s) | <span style="color: #ff9800; font-weight: bold;">+${newRowsCount} new</span> (RealTime Mode)`;
+            } else {
+                resultCount.textContent = `Total: ${totalCount} row(s) | +0 new (RealTime Mode)`;
+            }
+        } else {
+            // Keep original count if not in realtime mode
+            // This function is mainly for realtime mode
+        }
+    }
+}
+
+function updateLastUpdateTime() {
+    const lastUpdateEl = document.getElementById('realtime-last-update');
+    if (lastUpdateEl) {
+        const now = new Date();
+        // Display in UTC
+        const utcTime = now.toISOString().replace('T', ' ').substring(0, 19) + ' UTC';
+        lastUpdateEl.textContent = `Last update: ${utcTime}`;
+    }
+}
+
+// Show loading indicator when form is submitted
+document.querySelector('.search-form-inline').addEventListener('submit', function(e) {
+    // Stop realtime if active
+    if (realtimeMode) {
+        stopRealtime();
+    }
+
+    // Use datetime-local values as-is (no timezone conversion)
+
+    attachRequestToken(this);
+
+    const loadingOverlay = document.getElementById('loading-overlay');
+    const searchBtn = document.getElementById('search-btn');
+    const searchText = document.getElementById('search-text');
+    const searchLoading = document.getElementById('search-loading');
+
+    // Show loading overlay
+    loadingOverlay.style.display = 'flex';
+
+    // Update button text
+    searchText.style.display = 'none';
+    searchLoading.style.display = 'inline';
+    searchBtn.disabled = true;
+
+    // Prevent form resubmission
+    searchBtn.style.pointerEvents = 'none';
+});
+
+// Pagination also runs the (possibly heavy) search query
+const paginationForm = document.getElementById('pagination-form');
+let pageFetchController = null; // Aborts an in-flight client-rendered page load
+let pageFetchToken = null; // request_token of that page load
+if (paginationForm) {
+    paginationForm.addEventListener('submit', function(e) {
+        attachRequestToken(this);
+
+        // Client-rendered mode: fetch the page as JSON and replace only the table body
+        const page = e.submitter && e.submitter.value;
+        if (this.dataset.clientRender === 'true' && page && window.fetch) {
+            e.preventDefault();
+            loadResultsPage(this, parseInt(page, 10), true);
+            return;
+        }
+        document.getElementById('loading-overlay').style.display = 'flex';
+    });
+
+    if (paginationForm.dataset.clientRender === 'true') {
+        history.replaceState({ page: parseInt(paginationForm.dataset.page, 10) }, '');
+        window.addEventListener('popstate', function(e) {
+            if (e.state && e.state.page) {
+                attachRequestToken(paginationForm);
+                loadResultsPage(paginationForm, e.state.page, false);
+            }
+        });
+    }
+}
+
+function buildPageParams(form, page) {
+    const params = new URLSearchParams(new FormData(form));
+    params.delete('request_token');
+    params.set('page', page);
+    return params;
+}
+
+async function loadResultsPage(form, page, pushHistory) {
+    const pageParams = buildPageParams(form, page);
+    const apiParams = new URLSearchParams(pageParams);
+    apiParams.delete('refresh_interval');
+    apiParams.set('request_token', pendingSearchToken);
+
+    if (pageFetchController) {
+        // Superseded page: cancel its query on the server too, not just the fetch
+        postCancel(pageFetchToken);
+        pageFetchController.abort();
+    }
+    const controller = new AbortController();
+    pageFetchController = controller;
+    pageFetchToken = pendingSearchToken;
+    document.getElementById('loading-overlay').style.display = 'flex';
+
+    try {
+        const response = await fetch(`/api/search?${apiParams}`, { signal: controller.signal });
+        const data = await response.json();
+        if (!response.ok || !data.success) {
+            alert(data.error || `Search failed (HTTP ${response.status})`);
+            return;
+        }
+
+        renderResultsPage(data);
+        if (pushHistory) {
+            history.pushState({ page: data.page }, '', `${form.action}?${pageParams}`);
+        }
+    } catch (error) {
+        if (error.name === 'AbortError') return;
+        // Network or parse error: fall back to the server-rendered page
+        console.error('Error loading page, falling back to full page load:', error);
+        window.location.href = `${form.action}?${pageParams}`;
+    } finally {
+        if (pageFetchController === controller) {
+            pageFetchController = null;
+            pageFetchToken = null;
+            pendingSearchToken = null;
+            document.getElementById('loading-overlay').style.display = 'none';
+        }
+    }
+}
+
+function renderResultsPage(data) {
+    const tbody = document.getElementById('table-body');
+    tbody.innerHTML = data.rows.map(row => buildRowHtml(row, false)).join('');
+
+    const startRow = (data.page - 1) * data.records_per_page + 1;
+    const endRow = (data.page - 1) * data.records_per_page + data.rows.length;
+    const resultRange = document.getElementById('result-range');
+    if (resultRange) {
+        resultRange.textContent = `Showing ${startRow} - ${endRow} of ${data.total_count} row(s) found`;
+    }
+
+    paginationForm.dataset.page = data.page;
+    paginationForm.dataset.totalPages = data.total_pages;
+    renderPaginationControls(data.page, data.total_pages);
+
+    const tableContainer = document.querySelector('.table-container');
+    if (tableContainer) {
+        tableContainer.scrollTop = 0;
+    }
+}
+
+function renderPaginationControls(page, totalPages) {
+    const controls = paginationForm.querySelector('.pagination-controls');
+    if (!controls) return;
+
+    const previous = page > 1
+        ? `<button type="submit" name="page" value="${page - 1}" class="btn-pagination">◀ Previous</button>`
+        : '<button type="button" class="btn-pagination disabled" disabled>◀ Previous</button>';
+    const next = page < totalPages
+        ? `<button type="submit" name="page" value="${page + 1}" class="btn-pagination">Next ▶</button>`
+        : '<button type="button" class="btn-pagination disabled" disabled>Next ▶</button>';
+    controls.innerHTML = `${previous}<span class="page-info">Page ${page} of ${totalPages}</span>${next}`;
+}
+
+// Search cancellation: every search carries a token; if the user cancels or
+// leaves the page before the response arrives, the server cancels the query
+let pendingSearchToken = null;
+
+function attachRequestToken(form) {
+    pendingSearchToken = (window.crypto && crypto.randomUUID)
+        ? crypto.randomUUID()
+        : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+    let input = form.querySelector('input[name="request_token"]');
+    if (!input) {
+        input = document.createElement('input');
+        input.type = 'hidden';
+        input.name = 'request_token';
+        form.appendChild(input);
+    }
+    input.value = pendingSearchToken;
+}
+
+function postCancel(token) {
+    if (!token) return;
+    const body = new URLSearchParams({ request_token: token });
+    navigator.sendBeacon('/api/search/cancel', body);
+}
+
+function sendCancelBeacon() {
+    postCancel(pendingSearchToken);
+    pendingSearchToken = null;
+}
+
+function cancelSearch() {
+    sendCancelBeacon();
+    window.stop();
+    if (pageFetchController) {
+        pageFetchController.abort();
+        pageFetchController = null;
+        pageFetchToken = null;
+    }
+
+    document.getElementById('loading-overlay').style.display = 'none';
+    const searchBtn = document.getElementById('search-btn');
+    document.getElementById('search-text').style.display = 'inline';
+    document.getElementById('search-loading').style.display = 'none';
+    searchBtn.disabled = false;
+    searchBtn.style.pointerEvents = '';
+}
+
+// Fires when this page goes away (tab closed, other navigation, or the search
+// response replacing it - cancelling an already finished search is harmless)
+window.addEventListener('pagehide', sendCancelBeacon);
+
+// Cleanup on page unload
+window.addEventListener('beforeunload', function() {
+    if (realtimeMode && pollInterval) {
+        clearInterval(pollInterval);
+    }
+});
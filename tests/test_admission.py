@@ -0,0 +1,113 @@
+"""
+Tests: admission control for heavy searches (slots, wait queue, timeout)
+"""
+import threading
+import time
+
+import pytest
+
+import app as app_module
+from utils.admission import AdmissionController, AdmissionRejected, range_width_hours
+
+
+def hold_slot(controller, started, release):
+    """Occupy one heavy slot until release is set"""
+    with controller.admit():
+        started.set()
+        release.wait(5)
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.005)
+
+
+def test_light_queries_are_not_limited():
+    controller = AdmissionController(max_concurrent=1, max_queue=0, queue_timeout=0.01)
+    with controller.admit():
+        with controller.admit(heavy=False):
+            assert controller.stats()['running'] == 1
+
+
+def test_full_queue_is_rejected_at_once():
+    controller = AdmissionController(max_concurrent=1, max_queue=0, queue_timeout=5)
+    started, release = threading.Event(), threading.Event()
+    holder = threading.Thread(target=hold_slot, args=(controller, started, release))
+    holder.start()
+    started.wait(2)
+
+    began = time.monotonic()
+    with pytest.raises(AdmissionRejected):
+        with controller.admit():
+            pass
+    assert time.monotonic() - began < 1
+
+    release.set()
+    holder.join()
+
+
+def test_queued_query_times_out():
+    controller = AdmissionController(max_concurrent=1, max_queue=1, queue_timeout=0.05)
+    started, release = threading.Event(), threading.Event()
+    holder = threading.Thread(target=hold_slot, args=(controller, started, release))
+    holder.start()
+    started.wait(2)
+
+    with pytest.raises(AdmissionRejected) as excinfo:
+        with controller.admit():
+            pass
+    assert excinfo.value.retry_after > 0
+    assert controller.stats()['waiting'] == 0
+
+    release.set()
+    holder.join()
+
+
+def test_queued_query_runs_when_a_slot_frees():
+    controller = AdmissionController(max_concurrent=1, max_queue=1, queue_timeout=5)
+    started, release = threading.Event(), threading.Event()
+    holder = threading.Thread(target=hold_slot, args=(controller, started, release))
+    holder.start()
+    started.wait(2)
+
+    admitted = []
+
+    def queued():
+        with controller.admit():
+            admitted.append(controller.stats()['running'])
+
+    waiter = threading.Thread(target=queued)
+    waiter.start()
+    wait_until(lambda: controller.stats()['waiting'] == 1)
+    release.set()
+    holder.join()
+    waiter.join(2)
+
+    assert admitted == [1]
+    assert controller.stats() == {'running': 0, 'waiting': 0, 'max_concurrent': 1, 'max_queue': 1}
+
+
+def test_range_width_hours():
+    assert range_width_hours('2025-01-01T00:00', '2025-01-01T06:00') == 6
+    # A date-only To Date covers the whole day
+    assert range_width_hours('2025-01-01', '2025-01-01') == pytest.approx(23 + 59 / 60)
+    assert range_width_hours(None, '2025-01-01') == float('inf')
+    assert range_width_hours('not a date', '2025-01-01') == float('inf')
+
+
+def test_rejected_search_answers_503_with_retry_after(monkeypatch):
+    monkeypatch.setattr(app_module, '_db_initialized', True, raising=False)
+    monkeypatch.setattr(app_module, 'get_search_validator', lambda *args: None)
+    monkeypatch.setattr(app_module, 'search_admission',
+                        AdmissionController(max_concurrent=0, max_queue=0, queue_timeout=0))
+    monkeypatch.setattr(app_module.Config, 'HEAVY_SEARCH_COST_SOURCE', 'range')
+    monkeypatch.setattr(app_module.Config, 'HEAVY_SEARCH_RANGE_HOURS', 1)
+
+    response = app_module.app.test_client().get(
+        '/api/search?ship_id=S1&from_date=2024-01-01T00:00&to_date=2024-01-01T12:00')
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '5'
+    assert response.get_json()['success'] is False
@@ -0,0 +1,44 @@
+"""
+Regression tests: content-hashed static assets never leave the static folder
+"""
+import pytest
+
+import app as app_module
+from utils.assets import asset_digest, hashed_filename
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(app_module, '_db_initialized', True, raising=False)
+    return app_module.app.test_client()
+
+
+def test_asset_digest_rejects_paths_outside_the_folder(tmp_path):
+    static = tmp_path / 'static'
+    static.mkdir()
+    (static / 'style.css').write_text('body {}')
+    (tmp_path / 'secret.py').write_text('PASSWORD = 1')
+
+    assert asset_digest(str(static), 'style.css') is not None
+    assert asset_digest(str(static), '../secret.py') is None
+    assert asset_digest(str(static), str(tmp_path / 'secret.py')) is None
+    assert asset_digest(str(static), '.') is None
+
+
+def test_traversal_is_rejected_before_hashing(client, monkeypatch):
+    hashed = []
+    monkeypatch.setattr(app_module, 'asset_digest', lambda folder, name: hashed.append(name))
+
+    response = client.get('/assets/..%2f..%2fconfig.abcdefabcdef.py')
+
+    assert response.status_code == 404
+    # The 404 page hashes its own assets, never the requested path
+    assert not [name for name in hashed if 'config' in name]
+
+
+def test_hashed_asset_is_served_with_long_cache(client):
+    digest = asset_digest(app_module.app.static_folder, 'css/style.css')
+    response = client.get('/assets/' + hashed_filename('css/style.css', digest))
+
+    assert response.status_code == 200
+    assert 'immutable' in response.headers['Cache-Control']
@@ -0,0 +1,65 @@
+"""
+Tests: ChangeTracker deadband, keyframes and memory bounds
+"""
+from utils.changes import ChangeTracker, value_changed
+
+
+def row(tag, value, ship_id='S1', created_time='2025-01-01 00:00:00'):
+    return {'ship_id': ship_id, 'tag_name': tag, 'value': value, 'description': '',
+            'unit': '', 'posix_micros': None, 'created_time': created_time, 'value_type': 'float'}
+
+
+def test_value_changed_deadband():
+    assert not value_changed(10.0, 10.4, deadband=0.5)
+    assert value_changed(10.0, 10.6, deadband=0.5)
+    assert value_changed(True, False, deadband=5)  # bool is never numeric
+    assert value_changed('on', 'off', deadband=5)
+
+
+def test_unchanged_values_are_dropped_after_the_first_keyframe():
+    tracker = ChangeTracker(keyframe_seconds=3600, deadband=0.5)
+
+    rows, keyframe = tracker.apply('tab', [row('A', 1.0), row('B', 2.0)])
+    assert keyframe and len(rows) == 2
+
+    rows, keyframe = tracker.apply('tab', [row('A', 1.2), row('B', 3.0)])
+    assert not keyframe
+    assert [r['tag_name'] for r in rows] == ['B']
+
+
+def test_keyframe_resends_missing_tags_first(monkeypatch):
+    tracker = ChangeTracker(keyframe_seconds=60)
+    clock = [1000.0]
+    monkeypatch.setattr('utils.changes.time.monotonic', lambda: clock[0])
+
+    tracker.apply('tab', [row('A', 1, created_time='2025-01-01 00:00:02'),
+                          row('B', 2, created_time='2025-01-01 00:00:01')])
+    clock[0] += 61
+    rows, keyframe = tracker.apply('tab', [row('C', 3, created_time='2025-01-01 00:01:00')])
+
+    assert keyframe
+    # Resent tags oldest first, then the rows of this poll
+    assert [r['tag_name'] for r in rows] == ['B', 'A', 'C']
+    assert rows[0]['value'] == 2 and rows[0]['ship_id'] == 'S1'
+
+
+def test_tags_per_stream_are_bounded():
+    tracker = ChangeTracker(max_tags=2)
+
+    tracker.apply('tab', [row('A', 1), row('B', 1), row('C', 1)])
+
+    assert tracker.entries() == 2
+
+
+def test_global_budget_evicts_least_recently_polled_stream():
+    tracker = ChangeTracker(max_streams=10, max_tags=10, max_entries=5)
+
+    tracker.apply('old', [row('A', 1), row('B', 1)])
+    tracker.apply('busy', [row('A', 1), row('B', 1)])
+    tracker.apply('old', [row('A', 1)])  # 'old' is now the most recently polled
+    tracker.apply('new', [row('A', 1), row('B', 1)])
+
+    assert tracker.entries() == 4
+    # 'busy' was dropped and starts again with a keyframe; 'old' kept its state
+    assert tracker.apply('busy', [row('A', 1)])[1]
+    assert not tracker.apply('old', [row('A', 1)])[1]
@@ -0,0 +1,143 @@
+"""
+Regression tests: workload pool slots are returned on every error and cancel path
+
+Runs without a database; psycopg2.connect is replaced by an in-memory fake.
+"""
+import psycopg2
+import pytest
+from psycopg2.extensions import QueryCanceledError, TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_INERROR
+
+from utils import db
+
+
+class FakeInfo:
+    def __init__(self, connection):
+        self.connection = connection
+
+    @property
+    def transaction_status(self):
+        return TRANSACTION_STATUS_INERROR if self.connection.aborted else TRANSACTION_STATUS_IDLE
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        if self.connection.aborted:
+            raise psycopg2.errors.InFailedSqlTransaction("current transaction is aborted")
+        if FakeConnection.fail_next is not None and query != "SELECT 1":
+            error, FakeConnection.fail_next = FakeConnection.fail_next, None
+            self.connection.aborted = True
+            raise error
+
+    def fetchone(self):
+        return (1,)
+
+    def fetchall(self):
+        return []
+
+    def mogrify(self, query, params=None):
+        return query.encode()
+
+
+class FakeConnection:
+    # Error raised by the next query (other than the SELECT 1 health check) on any connection
+    fail_next = None
+
+    def __init__(self):
+        self.closed = 0
+        self.aborted = False
+        self.autocommit = False
+        self.info = FakeInfo(self)
+
+    def cursor(self, *args, **kwargs):
+        return FakeCursor(self)
+
+    def rollback(self):
+        self.aborted = False
+
+    def commit(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+    def cancel(self):
+        pass
+
+
+@pytest.fixture
+def search_pool(monkeypatch):
+    """Fake search pool with two connections and a short exhaustion wait"""
+    workloads = {name: dict(settings) for name, settings in db.config.DB_WORKLOADS.items()}
+    workloads['search'].update(minconn=0, maxconn=2, pool_wait_seconds=0.2)
+    monkeypatch.setattr(db.config, 'DB_WORKLOADS', workloads)
+    monkeypatch.setattr(db.config, 'DB_REPLICA_HOSTS', '')
+    monkeypatch.setattr(db, 'RETRY_DELAY', 0)
+    monkeypatch.setattr(psycopg2, 'connect', lambda *args, **kwargs: FakeConnection())
+    monkeypatch.setattr(FakeConnection, 'fail_next', None)
+    db.init_db_pool()
+    yield db.get_pool(db.WORKLOAD_SEARCH, db.PRIMARY_ENDPOINT)
+    for pool_key in list(db.connection_pools):
+        db.close_pool(pool_key)
+
+
+def test_cancelled_queries_return_their_connection(search_pool):
+    for attempt in range(3):
+        token = f"cancel-test-{attempt}"
+        FakeConnection.fail_next = QueryCanceledError("canceling statement due to user request")
+        db.cancelled_tokens[token] = 0  # cancel_query() arrived while the query ran
+        with pytest.raises(db.QueryCancelled):
+            db.execute_query('SHIP', cancel_token=token)
+        assert db.pool_usage(db.WORKLOAD_SEARCH) == 0
+
+
+def test_statement_timeout_returns_its_connection(search_pool):
+    for _ in range(3):
+        FakeConnection.fail_next = QueryCanceledError("canceling statement due to statement timeout")
+        with pytest.raises(QueryCanceledError):
+            db.execute_query('SHIP')
+        assert db.pool_usage(db.WORKLOAD_SEARCH) == 0
+
+
+def test_sql_errors_return_their_connection(search_pool):
+    for _ in range(3):
+        FakeConnection.fail_next = psycopg2.errors.SyntaxError("syntax error")
+        with pytest.raises(psycopg2.Error):
+            db.execute_query('SHIP')
+        assert db.pool_usage(db.WORKLOAD_SEARCH) == 0
+    assert db.execute_query('SHIP') == []
+
+
+def test_caller_errors_return_their_connection(search_pool):
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            with db.get_db_connection(db.WORKLOAD_SEARCH):
+                raise ValueError("caller failed")
+        assert db.pool_usage(db.WORKLOAD_SEARCH) == 0
+
+
+def test_exhausted_pool_reclaims_closed_connections(search_pool):
+    # Two slots leaked by connections closed without putconn
+    for _ in range(2):
+        search_pool.getconn().close()
+    assert db.pool_usage(db.WORKLOAD_SEARCH) == 2
+
+    assert db.execute_query('SHIP') == []
+    assert db.pool_usage(db.WORKLOAD_SEARCH) == 0
+
+
+def test_exhausted_pool_raises_pool_exhausted(search_pool):
+    busy = [search_pool.getconn() for _ in range(2)]
+    with pytest.raises(db.PoolExhausted):
+        db.execute_query('SHIP')
+    for connection in busy:
+        search_pool.putconn(connection)
+    assert db.pool_usage(db.WORKLOAD_SEARCH) == 0
@@ -0,0 +1,127 @@
+"""
+Regression tests: RealTime late-commit recheck (recheck/seen/missing)
+
+Runs without a database; the record queries used by the endpoints are replaced
+by an in-memory table.
+"""
+import json
+from datetime import datetime
+
+import pytest
+
+import app as app_module
+
+
+class FakeTable:
+    """Committed records, plus every record query the endpoints made"""
+
+    def __init__(self):
+        self.records = []
+        self.calls = []
+
+    def add(self, record_id, ship_id='S1'):
+        self.records.append({
+            'id': record_id,
+            'ship_id': ship_id,
+            'interface_id': 'bypass_ECS01_AI',
+            'json_data': json.dumps({'AI000': {'value': record_id}}),
+            'created_time': datetime(2025, 1, 1, 0, 0, record_id % 60),
+            'server_created_time': None
+        })
+        self.records.sort(key=lambda record: record['id'])
+
+    def records_after(self, ship_id, after_id, limit=500):
+        self.calls.append(('after', ship_id, after_id))
+        return [r for r in self.records if r['ship_id'] == ship_id and r['id'] > after_id][:limit]
+
+    def fleet_records_after(self, cursors, limit=500):
+        self.calls.append(('fleet_after', dict(cursors)))
+        return [r for r in self.records if r['ship_id'] in cursors and r['id'] > cursors[r['ship_id']]][:limit]
+
+    def record_ids_between(self, ranges):
+        self.calls.append(('ids', dict(ranges)))
+        ids = {}
+        for record in self.records:
+            low_high = ranges.get(record['ship_id'])
+            if low_high and low_high[0] < record['id'] <= low_high[1]:
+                ids.setdefault(record['ship_id'], []).append(record['id'])
+        return ids
+
+    def records_by_ids(self, ship_ids, ids):
+        self.calls.append(('by_ids', list(ids)))
+        return [r for r in self.records if r['ship_id'] in ship_ids and r['id'] in ids]
+
+
+@pytest.fixture
+def table(monkeypatch):
+    table = FakeTable()
+    monkeypatch.setattr(app_module, '_db_initialized', True, raising=False)
+    monkeypatch.setattr(app_module, 'fetch_records_after', table.records_after)
+    monkeypatch.setattr(app_module, 'fetch_fleet_records_after', table.fleet_records_after)
+    monkeypatch.setattr(app_module, 'fetch_fleet_record_ids_between', table.record_ids_between)
+    monkeypatch.setattr(app_module, 'fetch_records_by_ids', table.records_by_ids)
+    return table
+
+
+@pytest.fixture
+def client():
+    return app_module.app.test_client()
+
+
+def test_matching_count_reads_only_ids(table, client):
+    for record_id in (1, 2, 4):
+        table.add(record_id)
+
+    data = client.get('/api/realtime?ship_id=S1&cursor=4&recheck=0&seen=3').get_json()
+
+    assert data['success'] and data['record_ids'] == [] and 'recheck_ids' not in data
+    # The recheck range is counted by id; full rows are only read above the cursor
+    assert ('ids', {'S1': (0, 4)}) in table.calls
+    assert ('after', 'S1', 4) in table.calls
+    assert all(call[0] != 'by_ids' or call[1] == [] for call in table.calls)
+
+
+def test_late_commit_is_reported_then_fetched_by_id(table, client):
+    for record_id in (1, 2, 4):
+        table.add(record_id)
+    table.add(3)  # committed after the client received id 4
+
+    data = client.get('/api/realtime?ship_id=S1&cursor=4&recheck=0&seen=3').get_json()
+    assert data['recheck_ids'] == [1, 2, 3, 4]
+    assert data['record_ids'] == []
+
+    data = client.get('/api/realtime?ship_id=S1&cursor=4&missing=3').get_json()
+    assert data['record_ids'] == [3]
+    assert data['cursor'] == 4
+    assert {row['record_id'] for row in data['new_rows']} == {3}
+
+
+def test_missing_ids_above_the_cursor_are_ignored(table, client):
+    table.add(1)
+    table.add(5)
+
+    client.get('/api/realtime?ship_id=S1&cursor=1&missing=5')
+
+    assert ('by_ids', []) in table.calls
+
+
+def test_fleet_recheck_is_per_ship(table, client):
+    for record_id, ship_id in ((1, 'S1'), (2, 'S1'), (3, 'S2'), (4, 'S1'), (5, 'S2')):
+        table.add(record_id, ship_id)
+
+    data = client.get('/api/fleet/realtime?ship_id=S1&cursor=4&recheck=0&seen=2&missing='
+                      '&ship_id=S2&cursor=5&recheck=0&seen=2&missing=').get_json()
+
+    assert data['ships']['S1']['recheck_ids'] == [1, 2, 4]
+    assert 'recheck_ids' not in data['ships']['S2']
+    assert ('ids', {'S1': (0, 4), 'S2': (0, 5)}) in table.calls
+
+    data = client.get('/api/fleet/realtime?ship_id=S1&cursor=4&recheck=&seen=&missing=2'
+                      '&ship_id=S2&cursor=5&recheck=&seen=&missing=').get_json()
+    assert data['ships']['S1']['record_ids'] == [2]
+    assert data['ships']['S2']['record_ids'] == []
+
+
+def test_invalid_recheck_parameters_are_rejected(table, client):
+    assert client.get('/api/realtime?ship_id=S1&cursor=4&recheck=x').status_code == 400
+    assert client.get('/api/realtime?ship_id=S1&cursor=4&missing=1,x').status_code == 400
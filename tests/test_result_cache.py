@@ -0,0 +1,115 @@
+"""
+Tests: result cache and ETag/conditional GET for historical search ranges
+
+Runs without a database; the range validator and record query used by the
+endpoint are replaced by in-memory fakes.
+"""
+import json
+from datetime import datetime
+
+import pytest
+
+import app as app_module
+from utils.cache import ResultCache
+
+SEARCH_URL = '/api/search?ship_id=S1&from_date=2024-01-01T00:00&to_date=2024-01-01T01:00'
+
+
+class FakeRange:
+    """Records of one closed range, plus the validator and query calls made"""
+
+    def __init__(self):
+        self.validator = {'max_id': 2, 'total': 2, 'last_modified': datetime(2024, 1, 1, 0, 30)}
+        self.queries = 0
+
+    def range_validator(self, **kwargs):
+        return dict(self.validator)
+
+    def execute_query(self, **kwargs):
+        self.queries += 1
+        return [{'id': record_id, 'ship_id': 'S1', 'interface_id': 'bypass_ECS01_AI',
+                 'json_data': json.dumps({'AI000': {'value': record_id}}),
+                 'created_time': datetime(2024, 1, 1, 0, record_id)}
+                for record_id in range(1, self.validator['total'] + 1)]
+
+
+@pytest.fixture
+def records(monkeypatch):
+    records = FakeRange()
+    app_module.result_cache.clear()
+    monkeypatch.setattr(app_module, '_db_initialized', True, raising=False)
+    monkeypatch.setattr(app_module, 'range_validator', records.range_validator)
+    monkeypatch.setattr(app_module, 'execute_query', records.execute_query)
+    monkeypatch.setattr(app_module.Config, 'HEAVY_SEARCH_COST_SOURCE', 'range')
+    yield records
+    app_module.result_cache.clear()
+
+
+@pytest.fixture
+def client():
+    return app_module.app.test_client()
+
+
+def test_cache_hit_requires_the_same_validator():
+    cache = ResultCache()
+    cache.put('key', {'max_id': 1}, [{'tag_name': 'A'}])
+
+    assert cache.get('key', {'max_id': 1}) == [{'tag_name': 'A'}]
+    assert cache.get('key', {'max_id': 2}) is None
+    # The stale entry was dropped
+    assert cache.get('key', {'max_id': 1}) is None
+
+
+def test_cache_evicts_least_recently_used_within_the_row_budget():
+    cache = ResultCache(max_entries=10, max_rows=3)
+    cache.put('a', {}, [{}, {}])
+    cache.put('b', {}, [{}])
+    cache.get('a', {})
+    cache.put('c', {}, [{}])
+
+    assert cache.get('b', {}) is None
+    assert cache.get('a', {}) is not None and cache.get('c', {}) is not None
+    # A single result larger than the budget is never cached
+    cache.put('d', {}, [{}] * 4)
+    assert cache.get('d', {}) is None
+
+
+def test_matching_etag_returns_304_without_querying(records, client):
+    response = client.get(SEARCH_URL)
+    etag = response.headers['ETag']
+    assert response.status_code == 200 and records.queries == 1
+    assert response.headers['Cache-Control'] == 'private, no-cache'
+
+    response = client.get(SEARCH_URL, headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert records.queries == 1
+
+
+def test_request_token_does_not_change_the_etag(records, client):
+    first = client.get(SEARCH_URL + '&request_token=a').headers['ETag']
+    second = client.get(SEARCH_URL + '&request_token=b').headers['ETag']
+
+    assert first == second
+    # The second request was served from the result cache
+    assert records.queries == 1
+
+
+def test_changed_range_gets_a_new_etag_and_fresh_rows(records, client):
+    etag = client.get(SEARCH_URL).headers['ETag']
+    records.validator.update(max_id=3, total=3)  # late insert into the range
+
+    response = client.get(SEARCH_URL, headers={'If-None-Match': etag})
+
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert response.get_json()['total_count'] == 3
+    assert records.queries == 2
+
+
+def test_open_range_is_not_cacheable(records, client):
+    to_date = datetime.now().strftime('%Y-%m-%dT%H:%M')
+    response = client.get(f'/api/search?ship_id=S1&from_date=2024-01-01T00:00&to_date={to_date}')
+
+    assert response.status_code == 200
+    assert 'ETag' not in response.headers
@@ -0,0 +1,86 @@
+"""
+Tests: local <-> UTC conversion across DST changes and $ship_posixmicros formatting
+"""
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+import app as app_module
+from utils import timestamps
+from utils.parser import build_table_rows
+from utils.timestamps import (convert_posix_micros, convert_posix_micros_batch, get_timezone,
+                              is_valid_timezone, local_to_utc)
+
+POSIX_MICROS = 1761798747183773
+FORMATTED = '2025-10-30 04:32:27.183773 UTC'
+
+
+def test_offset_follows_dst_per_value():
+    new_york = get_timezone('America/New_York')
+
+    assert local_to_utc(datetime(2025, 1, 15, 12, 0), new_york) == datetime(2025, 1, 15, 17, 0, tzinfo=timezone.utc)
+    assert local_to_utc(datetime(2025, 7, 15, 12, 0), new_york) == datetime(2025, 7, 15, 16, 0, tzinfo=timezone.utc)
+    # Either side of the spring-forward change on 2025-03-09 02:00
+    assert local_to_utc(datetime(2025, 3, 9, 1, 30), new_york).hour == 6
+    assert local_to_utc(datetime(2025, 3, 9, 3, 30), new_york).hour == 7
+
+
+def test_ambiguous_fall_back_time_uses_the_first_occurrence():
+    berlin = get_timezone('Europe/Berlin')
+
+    # 02:30 happens twice on 2025-10-26; without fold the earlier (CEST) one is meant
+    assert local_to_utc(datetime(2025, 10, 26, 2, 30), berlin) == datetime(2025, 10, 26, 0, 30, tzinfo=timezone.utc)
+    assert local_to_utc(datetime(2025, 10, 26, 3, 30), berlin) == datetime(2025, 10, 26, 2, 30, tzinfo=timezone.utc)
+
+
+def test_unknown_zone_is_rejected():
+    assert is_valid_timezone('Asia/Seoul')
+    assert not is_valid_timezone('Mars/Olympus_Mons')
+    with pytest.raises(ValueError):
+        get_timezone('Mars/Olympus_Mons')
+
+
+def test_search_dates_are_converted_in_the_requested_zone():
+    assert app_module.convert_local_to_utc('2025-03-08T12:00', 'America/New_York') == '2025-03-08T17:00'
+    assert app_module.convert_local_to_utc('2025-03-10T12:00', 'America/New_York') == '2025-03-10T16:00'
+    # Date-only values are passed through
+    assert app_module.convert_local_to_utc('2025-03-10', 'America/New_York') == '2025-03-10'
+
+
+def test_last_timestamp_local_and_iso_forms():
+    with app_module.app.app_context():
+        assert (app_module.parse_last_timestamp('2025-07-01 09:00:00', 'Asia/Seoul')
+                == datetime(2025, 7, 1, 0, 0, tzinfo=timezone.utc))
+        assert (app_module.parse_last_timestamp('2025-07-01T09:00:00+02:00')
+                == datetime(2025, 7, 1, 7, 0, tzinfo=timezone.utc))
+        assert (app_module.parse_last_timestamp('2025-07-01T09:00:00')
+                == datetime(2025, 7, 1, 9, 0, tzinfo=timezone.utc))
+
+
+def test_numeric_string_posix_micros():
+    assert convert_posix_micros(POSIX_MICROS) == FORMATTED
+    assert convert_posix_micros(str(POSIX_MICROS)) == FORMATTED
+    # Unparseable values are shown as they are
+    assert convert_posix_micros('n/a') == 'n/a'
+
+
+@pytest.mark.parametrize('use_numpy', [False, True])
+def test_batch_matches_scalar_conversion(monkeypatch, use_numpy):
+    if use_numpy:
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(timestamps, 'np', None)
+
+    values = [POSIX_MICROS, str(POSIX_MICROS), 0, 'n/a', True]
+    assert convert_posix_micros_batch(values) == [convert_posix_micros(v) for v in values]
+    assert convert_posix_micros_batch([POSIX_MICROS, POSIX_MICROS + 1])[1] == '2025-10-30 04:32:27.183774 UTC'
+
+
+def test_table_rows_format_string_posix_micros():
+    record = {'ship_id': 'S1', 'created_time': datetime(2025, 10, 30, 4, 32),
+              'json_data': json.dumps({'$ship_posixmicros': str(POSIX_MICROS), 'AI000': {'value': 1}})}
+
+    rows = build_table_rows([record])
+
+    assert [row['posix_micros'] for row in rows] == [FORMATTED]
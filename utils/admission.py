@@ -0,0 +1,107 @@
+"""
+Admission control utility module
+Limits how many heavy searches run at once so they cannot exhaust the database pools
+"""
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+
+class AdmissionRejected(Exception):
+    """Raised when a heavy query cannot be admitted (queue full or wait timed out)"""
+
+    def __init__(self, message, retry_after=5):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Bounded semaphore with a bounded wait queue
+
+    At most max_concurrent heavy queries run at once. Up to max_queue more may wait
+    (at most queue_timeout seconds each); anything beyond that is rejected at once so
+    the caller can answer 503 instead of piling up threads and connections.
+    """
+
+    def __init__(self, max_concurrent=2, max_queue=4, queue_timeout=10.0):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._running = 0
+
+    @contextmanager
+    def admit(self, heavy=True):
+        """
+        Run the body under admission control
+
+        Args:
+            heavy: Light queries are not limited and enter immediately
+
+        Raises:
+            AdmissionRejected: If the queue is full or the wait timed out
+        """
+        if not heavy:
+            yield
+            return
+
+        if not self._semaphore.acquire(blocking=False):
+            with self._lock:
+                if self._waiting >= self.max_queue:
+                    raise AdmissionRejected("Too many heavy searches are running, please retry shortly")
+                self._waiting += 1
+            try:
+                acquired = self._semaphore.acquire(timeout=self.queue_timeout)
+            finally:
+                with self._lock:
+                    self._waiting -= 1
+            if not acquired:
+                raise AdmissionRejected("Timed out waiting for a heavy search slot, please retry shortly")
+
+        with self._lock:
+            self._running += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._running -= 1
+            self._semaphore.release()
+
+    def stats(self):
+        """Get current running/waiting counts"""
+        with self._lock:
+            return {'running': self._running, 'waiting': self._waiting,
+                    'max_concurrent': self.max_concurrent, 'max_queue': self.max_queue}
+
+
+def range_width_hours(from_date_utc, to_date_utc):
+    """
+    Get the width of a search range in hours
+
+    Args:
+        from_date_utc: Start (YYYY-MM-DDTHH:MM or YYYY-MM-DD), None for unbounded
+        to_date_utc: End (YYYY-MM-DDTHH:MM or YYYY-MM-DD), None for now
+
+    Returns:
+        Width in hours (unbounded ranges count as infinite)
+    """
+    def parse(value, end=False):
+        if 'T' in value:
+            return datetime.strptime(value, '%Y-%m-%dT%H:%M')
+        parsed = datetime.strptime(value, '%Y-%m-%d')
+        # A date-only To Date covers the whole day
+        return parsed.replace(hour=23, minute=59) if end else parsed
+
+    if not from_date_utc:
+        return float('inf')
+
+    try:
+        start = parse(from_date_utc)
+        end = parse(to_date_utc, end=True) if to_date_utc else datetime.now(timezone.utc).replace(tzinfo=None)
+    except ValueError:
+        return float('inf')
+
+    return max((end - start).total_seconds() / 3600.0, 0.0)
@@ -0,0 +1,75 @@
+"""
+Static asset utility module
+Content-hash file names for static assets so they can be cached indefinitely
+"""
+import hashlib
+import os
+import re
+import stat as stat_module
+import threading
+from typing import Dict, Optional, Tuple
+
+from werkzeug.security import safe_join
+
+HASH_LENGTH = 12
+
+# name.<hash>.ext
+_HASHED_NAME = re.compile(r'^(?P<stem>.+)\.(?P<digest>[0-9a-f]{%d})(?P<ext>\.[^./]+)$' % HASH_LENGTH)
+
+# (static folder, filename) -> (mtime, size, digest)
+_digests: Dict[Tuple[str, str], Tuple[float, int, str]] = {}
+_digests_lock = threading.Lock()
+
+
+def asset_digest(static_folder: str, filename: str) -> Optional[str]:
+    """
+    Get the content hash of a static file
+
+    The hash is recomputed only when the file's mtime or size changes. filename
+    may come from a URL, so it must stay inside static_folder.
+
+    Returns:
+        Hex digest (HASH_LENGTH chars), or None if the file does not exist or is
+        outside static_folder
+    """
+    path = safe_join(static_folder, filename)
+    if path is None:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    if not stat_module.S_ISREG(stat.st_mode):
+        return None
+
+    key = (static_folder, filename)
+    with _digests_lock:
+        cached = _digests.get(key)
+        if cached and cached[0] == stat.st_mtime and cached[1] == stat.st_size:
+            return cached[2]
+
+    with open(path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()[:HASH_LENGTH]
+
+    with _digests_lock:
+        _digests[key] = (stat.st_mtime, stat.st_size, digest)
+    return digest
+
+
+def hashed_filename(filename: str, digest: str) -> str:
+    """css/style.css -> css/style.<digest>.css"""
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}.{digest}{ext}"
+
+
+def split_hashed_filename(hashed: str) -> Optional[Tuple[str, str]]:
+    """
+    Split a hashed file name back into (filename, digest)
+
+    Returns:
+        Tuple of original filename and digest, or None if the name carries no hash
+    """
+    match = _HASHED_NAME.match(hashed)
+    if not match:
+        return None
+    return match.group('stem') + match.group('ext'), match.group('digest')
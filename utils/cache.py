@@ -0,0 +1,88 @@
+"""
+Result cache utility module
+Caches processed search results for fully historical (immutable) date ranges
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache of processed table rows
+
+    Each entry is stored together with the validator it was computed for, so a
+    lookup only hits when the range has not changed since. Size is bounded by
+    both the number of entries and the total number of cached rows; the least
+    recently used entries are evicted first.
+    """
+
+    def __init__(self, max_entries: int = 32, max_rows: int = 500_000):
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self._entries = OrderedDict()
+        self._total_rows = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, validator: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+        """
+        Get cached rows for key if they were computed for the same validator
+
+        Returns:
+            Cached list of rows, or None on miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            cached_validator, rows = entry
+            if cached_validator != validator:
+                # Range changed (late insert/delete), drop stale entry
+                self._remove(key)
+                return None
+
+            self._entries.move_to_end(key)
+            return rows
+
+    def put(self, key: Hashable, validator: Dict[str, Any], rows: List[Dict[str, Any]]):
+        """Store rows for key, evicting least recently used entries if needed"""
+        if len(rows) > self.max_rows:
+            # Never cache a single result larger than the whole budget
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (validator, rows)
+            self._total_rows += len(rows)
+
+            while self._entries and (len(self._entries) > self.max_entries or self._total_rows > self.max_rows):
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+
+    def clear(self):
+        """Remove all entries"""
+        with self._lock:
+            self._entries.clear()
+            self._total_rows = 0
+
+    def _remove(self, key: Hashable):
+        _, rows = self._entries.pop(key)
+        self._total_rows -= len(rows)
+
+
+def make_etag(*parts: Any) -> str:
+    """
+    Build a strong ETag value from the given parts
+
+    Args:
+        parts: Values identifying the response (query parameters and validator)
+
+    Returns:
+        Hex digest suitable for Response.set_etag()
+    """
+    raw = '|'.join('' if part is None else str(part) for part in parts)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
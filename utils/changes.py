@@ -0,0 +1,135 @@
+"""
+Change tracking utility module
+Reduces RealTime table rows to the tags whose value changed since the last poll,
+with a periodic full keyframe so clients can resynchronize
+"""
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def value_changed(last: Any, new: Any, deadband: float = 0.0) -> bool:
+    """
+    Check whether a tag value should be sent again
+
+    Numeric values (not bool) only count as changed when they moved by more than
+    deadband; every other value is compared for equality.
+    """
+    numeric = (int, float)
+    if (deadband > 0 and isinstance(last, numeric) and isinstance(new, numeric)
+            and not isinstance(last, bool) and not isinstance(new, bool)):
+        return abs(new - last) > deadband
+    return last != new
+
+
+# Row fields kept per tracked tag, besides the (ship_id, tag_name) key; enough to
+# compare values and to rebuild the row for a keyframe
+TRACKED_FIELDS = ('value', 'description', 'unit', 'posix_micros', 'created_time', 'value_type')
+VALUE_INDEX = 0
+
+
+def shared(value: Any) -> Any:
+    """Intern strings repeated across tags and streams (names, units, timestamps)"""
+    return sys.intern(value) if type(value) is str else value
+
+
+class ChangeTracker:
+    """
+    Thread-safe last-sent tag values per RealTime stream
+
+    A stream is one polling client (browser tab). For each stream the last sent
+    TRACKED_FIELDS per (ship_id, tag_name) are kept as a tuple (about 300 bytes
+    per tag, strings shared between streams); apply() drops rows whose value has
+    not changed. Every keyframe_seconds (and on the first poll of a stream) a
+    keyframe is sent instead: the last row of every other tracked tag, then all
+    rows of the poll. Streams, tags per stream and tags across all streams
+    (max_entries) are bounded; the least recently used are evicted first, and an
+    evicted stream simply starts again with a keyframe.
+    """
+
+    def __init__(self, max_streams: int = 50, max_tags: int = 5000, max_entries: int = 100000,
+                 keyframe_seconds: float = 60.0, deadband: float = 0.0):
+        self.max_streams = max_streams
+        self.max_tags = max_tags
+        self.max_entries = max_entries
+        self.keyframe_seconds = keyframe_seconds
+        self.deadband = deadband
+        # stream id -> {'values': OrderedDict of (ship_id, tag_name) -> TRACKED_FIELDS tuple,
+        #               'keyframe_at': float}
+        self._streams = OrderedDict()
+        self._entries = 0  # Tracked tags across all streams
+        self._lock = threading.Lock()
+
+    def apply(self, stream_id: str, rows: List[Dict[str, Any]],
+              deadband: Optional[float] = None) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Filter table rows (oldest first) down to changed tag values
+
+        Args:
+            stream_id: Client-chosen id of the polling stream
+            rows: Rows from build_table_rows with created_time already a string
+            deadband: Numeric deadband for this stream (default: tracker deadband)
+
+        Returns:
+            (rows to send, keyframe) - on a keyframe the resent rows of tags missing
+            from this poll come first (oldest first), followed by the poll's rows
+        """
+        if deadband is None:
+            deadband = self.deadband
+        now = time.monotonic()
+
+        with self._lock:
+            stream = self._streams.get(stream_id)
+            if stream is None:
+                stream = {'values': OrderedDict(), 'keyframe_at': None}
+                self._streams[stream_id] = stream
+                while len(self._streams) > self.max_streams:
+                    self._evict_oldest_stream()
+            else:
+                self._streams.move_to_end(stream_id)
+
+            values = stream['values']
+            tracked = len(values)
+            keyframe = stream['keyframe_at'] is None or now - stream['keyframe_at'] >= self.keyframe_seconds
+            if keyframe:
+                stream['keyframe_at'] = now
+
+            changed = []
+            for row in rows:
+                key = (shared(row.get('ship_id')), shared(row.get('tag_name')))
+                last = values.get(key)
+                if keyframe or last is None or value_changed(last[VALUE_INDEX], row.get('value'), deadband):
+                    values[key] = tuple(shared(row.get(field)) if field != 'value' else row.get(field)
+                                        for field in TRACKED_FIELDS)
+                    changed.append(row)
+                values.move_to_end(key)
+
+            if keyframe:
+                # Resend the last value of tags that did not appear in this poll as their
+                # own group, ahead of (older than) the rows of this poll
+                sent = set((row.get('ship_id'), row.get('tag_name')) for row in changed)
+                resent = [{'ship_id': key[0], 'tag_name': key[1], **dict(zip(TRACKED_FIELDS, fields))}
+                          for key, fields in values.items() if key not in sent]
+                resent.sort(key=lambda row: row.get('created_time') or '')
+                changed = resent + changed
+
+            while len(values) > self.max_tags:
+                values.popitem(last=False)
+
+            # Global budget: drop whole least recently polled streams (never this one)
+            self._entries += len(values) - tracked
+            while self._entries > self.max_entries and len(self._streams) > 1:
+                self._evict_oldest_stream()
+
+        return changed, keyframe
+
+    def entries(self) -> int:
+        """Number of tracked tags across all streams"""
+        with self._lock:
+            return self._entries
+
+    def _evict_oldest_stream(self):
+        _, stream = self._streams.popitem(last=False)
+        self._entries -= len(stream['values'])
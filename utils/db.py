@@ -6,44 +6,134 @@ import psycopg2
 from psycopg2.extras import RealDictCursor
 from psycopg2 import pool
 from psycopg2 import OperationalError, InterfaceError
+from psycopg2.extensions import QueryCanceledError
+from collections import OrderedDict
 from contextlib import contextmanager
+import io
+import threading
 import time
+import uuid
 from config import Config
 
 config = Config()
 
-# Connection pool
-connection_pool = None
+# Connection pools, one per (workload, endpoint name)
+# Separate pools per workload keep heavy searches/exports from starving realtime polls
+connection_pools = {}
+pools_lock = threading.Lock()
 MAX_RETRIES = 3
 RETRY_DELAY = 1  # seconds
 
+# Workload classes (see Config.DB_WORKLOADS)
+WORKLOAD_REALTIME = 'realtime'
+WORKLOAD_SEARCH = 'search'
+WORKLOAD_EXPORT = 'export'
+WORKLOAD_INGEST = 'ingest'
+WORKLOAD_MAINTENANCE = 'maintenance'
+DEFAULT_WORKLOAD = WORKLOAD_SEARCH
+
+PRIMARY_ENDPOINT = 'primary'
+
+# Cancellable queries: token -> connection currently executing the query
+active_queries = {}
+# Tokens cancelled before (or while) their query was registered, bounded
+cancelled_tokens = OrderedDict()
+MAX_CANCELLED_TOKENS = 1000
+queries_lock = threading.Lock()
+
+# Replica lag cache: endpoint name -> (checked_at, lag_seconds or None if unreachable)
+replica_lag_cache = {}
+replica_round_robin = 0
+
+
+def get_endpoints():
+    """
+    Get configured database endpoints
+    
+    Returns:
+        Dictionary of endpoint name -> {'host', 'port', 'replica'}; 'primary' is always present
+    """
+    endpoints = {
+        PRIMARY_ENDPOINT: {'host': config.DB_HOST, 'port': config.DB_PORT, 'replica': False}
+    }
+    for index, entry in enumerate(h.strip() for h in config.DB_REPLICA_HOSTS.split(',')):
+        if not entry:
+            continue
+        host, _, port = entry.partition(':')
+        endpoints[f'replica{index + 1}'] = {
+            'host': host,
+            'port': int(port) if port else config.DB_PORT,
+            'replica': True
+        }
+    return endpoints
+
+
+def get_workload_settings(workload):
+    """Get pool settings for a workload class (falls back to the default workload)"""
+    return config.DB_WORKLOADS.get(workload) or config.DB_WORKLOADS[DEFAULT_WORKLOAD]
+
+
+def create_pool(workload, endpoint_name):
+    """Create a connection pool for a workload on one endpoint"""
+    endpoint = get_endpoints()[endpoint_name]
+    settings = get_workload_settings(workload)
+    
+    # statement_timeout is set per connection so every query of this workload is bounded
+    options = f"-c statement_timeout={int(settings.get('statement_timeout_ms', 0))}"
+    
+    return psycopg2.pool.ThreadedConnectionPool(
+        settings.get('minconn', 1),  # min connections
+        settings.get('maxconn', 10),  # max connections
+        host=endpoint['host'],
+        port=endpoint['port'],
+        database=config.DB_NAME,
+        user=config.DB_USER,
+        password=config.DB_PASSWORD,
+        application_name=f"amsbypass_web:{workload}",
+        options=options
+    )
+
+
+def close_pool(pool_key):
+    """Close and forget one connection pool"""
+    existing = connection_pools.pop(pool_key, None)
+    if existing:
+        try:
+            existing.closeall()
+        except:
+            pass
+
 
 def init_db_pool():
-    """Initialize database connection pool"""
-    global connection_pool
-    try:
-        # Close existing pool if it exists
-        if connection_pool:
-            try:
-                connection_pool.closeall()
-            except:
-                pass
+    """Initialize database connection pools (one per workload on the primary)"""
+    with pools_lock:
+        # Close existing pools if they exist
+        for pool_key in list(connection_pools.keys()):
+            close_pool(pool_key)
+        replica_lag_cache.clear()
         
-        connection_pool = psycopg2.pool.SimpleConnectionPool(
-            1,  # min connections
-            10,  # max connections
-            host=config.DB_HOST,
-            port=config.DB_PORT,
-            database=config.DB_NAME,
-            user=config.DB_USER,
-            password=config.DB_PASSWORD
-        )
-        if connection_pool:
-            print("Database connection pool created successfully")
-    except (Exception, psycopg2.Error) as error:
-        print(f"Error while creating database connection pool: {error}")
-        connection_pool = None
-        raise
+        try:
+            for workload in config.DB_WORKLOADS:
+                connection_pools[(workload, PRIMARY_ENDPOINT)] = create_pool(workload, PRIMARY_ENDPOINT)
+            print("Database connection pools created successfully: " + ", ".join(config.DB_WORKLOADS))
+        except (Exception, psycopg2.Error) as error:
+            print(f"Error while creating database connection pool: {error}")
+            for pool_key in list(connection_pools.keys()):
+                close_pool(pool_key)
+            raise
+
+
+def get_pool(workload, endpoint_name):
+    """Get (lazily creating) the connection pool for a workload on one endpoint"""
+    pool_key = (workload, endpoint_name)
+    existing = connection_pools.get(pool_key)
+    if existing is not None:
+        return existing
+    
+    with pools_lock:
+        if pool_key not in connection_pools:
+            connection_pools[pool_key] = create_pool(workload, endpoint_name)
+        return connection_pools[pool_key]
 
 
 def is_connection_valid(conn):
@@ -60,167 +150,470 @@ def is_connection_valid(conn):
         return False
 
 
-def recreate_pool():
-    """Recreate the connection pool"""
-    global connection_pool
-    print("Recreating database connection pool...")
-    connection_pool = None
-    init_db_pool()
+def recreate_pool(workload=DEFAULT_WORKLOAD, endpoint_name=PRIMARY_ENDPOINT):
+    """Recreate the connection pool of one workload/endpoint"""
+    print(f"Recreating database connection pool ({workload}@{endpoint_name})...")
+    with pools_lock:
+        close_pool((workload, endpoint_name))
+    return get_pool(workload, endpoint_name)
+
+
+def get_replica_lag(endpoint_name):
+    """
+    Get replication lag of a replica in seconds (cached for DB_REPLICA_LAG_CHECK_INTERVAL)
+    
+    Returns:
+        Lag in seconds, or None if the replica is unreachable
+    """
+    now = time.monotonic()
+    cached = replica_lag_cache.get(endpoint_name)
+    if cached and now - cached[0] < config.DB_REPLICA_LAG_CHECK_INTERVAL:
+        return cached[1]
+    
+    # A replica that has replayed everything it received is current even when the
+    # primary is idle (replay timestamp does not advance without writes)
+    query = """
+        SELECT CASE
+            WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+        END AS lag
+    """
+    lag = None
+    connection = None
+    replica_pool = None
+    try:
+        # Lag checks use the small realtime pool; they must be fast
+        replica_pool = get_pool(WORKLOAD_REALTIME, endpoint_name)
+        connection = replica_pool.getconn()
+        with connection.cursor() as cursor:
+            cursor.execute(query)
+            lag = float(cursor.fetchone()[0])
+        connection.rollback()
+    except (Exception, psycopg2.Error) as error:
+        print(f"Replica {endpoint_name} lag check failed: {error}")
+        if connection is not None:
+            try:
+                connection.close()
+            except:
+                pass
+    finally:
+        if connection is not None and replica_pool is not None:
+            try:
+                replica_pool.putconn(connection, close=bool(connection.closed))
+            except:
+                pass
+    
+    replica_lag_cache[endpoint_name] = (now, lag)
+    return lag
+
+
+def choose_endpoint(workload):
+    """
+    Choose the endpoint for a workload
+    
+    Replicas are used round-robin when the workload allows it and the replica is
+    fresh enough (max_replica_lag); otherwise the primary is used.
+    """
+    global replica_round_robin
+    settings = get_workload_settings(workload)
+    if not settings.get('use_replicas'):
+        return PRIMARY_ENDPOINT
+    
+    replicas = [name for name, endpoint in get_endpoints().items() if endpoint['replica']]
+    if not replicas:
+        return PRIMARY_ENDPOINT
+    
+    max_lag = settings.get('max_replica_lag')
+    replica_round_robin += 1
+    for offset in range(len(replicas)):
+        name = replicas[(replica_round_robin + offset) % len(replicas)]
+        lag = get_replica_lag(name)
+        if lag is None:
+            continue
+        if max_lag is None or lag <= max_lag:
+            return name
+    
+    return PRIMARY_ENDPOINT
+
+
+class PoolExhausted(Exception):
+    """Raised when every connection of a workload pool stays busy for pool_wait_seconds"""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def checked_out_connections(connection_pool):
+    """
+    Get (key, connection) pairs currently checked out of a pool
+    
+    psycopg2's pools expose no public API for this, so this is the only place that
+    reads their private _lock/_used attributes (psycopg2 2.9.x, tested with 2.9.13).
+    Check it when upgrading psycopg2.
+    """
+    with connection_pool._lock:
+        return list(connection_pool._used.items())
+
+
+def reclaim_closed_connections(connection_pool):
+    """
+    Free pool slots still held by connections that are already closed
+    
+    Last resort for an exhausted pool: a closed connection can never be returned
+    by its user, so its slot would stay taken until the process restarts.
+    
+    Returns:
+        Number of slots freed
+    """
+    reclaimed = 0
+    for key, connection in checked_out_connections(connection_pool):
+        if not connection.closed:
+            continue
+        try:
+            connection_pool.putconn(connection, key=key, close=True)
+            reclaimed += 1
+        except psycopg2.pool.PoolError:
+            pass  # Returned (or pool closed) meanwhile
+    return reclaimed
+
+
+def pool_usage(workload=DEFAULT_WORKLOAD, endpoint_name=PRIMARY_ENDPOINT):
+    """Get the number of checked-out connections of a workload pool (0 if it does not exist)"""
+    existing = connection_pools.get((workload, endpoint_name))
+    if existing is None or existing.closed:
+        return 0
+    return len(checked_out_connections(existing))
+
+
+def acquire_connection(workload, endpoint_name):
+    """
+    Get a connection from a workload pool, waiting up to pool_wait_seconds if it is exhausted
+    
+    Returns:
+        (connection_pool, connection)
+    
+    Raises:
+        PoolExhausted: No connection was returned within pool_wait_seconds
+    """
+    settings = get_workload_settings(workload)
+    deadline = time.monotonic() + settings.get('pool_wait_seconds', 5)
+    
+    while True:
+        connection_pool = get_pool(workload, endpoint_name)
+        try:
+            return connection_pool, connection_pool.getconn()
+        except psycopg2.pool.PoolError:
+            if connection_pool.closed:
+                # Closed pool: let the caller recreate it
+                raise
+            # Exhausted: all connections of this workload are busy. Never recreate
+            # (that would close connections in use), wait for one to be returned
+            reclaimed = reclaim_closed_connections(connection_pool)
+            if reclaimed:
+                print(f"Reclaimed {reclaimed} leaked connection slot(s) ({workload}@{endpoint_name})")
+                continue
+            if time.monotonic() >= deadline:
+                raise PoolExhausted(f"Database connection pool exhausted ({workload}@{endpoint_name})")
+            time.sleep(0.05)
+
+
+class QueryCancelled(Exception):
+    """Raised when a query was cancelled on request (e.g. the user left the page)"""
+
+
+def release_connection(connection_pool, connection, discard=False):
+    """
+    Return a connection to its pool after an error
+    
+    The open transaction is rolled back and the connection is closed by the pool
+    if it is broken (or discard is set). The slot is always handed back with
+    putconn; closing a pooled connection directly would leak its slot.
+    """
+    if connection is None or connection_pool is None:
+        return
+    
+    if not discard and not connection.closed:
+        try:
+            connection.rollback()
+            discard = not is_connection_valid(connection)
+        except (Exception, psycopg2.Error):
+            discard = True
+    
+    try:
+        connection_pool.putconn(connection, close=discard or bool(connection.closed))
+    except (Exception, psycopg2.Error):
+        # Pool was closed or recreated meanwhile, the slot is gone with it
+        try:
+            connection.close()
+        except:
+            pass
 
 
 @contextmanager
-def get_db_connection():
-    """Get a database connection from the pool with automatic reconnection"""
-    global connection_pool
+def get_db_connection(workload=DEFAULT_WORKLOAD):
+    """
+    Get a database connection from the workload's pool with automatic reconnection
     
-    # Initialize pool if needed
-    if connection_pool is None:
-        init_db_pool()
+    Args:
+        workload: Workload class (realtime, search or export); selects pool size,
+                  statement_timeout and replica routing
+    """
+    endpoint_name = choose_endpoint(workload)
     
     connection = None
+    connection_pool = None
     retries = 0
     
     while retries < MAX_RETRIES:
         try:
             # Try to get connection from pool
-            if connection_pool is None:
-                init_db_pool()
-            
             try:
-                connection = connection_pool.getconn()
+                connection_pool, connection = acquire_connection(workload, endpoint_name)
             except (psycopg2.pool.PoolError, AttributeError):
                 # Pool might be closed or invalid, recreate it
-                recreate_pool()
+                connection_pool = recreate_pool(workload, endpoint_name)
                 connection = connection_pool.getconn()
             
             # Check if connection is valid
             if not is_connection_valid(connection):
-                # Connection is invalid, close it
-                try:
-                    connection.close()
-                except:
-                    pass
+                # Connection is invalid, discard it (frees its pool slot)
+                release_connection(connection_pool, connection, discard=True)
                 connection = None
                 
                 # Recreate pool if needed
                 if retries >= 1:
-                    recreate_pool()
+                    connection_pool = recreate_pool(workload, endpoint_name)
                     try:
                         connection = connection_pool.getconn()
                     except (psycopg2.pool.PoolError, AttributeError):
-                        recreate_pool()
+                        connection_pool = recreate_pool(workload, endpoint_name)
                         connection = connection_pool.getconn()
                 else:
                     retries += 1
                     if retries < MAX_RETRIES:
                         time.sleep(RETRY_DELAY)
-                        recreate_pool()
+                        recreate_pool(workload, endpoint_name)
                     continue
                 
                 # Validate new connection
                 if not is_connection_valid(connection):
-                    try:
-                        connection.close()
-                    except:
-                        pass
+                    release_connection(connection_pool, connection, discard=True)
                     connection = None
                     retries += 1
                     if retries < MAX_RETRIES:
                         time.sleep(RETRY_DELAY)
-                        recreate_pool()
+                        recreate_pool(workload, endpoint_name)
                     continue
             
             # Connection is valid, use it
-            try:
-                yield connection
-                # Successfully used connection, return it to pool
-                try:
-                    connection_pool.putconn(connection)
-                except:
-                    # If putting back fails, connection might be invalid
-                    try:
-                        connection.close()
-                    except:
-                        pass
-                return
-            except (OperationalError, InterfaceError, psycopg2.InterfaceError) as e:
-                # Connection error during use, try to reconnect
-                print(f"Connection error during query: {e}")
-                try:
-                    connection.close()
-                except:
-                    pass
-                connection = None
-                retries += 1
-                if retries < MAX_RETRIES:
-                    time.sleep(RETRY_DELAY)
-                    recreate_pool()
-                else:
-                    raise Exception(f"Database connection lost during query after {MAX_RETRIES} retries: {e}")
-            except Exception as e:
-                # Other errors during query execution, return connection and re-raise
-                try:
-                    if is_connection_valid(connection):
-                        connection_pool.putconn(connection)
-                    else:
-                        connection.close()
-                except:
-                    pass
-                raise
+            break
                 
         except (OperationalError, InterfaceError, psycopg2.InterfaceError, psycopg2.pool.PoolError) as e:
-            # Pool error or connection error
-            print(f"Database connection error (attempt {retries + 1}/{MAX_RETRIES}): {e}")
-            if connection:
-                try:
-                    connection.close()
-                except:
-                    pass
+            # Pool error or connection error while getting a connection
+            print(f"Database connection error ({workload}@{endpoint_name}, attempt {retries + 1}/{MAX_RETRIES}): {e}")
+            release_connection(connection_pool, connection, discard=True)
             connection = None
             retries += 1
             
             if retries < MAX_RETRIES:
                 time.sleep(RETRY_DELAY)
-                recreate_pool()
+                if endpoint_name != PRIMARY_ENDPOINT:
+                    # Replica failed, fall back to the primary
+                    replica_lag_cache[endpoint_name] = (time.monotonic(), None)
+                    endpoint_name = PRIMARY_ENDPOINT
+                else:
+                    recreate_pool(workload, endpoint_name)
             else:
                 raise Exception(f"Failed to get database connection after {MAX_RETRIES} attempts: {e}")
     
-    # If we get here, all retries failed
-    raise Exception(f"Failed to get database connection after {MAX_RETRIES} attempts")
+    if connection is None:
+        # All retries failed
+        raise Exception(f"Failed to get database connection after {MAX_RETRIES} attempts")
+    
+    try:
+        yield connection
+    except (QueryCanceledError, QueryCancelled):
+        # statement_timeout or explicit cancel: the connection is healthy and
+        # the query must not be retried
+        release_connection(connection_pool, connection)
+        raise
+    except (OperationalError, InterfaceError, psycopg2.InterfaceError) as e:
+        # Connection lost during use; the caller's block cannot be re-run from here
+        print(f"Connection error during query ({workload}@{endpoint_name}): {e}")
+        release_connection(connection_pool, connection, discard=True)
+        recreate_pool(workload, endpoint_name)
+        raise Exception(f"Database connection lost during query: {e}")
+    except BaseException:
+        # Other errors during query execution: roll back, return connection and re-raise
+        release_connection(connection_pool, connection)
+        raise
+    
+    # Successfully used connection, return it to pool
+    try:
+        connection_pool.putconn(connection)
+    except:
+        # Pool was closed or recreated meanwhile
+        try:
+            connection.close()
+        except:
+            pass
+
+
+# Slow-request capture: per-thread list of executed queries (None = not capturing)
+query_capture = threading.local()
+
+
+def start_query_capture():
+    """Start recording the queries executed by this thread (see execute_captured)"""
+    query_capture.queries = []
+    return query_capture.queries
+
+
+def stop_query_capture():
+    """Stop recording and return the queries recorded since start_query_capture"""
+    queries = getattr(query_capture, 'queries', None) or []
+    query_capture.queries = None
+    return queries
+
+
+def execute_captured(cursor, query, params=None):
+    """
+    Execute a query, recording its SQL (with parameters bound) and duration while
+    this thread is capturing (slow-request diagnostics)
+    """
+    queries = getattr(query_capture, 'queries', None)
+    if queries is None:
+        cursor.execute(query, params)
+        return
+    
+    started = time.perf_counter()
+    try:
+        cursor.execute(query, params)
+    finally:
+        try:
+            sql = cursor.mogrify(query, params).decode('utf-8', 'replace')
+        except (Exception, psycopg2.Error):
+            sql = query
+        queries.append({
+            'sql': ' '.join(sql.split()),
+            'ms': round((time.perf_counter() - started) * 1000, 1)
+        })
 
 
-def execute_query(ship_id, interface_id=None, from_date=None, to_date=None, limit=100, offset=0):
+def explain_analyze(sql, workload=WORKLOAD_SEARCH):
     """
-    Execute search query with given parameters
+    Run EXPLAIN (ANALYZE, BUFFERS) for a captured SELECT in a read-only transaction
+    
+    The query is executed for real, so this is only run on demand.
+    
+    Returns:
+        Plan as text (one line per plan node/detail)
+    """
+    if not sql.lstrip().upper().startswith('SELECT'):
+        raise ValueError("Only SELECT queries can be explained")
+    
+    try:
+        with get_db_connection(workload) as conn:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("SET TRANSACTION READ ONLY")
+                    cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {sql}")
+                    return '\n'.join(row[0] for row in cursor.fetchall())
+            finally:
+                conn.rollback()
+    except (Exception, psycopg2.Error) as error:
+        print(f"Error explaining query: {error}")
+        raise
+
+
+@contextmanager
+def cancellable(connection, cancel_token):
+    """
+    Register a connection so the query running on it can be cancelled by token
     
     Args:
-        ship_id: Required ship ID
-        interface_id: Optional interface ID (LIKE search)
-        from_date: Optional start date
-        to_date: Optional end date
-        limit: Number of records to return (default: 100)
-        offset: Number of records to skip (default: 0)
+        connection: Connection that is about to run the query
+        cancel_token: Client-supplied token, or None for a non-cancellable query
+    
+    Raises:
+        QueryCancelled: If the token was cancelled before or during the query
+    """
+    if not cancel_token:
+        yield
+        return
+    
+    with queries_lock:
+        if cancel_token in cancelled_tokens:
+            raise QueryCancelled(f"Query {cancel_token} was cancelled")
+        active_queries[cancel_token] = connection
+    
+    try:
+        yield
+    except QueryCanceledError:
+        # Distinguish explicit cancellation from statement_timeout
+        if is_cancelled(cancel_token):
+            raise QueryCancelled(f"Query {cancel_token} was cancelled")
+        raise
+    finally:
+        with queries_lock:
+            active_queries.pop(cancel_token, None)
+
+
+def cancel_query(cancel_token):
+    """
+    Cancel the query registered under a token (server-side, via libpq cancel request)
+    
+    The token is remembered, so a query that registers later is cancelled immediately.
     
     Returns:
-        List of records (dictionaries)
+        True if a running query was signalled
     """
-    query = f"""
-        SELECT 
-            id,
-            ship_id,
-            interface_id,
-            json_data,
-            created_time,
-            server_created_time
-        FROM {config.DB_SCHEMA}.{config.DB_TABLE}
-        WHERE ship_id = %s
+    with queries_lock:
+        cancelled_tokens[cancel_token] = time.monotonic()
+        while len(cancelled_tokens) > MAX_CANCELLED_TOKENS:
+            cancelled_tokens.popitem(last=False)
+        connection = active_queries.get(cancel_token)
+    
+    if connection is None:
+        return False
+    
+    try:
+        connection.cancel()
+        return True
+    except (Exception, psycopg2.Error) as error:
+        print(f"Error cancelling query {cancel_token}: {error}")
+        return False
+
+
+def is_cancelled(cancel_token):
+    """Check whether a token has been cancelled"""
+    if not cancel_token:
+        return False
+    with queries_lock:
+        return cancel_token in cancelled_tokens
+
+
+def build_filter_conditions(interface_id=None, from_date=None, to_date=None):
     """
+    Build the optional WHERE conditions shared by search, count and validator queries
     
-    params = [ship_id]
+    Args:
+        interface_id: Optional interface ID (LIKE search)
+        from_date: Optional start date (UTC, YYYY-MM-DDTHH:MM or YYYY-MM-DD)
+        to_date: Optional end date (UTC, YYYY-MM-DDTHH:MM or YYYY-MM-DD)
+    
+    Returns:
+        (conditions_sql, params) - SQL fragment starting with " AND" (or empty) and its parameters
+    
+    The created_time bounds are constants (no column-side expressions), so on a
+    partitioned table the planner only scans the partitions inside the range.
+    """
+    conditions = ""
+    params = []
     
-    # Add optional conditions
     if interface_id:
-        query += " AND interface_id LIKE %s"
+        conditions += " AND interface_id LIKE %s"
         params.append(f'%{interface_id}%')
     
     if from_date:
@@ -228,11 +621,11 @@ def execute_query(ship_id, interface_id=None, from_date=None, to_date=None, limi
         if 'T' in from_date:
             # datetime-local format: convert YYYY-MM-DDTHH:MM to YYYY-MM-DD HH:MM:00
             datetime_str = from_date.replace('T', ' ') + ':00'
-            query += " AND created_time >= %s::timestamp"
+            conditions += " AND created_time >= %s::timestamp"
             params.append(datetime_str)
         else:
             # date format
-            query += " AND created_time >= %s"
+            conditions += " AND created_time >= %s::date"
             params.append(from_date)
     
     if to_date:
@@ -240,81 +633,574 @@ def execute_query(ship_id, interface_id=None, from_date=None, to_date=None, limi
         if 'T' in to_date:
             # datetime-local format: convert YYYY-MM-DDTHH:MM to YYYY-MM-DD HH:MM:59
             datetime_str = to_date.replace('T', ' ') + ':59'
-            query += " AND created_time <= %s::timestamp"
+            conditions += " AND created_time <= %s::timestamp"
             params.append(datetime_str)
         else:
             # date format
-            query += " AND created_time <= %s::date + INTERVAL '1 day' - INTERVAL '1 second'"
+            conditions += " AND created_time <= %s::date + INTERVAL '1 day' - INTERVAL '1 second'"
             params.append(to_date)
     
+    return conditions, params
+
+
+def execute_query(ship_id, interface_id=None, from_date=None, to_date=None, limit=100, offset=0,
+                  workload=WORKLOAD_SEARCH, cancel_token=None):
+    """
+    Execute search query with given parameters
+    
+    Args:
+        ship_id: Required ship ID
+        interface_id: Optional interface ID (LIKE search)
+        from_date: Optional start date
+        to_date: Optional end date
+        limit: Number of records to return (default: 100)
+        offset: Number of records to skip (default: 0)
+        workload: Connection pool workload class (default: search)
+        cancel_token: Optional token that cancel_query() can use to abort the query
+    
+    Returns:
+        List of records (dictionaries)
+    """
+    query = f"""
+        SELECT 
+            id,
+            ship_id,
+            interface_id,
+            json_data,
+            created_time,
+            server_created_time
+        FROM {config.DB_SCHEMA}.{config.DB_TABLE}
+        WHERE ship_id = %s
+    """
+    
+    params = [ship_id]
+    
+    # Add optional conditions
+    conditions, condition_params = build_filter_conditions(interface_id, from_date, to_date)
+    query += conditions
+    params.extend(condition_params)
+    
     query += " ORDER BY created_time DESC LIMIT %s OFFSET %s"
     params.extend([limit, offset])
     
     try:
-        with get_db_connection() as conn:
-            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-                cursor.execute(query, params)
-                results = cursor.fetchall()
-                return [dict(row) for row in results]
+        with get_db_connection(workload) as conn:
+            with cancellable(conn, cancel_token):
+                with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                    execute_captured(cursor, query, params)
+                    results = cursor.fetchall()
+                    return [dict(row) for row in results]
     except (Exception, psycopg2.Error) as error:
         print(f"Error executing query: {error}")
         raise
 
 
-def count_query(ship_id, interface_id=None, from_date=None, to_date=None):
+def range_validator(ship_id, interface_id=None, from_date=None, to_date=None, workload=WORKLOAD_SEARCH):
     """
-    Count total records matching the query
+    Get a cheap change validator for the records matching the query
+    
+    Any insert or delete inside the range changes at least one of these values,
+    so they can be used to build an ETag and to validate cached results.
     
     Args:
         ship_id: Required ship ID
         interface_id: Optional interface ID (LIKE search)
         from_date: Optional start date
         to_date: Optional end date
+        workload: Connection pool workload class (default: search)
     
     Returns:
-        Total count of matching records
+        Dictionary with max_id, total and last_modified (naive UTC datetime or None)
     """
     query = f"""
-        SELECT COUNT(*) as total
+        SELECT 
+            MAX(id) as max_id,
+            COUNT(*) as total,
+            MAX(COALESCE(server_created_time, created_time)) as last_modified
         FROM {config.DB_SCHEMA}.{config.DB_TABLE}
         WHERE ship_id = %s
     """
     
     params = [ship_id]
     
-    # Add optional conditions
+    conditions, condition_params = build_filter_conditions(interface_id, from_date, to_date)
+    query += conditions
+    params.extend(condition_params)
+    
+    try:
+        with get_db_connection(workload) as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                execute_captured(cursor, query, params)
+                result = cursor.fetchone()
+                return dict(result) if result else {'max_id': None, 'total': 0, 'last_modified': None}
+    except (Exception, psycopg2.Error) as error:
+        print(f"Error computing range validator: {error}")
+        raise
+
+
+def estimate_query_rows(ship_id, interface_id=None, from_date=None, to_date=None, workload=WORKLOAD_SEARCH):
+    """
+    Estimate the number of records matching the query from the planner (EXPLAIN, not executed)
+    
+    Args:
+        ship_id: Required ship ID
+        interface_id: Optional interface ID (LIKE search)
+        from_date: Optional start date
+        to_date: Optional end date
+        workload: Connection pool workload class (default: search)
+    
+    Returns:
+        Estimated row count
+    """
+    query = f"""
+        EXPLAIN (FORMAT JSON)
+        SELECT id
+        FROM {config.DB_SCHEMA}.{config.DB_TABLE}
+        WHERE ship_id = %s
+    """
+    
+    params = [ship_id]
+    
+    conditions, condition_params = build_filter_conditions(interface_id, from_date, to_date)
+    query += conditions
+    params.extend(condition_params)
+    
+    try:
+        with get_db_connection(workload) as conn:
+            with conn.cursor() as cursor:
+                execute_captured(cursor, query, params)
+                plan = cursor.fetchone()[0]
+                return int(plan[0]['Plan']['Plan Rows'])
+    except (Exception, psycopg2.Error) as error:
+        print(f"Error estimating query rows: {error}")
+        raise
+
+
+def realtime_window_condition(alias=''):
+    """
+    Get the created_time lower bound for realtime queries (REALTIME_LOOKBACK_HOURS, 0 = none)
+    
+    On a partitioned table the bound is what lets id-based queries skip old
+    partitions (pruned at executor start, now() is stable).
+    
+    Returns:
+        (conditions_sql, params) - SQL fragment starting with " AND" (or empty) and its parameters
+    """
+    if config.REALTIME_LOOKBACK_HOURS <= 0:
+        return "", []
+    column = f"{alias}.created_time" if alias else "created_time"
+    return (f" AND {column} >= (now() AT TIME ZONE 'UTC') - %s * INTERVAL '1 hour'",
+            [config.REALTIME_LOOKBACK_HOURS])
+
+
+def fetch_records_after(ship_id, after_id, limit=500, workload=WORKLOAD_REALTIME):
+    """
+    Fetch records inserted after a cursor, oldest first
+    
+    The id column is a bigserial, so it increases with insert order, but ids are
+    allocated before commit: a concurrent writer can commit a lower id after a
+    higher one was returned. The cursor alone can therefore skip records; RealTime
+    polls re-check the ids of the last REALTIME_CURSOR_OVERLAP_SECONDS with
+    fetch_fleet_record_ids_between and fetch late records with fetch_records_by_ids.
+    Backfilled records with an old created_time get new ids too; the
+    REALTIME_LOOKBACK_HOURS window keeps them out.
+    
+    Args:
+        ship_id: Required ship ID
+        after_id: Return only records with id greater than this value
+        limit: Maximum number of records to return (default: 500)
+        workload: Connection pool workload class (default: realtime)
+    
+    Returns:
+        List of records (dictionaries) ordered by id ascending
+    """
+    query = f"""
+        SELECT 
+            id,
+            ship_id,
+            interface_id,
+            json_data,
+            created_time,
+            server_created_time
+        FROM {config.DB_SCHEMA}.{config.DB_TABLE}
+        WHERE ship_id = %s
+            AND id > %s
+    """
+    
+    params = [ship_id, after_id]
+    
+    conditions, condition_params = realtime_window_condition()
+    query += conditions
+    params.extend(condition_params)
+    
+    query += " ORDER BY id ASC LIMIT %s"
+    params.append(limit)
+    
+    try:
+        with get_db_connection(workload) as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                execute_captured(cursor, query, params)
+                results = cursor.fetchall()
+                return [dict(row) for row in results]
+    except (Exception, psycopg2.Error) as error:
+        print(f"Error fetching records after cursor: {error}")
+        raise
+
+
+def initial_cursor(ship_id, since, workload=WORKLOAD_REALTIME):
+    """
+    Get a starting cursor so that the first realtime poll returns records created after since
+    
+    Args:
+        ship_id: Required ship ID
+        since: UTC timestamp (datetime or 'YYYY-MM-DD HH:MM:SS' string)
+        workload: Connection pool workload class (default: realtime)
+    
+    Returns:
+        Cursor id (records with a greater id are considered new)
+    """
+    # Both lookups are bounded by created_time, so only recent partitions are read
+    window, window_params = realtime_window_condition()
+    query = f"""
+        SELECT COALESCE(
+            (SELECT MIN(id) - 1
+             FROM {config.DB_SCHEMA}.{config.DB_TABLE}
+             WHERE ship_id = %s
+                 AND created_time > %s::timestamp),
+            (SELECT COALESCE(MAX(id), 0)
+             FROM {config.DB_SCHEMA}.{config.DB_TABLE}
+             WHERE TRUE{window})
+        ) as cursor
+    """
+    
+    try:
+        with get_db_connection(workload) as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                execute_captured(cursor, query, [ship_id, since] + window_params)
+                result = cursor.fetchone()
+                return result['cursor'] if result else 0
+    except (Exception, psycopg2.Error) as error:
+        print(f"Error getting initial cursor: {error}")
+        raise
+
+
+def fetch_fleet_records_after(cursors, limit=500, workload=WORKLOAD_REALTIME):
+    """
+    Fetch records inserted after per-ship cursors for several ships in one query
+    
+    Args:
+        cursors: Dictionary of ship_id -> cursor id
+        limit: Maximum number of records to return across all ships (default: 500)
+        workload: Connection pool workload class (default: realtime)
+    
+    Returns:
+        List of records (dictionaries) ordered by id ascending
+    """
+    if not cursors:
+        return []
+    
+    ship_ids = list(cursors.keys())
+    cursor_ids = [cursors[ship_id] for ship_id in ship_ids]
+    
+    # ship_id = ANY(...) and the lowest cursor let the planner use the indexes;
+    # the join applies each ship's own cursor
+    query = f"""
+        SELECT 
+            t.id,
+            t.ship_id,
+            t.interface_id,
+            t.json_data,
+            t.created_time,
+            t.server_created_time
+        FROM {config.DB_SCHEMA}.{config.DB_TABLE} t
+        JOIN unnest(%s::text[], %s::bigint[]) AS c(ship_id, cursor_id)
+            ON t.ship_id = c.ship_id AND t.id > c.cursor_id
+        WHERE t.ship_id = ANY(%s)
+            AND t.id > %s
+    """
+    
+    params = [ship_ids, cursor_ids, ship_ids, min(cursor_ids)]
+    
+    conditions, condition_params = realtime_window_condition('t')
+    query += conditions
+    params.extend(condition_params)
+    
+    query += " ORDER BY t.id ASC LIMIT %s"
+    params.append(limit)
+    
+    try:
+        with get_db_connection(workload) as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                execute_captured(cursor, query, params)
+                results = cursor.fetchall()
+                return [dict(row) for row in results]
+    except (Exception, psycopg2.Error) as error:
+        print(f"Error fetching fleet records after cursors: {error}")
+        raise
+
+
+def initial_fleet_cursors(ship_ids, since, workload=WORKLOAD_REALTIME):
+    """
+    Get starting cursors for several ships in one query (see initial_cursor)
+    
+    Args:
+        ship_ids: List of ship IDs
+        since: UTC timestamp (datetime or 'YYYY-MM-DD HH:MM:SS' string)
+        workload: Connection pool workload class (default: realtime)
+    
+    Returns:
+        Dictionary of ship_id -> cursor id
+    """
+    if not ship_ids:
+        return {}
+    
+    window, window_params = realtime_window_condition()
+    query = f"""
+        SELECT 
+            s.ship_id,
+            COALESCE(
+                (SELECT MIN(t.id) - 1
+                 FROM {config.DB_SCHEMA}.{config.DB_TABLE} t
+                 WHERE t.ship_id = s.ship_id
+                     AND t.created_time > %s::timestamp),
+                (SELECT COALESCE(MAX(id), 0)
+                 FROM {config.DB_SCHEMA}.{config.DB_TABLE}
+                 WHERE TRUE{window})
+            ) as cursor
+        FROM unnest(%s::text[]) AS s(ship_id)
+    """
+    
+    try:
+        with get_db_connection(workload) as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                execute_captured(cursor, query, [since] + window_params + [list(ship_ids)])
+                return {row['ship_id']: row['cursor'] for row in cursor.fetchall()}
+    except (Exception, psycopg2.Error) as error:
+        print(f"Error getting initial fleet cursors: {error}")
+        raise
+
+
+def fetch_fleet_record_ids_between(ranges, workload=WORKLOAD_REALTIME):
+    """
+    Get the ids of records in per-ship id ranges (low, high] in one id-only query
+    
+    Used to re-check the recent range below a realtime cursor for records that
+    committed late, without reading json_data.
+    
+    Args:
+        ranges: Dictionary of ship_id -> (low, high)
+        workload: Connection pool workload class (default: realtime)
+    
+    Returns:
+        Dictionary of ship_id -> list of ids ascending (ships without records are missing)
+    """
+    if not ranges:
+        return {}
+    
+    ship_ids = list(ranges.keys())
+    lows = [ranges[ship_id][0] for ship_id in ship_ids]
+    highs = [ranges[ship_id][1] for ship_id in ship_ids]
+    
+    query = f"""
+        SELECT t.ship_id, array_agg(t.id ORDER BY t.id) AS ids
+        FROM {config.DB_SCHEMA}.{config.DB_TABLE} t
+        JOIN unnest(%s::text[], %s::bigint[], %s::bigint[]) AS r(ship_id, low_id, high_id)
+            ON t.ship_id = r.ship_id AND t.id > r.low_id AND t.id <= r.high_id
+        WHERE t.ship_id = ANY(%s)
+            AND t.id > %s
+            AND t.id <= %s
+    """
+    
+    params = [ship_ids, lows, highs, ship_ids, min(lows), max(highs)]
+    
+    conditions, condition_params = realtime_window_condition('t')
+    query += conditions
+    params.extend(condition_params)
+    
+    query += " GROUP BY t.ship_id"
+    
+    try:
+        with get_db_connection(workload) as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                execute_captured(cursor, query, params)
+                return {row['ship_id']: list(row['ids']) for row in cursor.fetchall()}
+    except (Exception, psycopg2.Error) as error:
+        print(f"Error fetching record ids between cursors: {error}")
+        raise
+
+
+def fetch_records_by_ids(ship_ids, ids, workload=WORKLOAD_REALTIME):
+    """
+    Fetch realtime records by id (late commits found by fetch_fleet_record_ids_between)
+    
+    Args:
+        ship_ids: Ship IDs the records may belong to
+        ids: Record ids
+        workload: Connection pool workload class (default: realtime)
+    
+    Returns:
+        List of records (dictionaries) ordered by id ascending
+    """
+    if not ship_ids or not ids:
+        return []
+    
+    query = f"""
+        SELECT 
+            id,
+            ship_id,
+            interface_id,
+            json_data,
+            created_time,
+            server_created_time
+        FROM {config.DB_SCHEMA}.{config.DB_TABLE}
+        WHERE ship_id = ANY(%s)
+            AND id = ANY(%s)
+    """
+    
+    params = [list(ship_ids), list(ids)]
+    
+    conditions, condition_params = realtime_window_condition()
+    query += conditions
+    params.extend(condition_params)
+    
+    query += " ORDER BY id ASC"
+    
+    try:
+        with get_db_connection(workload) as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                execute_captured(cursor, query, params)
+                return [dict(row) for row in cursor.fetchall()]
+    except (Exception, psycopg2.Error) as error:
+        print(f"Error fetching records by id: {error}")
+        raise
+
+
+def stream_records(ship_id, start, end, on_batch, interface_id=None, batch_size=5000,
+                   workload=WORKLOAD_EXPORT):
+    """
+    Stream records of a half-open time range in batches through a server-side cursor
+    
+    Memory use is bounded by batch_size regardless of the range size.
+    
+    Args:
+        ship_id: Required ship ID
+        start: Range start (UTC datetime, inclusive)
+        end: Range end (UTC datetime, exclusive)
+        on_batch: Called with each list of records (dictionaries), oldest first
+        interface_id: Optional interface ID (LIKE search)
+        batch_size: Records fetched per round trip (default: 5000)
+        workload: Connection pool workload class (default: export)
+    
+    Returns:
+        Total number of records streamed
+    """
+    query = f"""
+        SELECT 
+            id,
+            ship_id,
+            interface_id,
+            json_data,
+            created_time
+        FROM {config.DB_SCHEMA}.{config.DB_TABLE}
+        WHERE ship_id = %s
+            AND created_time >= %s
+            AND created_time < %s
+    """
+    
+    params = [ship_id, start, end]
+    
     if interface_id:
         query += " AND interface_id LIKE %s"
         params.append(f'%{interface_id}%')
     
-    if from_date:
-        # from_date is already in UTC (converted in app.py)
-        if 'T' in from_date:
-            datetime_str = from_date.replace('T', ' ') + ':00'
-            query += " AND created_time >= %s::timestamp"
-            params.append(datetime_str)
-        else:
-            query += " AND created_time >= %s::date"
-            params.append(from_date)
-    
-    if to_date:
-        # to_date is already in UTC (converted in app.py)
-        if 'T' in to_date:
-            datetime_str = to_date.replace('T', ' ') + ':59'
-            query += " AND created_time <= %s::timestamp"
-            params.append(datetime_str)
-        else:
-            query += " AND created_time <= %s::date + INTERVAL '1 day' - INTERVAL '1 second'"
-            params.append(to_date)
+    query += " ORDER BY created_time ASC, id ASC"
     
+    total = 0
     try:
-        with get_db_connection() as conn:
-            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+        with get_db_connection(workload) as conn:
+            # Named cursor = server-side cursor, rows are fetched batch_size at a time
+            with conn.cursor(name=f"stream_{uuid.uuid4().hex}", cursor_factory=RealDictCursor) as cursor:
+                cursor.itersize = batch_size
                 cursor.execute(query, params)
-                result = cursor.fetchone()
-                return result['total'] if result else 0
+                while True:
+                    results = cursor.fetchmany(batch_size)
+                    if not results:
+                        break
+                    total += len(results)
+                    on_batch([dict(row) for row in results])
+            conn.rollback()
+        return total
+    except (Exception, psycopg2.Error) as error:
+        print(f"Error streaming records: {error}")
+        raise
+
+
+# Columns loaded by copy_records, in COPY order
+INGEST_COLUMNS = ('ship_id', 'interface_id', 'json_data', 'created_time', 'server_created_time')
+INGEST_STAGING_TABLE = 'ams_bypass_staging'
+
+
+def copy_value(value):
+    """Format one value for COPY ... FROM STDIN (text format)"""
+    if value is None:
+        return '\\N'
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+def copy_records(records, workload=WORKLOAD_INGEST):
+    """
+    Bulk insert records, skipping rows that already exist
+    
+    The batch is COPYed into a session temp table, then moved with
+    INSERT ... ON CONFLICT ON CONSTRAINT ams_bypass_uq DO NOTHING in the same
+    transaction, so replays and overlapping files are deduplicated by the unique key.
+    
+    Args:
+        records: List of dictionaries with INGEST_COLUMNS keys (missing keys are NULL)
+        workload: Connection pool workload class (default: ingest, primary only)
+    
+    Returns:
+        Number of rows inserted (len(records) minus duplicates)
+    """
+    if not records:
+        return 0
+    
+    columns = ', '.join(INGEST_COLUMNS)
+    buffer = io.StringIO()
+    for record in records:
+        buffer.write('\t'.join(copy_value(record.get(column)) for column in INGEST_COLUMNS))
+        buffer.write('\n')
+    buffer.seek(0)
+    
+    try:
+        with get_db_connection(workload) as conn:
+            try:
+                with conn.cursor() as cursor:
+                    # Temp tables live per session, so each pooled connection creates it once
+                    cursor.execute(f"""
+                        CREATE TEMP TABLE IF NOT EXISTS {INGEST_STAGING_TABLE} (
+                            ship_id text,
+                            interface_id text,
+                            json_data text,
+                            created_time timestamp,
+                            server_created_time timestamp
+                        ) ON COMMIT DELETE ROWS
+                    """)
+                    cursor.copy_expert(f"COPY {INGEST_STAGING_TABLE} ({columns}) FROM STDIN", buffer)
+                    cursor.execute(f"""
+                        INSERT INTO {config.DB_SCHEMA}.{config.DB_TABLE} ({columns})
+                        SELECT {columns} FROM {INGEST_STAGING_TABLE}
+                        ON CONFLICT ON CONSTRAINT ams_bypass_uq DO NOTHING
+                    """)
+                    inserted = cursor.rowcount
+                conn.commit()
+                return inserted
+            except psycopg2.Error:
+                conn.rollback()
+                raise
     except (Exception, psycopg2.Error) as error:
-        print(f"Error counting records: {error}")
+        print(f"Error copying records: {error}")
         raise
 
 
@@ -328,4 +1214,3 @@ def test_connection():
     except Exception as e:
         print(f"Database connection test failed: {e}")
         return False
-
@@ -0,0 +1,400 @@
+"""
+Parquet export utility module
+Streams a ship/date range from the database through the JSON parser into Arrow
+record batches and writes Parquet files for offline analysis (pandas, duckdb)
+
+Usage:
+    python -m utils.export --ship-id SHIP001 --from 2025-01-01T00:00 --to 2025-02-01T00:00 \
+        --out ./export --layout long --partitions 8 --workers 2
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Optional dependency, only needed for export
+    pa = None
+    pq = None
+
+from config import Config
+from utils.db import stream_records
+
+LAYOUT_LONG = 'long'
+LAYOUT_WIDE = 'wide'
+
+SHIP_TIME_KEY = '$ship_posixmicros'
+SKIPPED_KEYS = ('$ship_sensornodeid',)
+
+# Wide layout: record columns, and the prefix given to tag columns that would clash with them
+BASE_COLUMNS = ('created_time', 'ship_time', 'ship_id', 'interface_id')
+TAG_COLUMN_PREFIX = 'tag:'
+
+
+class ExportUnavailable(Exception):
+    """Raised when Parquet export is not available (pyarrow is not installed)"""
+
+
+def require_pyarrow():
+    """Raise a clear error when pyarrow is not installed"""
+    if pa is None:
+        raise ExportUnavailable("Parquet export requires pyarrow (pip install pyarrow)")
+
+
+def long_schema():
+    """Schema of the long layout: one row per (record, tag)"""
+    dictionary_string = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ('created_time', pa.timestamp('us', tz='UTC')),
+        ('ship_time', pa.timestamp('us', tz='UTC')),
+        ('ship_id', dictionary_string),
+        ('interface_id', dictionary_string),
+        ('tag', dictionary_string),
+        ('value_num', pa.float64()),
+        ('value_text', pa.string()),
+        ('value_type', dictionary_string),
+        ('unit', dictionary_string),
+        ('description', dictionary_string),
+    ])
+
+
+def iter_tags(json_data_text: str):
+    """
+    Parse one record's json_data
+
+    Unlike parse_json_data, values keep their native type and $ship_posixmicros
+    stays a number so it can be stored as a timestamp.
+
+    Returns:
+        (ship_time_micros, [(tag, value, unit, description), ...])
+    """
+    if not json_data_text:
+        return None, []
+
+    try:
+        json_obj = json.loads(json_data_text)
+    except json.JSONDecodeError as e:
+        print(f"Error parsing JSON: {e}")
+        return None, []
+
+    ship_time = None
+    tags = []
+    for key, value in json_obj.items():
+        if key in SKIPPED_KEYS:
+            continue
+        if key == SHIP_TIME_KEY:
+            ship_time = value if isinstance(value, (int, float)) else None
+            continue
+        if isinstance(value, dict):
+            tags.append((key, value.get('value'), value.get('unit'), value.get('desc')))
+        else:
+            tags.append((key, value, None, None))
+    return ship_time, tags
+
+
+def split_value(value: Any):
+    """Split a tag value into (value_num, value_text, value_type)"""
+    if isinstance(value, bool):
+        return (1.0 if value else 0.0), None, 'bool'
+    if isinstance(value, (int, float)):
+        return float(value), None, type(value).__name__
+    if value is None:
+        return None, None, 'null'
+    if isinstance(value, (dict, list)):
+        return None, json.dumps(value), type(value).__name__
+    return None, str(value), 'str'
+
+
+def to_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """created_time is stored as naive UTC"""
+    if value is None:
+        return None
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def micros_to_datetime(micros: Optional[float]) -> Optional[datetime]:
+    if micros is None:
+        return None
+    try:
+        return datetime(1970, 1, 1, tzinfo=timezone.utc) + timedelta(microseconds=int(micros))
+    except (OverflowError, ValueError):
+        return None
+
+
+def build_long_batch(records: List[Dict[str, Any]]):
+    """Convert database records into an Arrow table in the long layout"""
+    columns = {name: [] for name in long_schema().names}
+    for record in records:
+        created_time = to_utc(record.get('created_time'))
+        ship_time_micros, tags = iter_tags(record.get('json_data'))
+        ship_time = micros_to_datetime(ship_time_micros)
+        for tag, value, unit, description in tags:
+            value_num, value_text, value_type = split_value(value)
+            columns['created_time'].append(created_time)
+            columns['ship_time'].append(ship_time)
+            columns['ship_id'].append(record.get('ship_id'))
+            columns['interface_id'].append(record.get('interface_id'))
+            columns['tag'].append(tag)
+            columns['value_num'].append(value_num)
+            columns['value_text'].append(value_text)
+            columns['value_type'].append(value_type)
+            columns['unit'].append(unit)
+            columns['description'].append(description)
+
+    schema = long_schema()
+    arrays = []
+    for field in schema:
+        if pa.types.is_dictionary(field.type):
+            arrays.append(pa.array(columns[field.name], type=pa.string()).dictionary_encode())
+        else:
+            arrays.append(pa.array(columns[field.name], type=field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def wide_column_name(tag: str) -> str:
+    """Column name of a tag in the wide layout (prefixed when it clashes with BASE_COLUMNS)"""
+    if tag in BASE_COLUMNS or tag.startswith(TAG_COLUMN_PREFIX):
+        return TAG_COLUMN_PREFIX + tag
+    return tag
+
+
+def build_wide_batch(records: List[Dict[str, Any]]):
+    """
+    Convert database records into an Arrow table in the wide layout (one column per tag)
+
+    A tag column is float64 when all its values in the batch are numeric/bool,
+    otherwise string. Tags named like a record column (e.g. ship_id) are stored
+    as tag:<name> so they cannot overwrite it.
+    """
+    base = {'created_time': [], 'ship_time': [], 'ship_id': [], 'interface_id': []}
+    tag_values = {}
+    for index, record in enumerate(records):
+        ship_time_micros, tags = iter_tags(record.get('json_data'))
+        base['created_time'].append(to_utc(record.get('created_time')))
+        base['ship_time'].append(micros_to_datetime(ship_time_micros))
+        base['ship_id'].append(record.get('ship_id'))
+        base['interface_id'].append(record.get('interface_id'))
+        for tag, value, _, _ in tags:
+            tag_values.setdefault(wide_column_name(tag), [None] * len(records))[index] = value
+
+    dictionary_string = pa.dictionary(pa.int32(), pa.string())
+    fields = [
+        pa.field('created_time', pa.timestamp('us', tz='UTC')),
+        pa.field('ship_time', pa.timestamp('us', tz='UTC')),
+        pa.field('ship_id', dictionary_string),
+        pa.field('interface_id', dictionary_string),
+    ]
+    arrays = [
+        pa.array(base['created_time'], type=pa.timestamp('us', tz='UTC')),
+        pa.array(base['ship_time'], type=pa.timestamp('us', tz='UTC')),
+        pa.array(base['ship_id'], type=pa.string()).dictionary_encode(),
+        pa.array(base['interface_id'], type=pa.string()).dictionary_encode(),
+    ]
+    for tag in sorted(tag_values):
+        values = tag_values[tag]
+        if all(v is None or isinstance(v, (bool, int, float)) for v in values):
+            fields.append(pa.field(tag, pa.float64()))
+            arrays.append(pa.array([None if v is None else float(v) for v in values], type=pa.float64()))
+        else:
+            fields.append(pa.field(tag, pa.string()))
+            arrays.append(pa.array([None if v is None else split_value(v)[1] or str(v) for v in values],
+                                   type=pa.string()))
+    return pa.Table.from_arrays(arrays, schema=pa.schema(fields))
+
+
+def merge_wide_schema(current, batch_schema):
+    """Union of two wide schemas; a column that is string in either becomes string"""
+    fields = {field.name: field for field in current}
+    for field in batch_schema:
+        existing = fields.get(field.name)
+        if existing is None:
+            fields[field.name] = field
+        elif existing.type != field.type:
+            fields[field.name] = pa.field(field.name, pa.string())
+    return pa.schema(list(fields.values()))
+
+
+def conform_table(table, schema):
+    """Add missing columns as nulls and cast to the writer schema"""
+    columns = []
+    for field in schema:
+        if field.name in table.column_names:
+            column = table.column(field.name)
+            if column.type != field.type:
+                if pa.types.is_string(field.type) and pa.types.is_floating(column.type):
+                    column = pa.array([None if v is None else str(v) for v in column.to_pylist()],
+                                      type=pa.string())
+                else:
+                    column = column.cast(field.type)
+            columns.append(column)
+        else:
+            columns.append(pa.nulls(table.num_rows, type=field.type))
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+class PartitionWriter:
+    """
+    Writes the batches of one range partition to Parquet
+
+    Long layout writes a single file. Wide layout starts a new file whenever a
+    batch brings new tag columns or a type change (files differ only by columns;
+    read them with duckdb union_by_name=true or pandas.concat).
+    """
+
+    def __init__(self, out_dir: str, partition: int, layout: str, compression: str = 'zstd'):
+        self.out_dir = out_dir
+        self.partition = partition
+        self.layout = layout
+        self.compression = compression
+        self.writer = None
+        self.schema = None
+        self.files = []
+        self.rows = 0
+
+    def _open(self, schema):
+        self.close()
+        suffix = '' if self.layout == LAYOUT_LONG else f"-{len(self.files):03d}"
+        path = os.path.join(self.out_dir, f"part-{self.partition:04d}{suffix}.parquet")
+        self.writer = pq.ParquetWriter(path, schema, compression=self.compression)
+        self.schema = schema
+        self.files.append(path)
+
+    def write(self, records: List[Dict[str, Any]]):
+        if self.layout == LAYOUT_LONG:
+            table = build_long_batch(records)
+            if self.writer is None:
+                self._open(table.schema)
+        else:
+            table = build_wide_batch(records)
+            schema = table.schema if self.schema is None else merge_wide_schema(self.schema, table.schema)
+            if self.writer is None or not schema.equals(self.schema):
+                self._open(schema)
+            table = conform_table(table, self.schema)
+
+        if table.num_rows:
+            self.writer.write_table(table)
+            self.rows += table.num_rows
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+def split_range(start: datetime, end: datetime, partitions: int):
+    """Split [start, end) into contiguous, non-overlapping sub-ranges"""
+    partitions = max(1, partitions)
+    step = (end - start) / partitions
+    bounds = [start + step * i for i in range(partitions)] + [end]
+    return [(bounds[i], bounds[i + 1]) for i in range(partitions) if bounds[i] < bounds[i + 1]]
+
+
+def export_range(ship_id: str, start: datetime, end: datetime, out_dir: str, layout: str = LAYOUT_LONG,
+                 batch_size: int = 5000, partitions: int = 1, workers: int = 1,
+                 interface_id: Optional[str] = None, compression: str = 'zstd') -> Dict[str, Any]:
+    """
+    Export a ship's records in [start, end) (UTC) to Parquet files in out_dir
+
+    The range is split into partitions read in parallel by workers threads, each
+    streaming batch_size records at a time, so memory stays bounded. workers is
+    capped at the export pool size (DB_WORKLOADS['export']['maxconn']), since each
+    partition being read holds one connection.
+
+    Returns:
+        Dictionary with files, records, rows and seconds
+    """
+    require_pyarrow()
+    if layout not in (LAYOUT_LONG, LAYOUT_WIDE):
+        raise ValueError(f"Unknown layout: {layout}")
+    os.makedirs(out_dir, exist_ok=True)
+
+    max_workers = Config.DB_WORKLOADS['export']['maxconn']
+    if workers > max_workers:
+        print(f"{workers} workers requested, reading {max_workers} partitions at a time "
+              f"(the export pool has no more connections)")
+        workers = max_workers
+
+    started = time.monotonic()
+    lock = threading.Lock()
+    totals = {'records': 0}
+
+    def export_partition(partition, bounds):
+        writer = PartitionWriter(out_dir, partition, layout, compression)
+
+        def on_batch(records):
+            writer.write(records)
+            with lock:
+                totals['records'] += len(records)
+
+        try:
+            stream_records(ship_id, bounds[0], bounds[1], on_batch,
+                           interface_id=interface_id, batch_size=batch_size)
+        finally:
+            writer.close()
+        return writer
+
+    ranges = split_range(start, end, partitions)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        writers = list(executor.map(lambda item: export_partition(*item), enumerate(ranges)))
+
+    return {
+        'files': [path for writer in writers for path in writer.files],
+        'records': totals['records'],
+        'rows': sum(writer.rows for writer in writers),
+        'seconds': time.monotonic() - started
+    }
+
+
+def parse_datetime(value: str) -> datetime:
+    """Parse YYYY-MM-DDTHH:MM or YYYY-MM-DD (UTC)"""
+    for fmt in ('%Y-%m-%dT%H:%M', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise argparse.ArgumentTypeError(f"Invalid date: {value} (expected YYYY-MM-DDTHH:MM or YYYY-MM-DD)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export tenant.ams_bypass records to Parquet")
+    parser.add_argument('--ship-id', required=True)
+    parser.add_argument('--interface-id', default=None, help="Optional interface ID (LIKE search)")
+    parser.add_argument('--from', dest='from_date', required=True, type=parse_datetime,
+                        help="Start, UTC (inclusive)")
+    parser.add_argument('--to', dest='to_date', required=True, type=parse_datetime,
+                        help="End, UTC (exclusive)")
+    parser.add_argument('--out', required=True, help="Output directory")
+    parser.add_argument('--layout', choices=[LAYOUT_LONG, LAYOUT_WIDE], default=LAYOUT_LONG)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--partitions', type=int, default=1, help="Range partitions read in parallel")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Parallel partition readers (at most the export pool size)")
+    parser.add_argument('--compression', default='zstd')
+    args = parser.parse_args(argv)
+
+    result = export_range(
+        ship_id=args.ship_id,
+        start=args.from_date,
+        end=args.to_date,
+        out_dir=args.out,
+        layout=args.layout,
+        batch_size=args.batch_size,
+        partitions=args.partitions,
+        workers=args.workers,
+        interface_id=args.interface_id,
+        compression=args.compression
+    )
+    print(f"Exported {result['records']} records ({result['rows']} rows) "
+          f"to {len(result['files'])} file(s) in {result['seconds']:.1f}s")
+    for path in result['files']:
+        print(f"  {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,380 @@
+"""
+Bulk ingest utility module
+Loads NDJSON/CSV files into tenant.ams_bypass through COPY into a staging table,
+skipping records that already exist (ams_bypass_uq), and seeds synthetic data
+for performance testing
+
+Usage:
+    python -m utils.ingest load backfill/*.ndjson replay.csv.gz --batch-size 10000 --workers 4 --reject-file rejects.ndjson
+    python -m utils.ingest seed --ships 20 --interfaces 3 --from 2025-01-01T00:00 --to 2025-01-02T00:00
+"""
+import argparse
+import csv
+import gzip
+import json
+import queue
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import psycopg2
+
+from config import Config
+from utils.db import INGEST_COLUMNS, copy_records
+from utils.timestamps import EPOCH
+
+FORMAT_NDJSON = 'ndjson'
+FORMAT_CSV = 'csv'
+
+# Columns that may be empty (NULL)
+NULLABLE_COLUMNS = ('interface_id', 'json_data', 'server_created_time')
+
+# Errors caused by the data of some rows (bad JSON, NULL ship_id, ...); a batch that
+# fails with one of these is split to isolate the rows
+ROW_ERRORS = (psycopg2.DataError, psycopg2.IntegrityError)
+
+
+class IngestStats:
+    """Thread-safe counters for one ingest run"""
+
+    def __init__(self):
+        self.read = 0  # Records read from the source
+        self.skipped = 0  # Records without ship_id/created_time or unparsable lines
+        self.loaded = 0  # Records in successfully committed batches
+        self.inserted = 0  # Records actually inserted (loaded minus duplicates)
+        self.failed = 0  # Records that could not be loaded (rejected rows and failed batches)
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def add(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            seconds = time.monotonic() - self.started
+            return {
+                'read': self.read,
+                'skipped': self.skipped,
+                'inserted': self.inserted,
+                'duplicates': self.loaded - self.inserted,
+                'failed': self.failed,
+                'seconds': seconds,
+                'records_per_second': (self.loaded + self.failed) / seconds if seconds > 0 else 0.0
+            }
+
+
+class RejectWriter:
+    """
+    Thread-safe NDJSON file of records that could not be loaded
+
+    Each line is the normalized record plus reject_reason; the file can be loaded
+    again with 'load' once the data is fixed (reject_reason is ignored).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._handle = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def write(self, records: List[Dict[str, Any]], reason: str):
+        with self._lock:
+            for record in records:
+                self._handle.write(json.dumps(dict(record, reject_reason=reason), ensure_ascii=False, default=str))
+                self._handle.write('\n')
+            self._handle.flush()
+
+    def close(self):
+        self._handle.close()
+
+
+def format_stats(label: str, stats: Dict[str, Any]) -> str:
+    return (f"{label}: {stats['read']} read, {stats['inserted']} inserted, "
+            f"{stats['duplicates']} duplicate, {stats['skipped']} skipped, {stats['failed']} failed "
+            f"| {stats['records_per_second']:.0f} rec/s, {stats['seconds']:.1f}s")
+
+
+def detect_format(path: str) -> str:
+    """Guess the input format from the file name (.csv, otherwise NDJSON)"""
+    name = path[:-3] if path.endswith('.gz') else path
+    return FORMAT_CSV if name.lower().endswith('.csv') else FORMAT_NDJSON
+
+
+def open_text(path: str):
+    if path == '-':
+        return sys.stdin
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, 'r', encoding='utf-8', newline='')
+
+
+def normalize_record(raw: Any) -> Optional[Dict[str, Any]]:
+    """
+    Convert an input record into INGEST_COLUMNS values
+
+    json_data may be a JSON string or an object; created_time may be a timestamp
+    string (UTC) or POSIX microseconds.
+
+    Returns:
+        Dictionary for copy_records, or None if the record is unusable
+    """
+    if not isinstance(raw, dict):
+        return None
+
+    record = {}
+    for column in INGEST_COLUMNS:
+        value = raw.get(column)
+        if value == '' and column in NULLABLE_COLUMNS:
+            value = None
+        record[column] = value
+
+    if isinstance(record['json_data'], (dict, list)):
+        record['json_data'] = json.dumps(record['json_data'], ensure_ascii=False)
+
+    for column in ('created_time', 'server_created_time'):
+        value = record[column]
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            moment = EPOCH + timedelta(microseconds=int(value))
+            record[column] = moment.replace(tzinfo=None).isoformat(sep=' ')
+
+    if not record['ship_id'] or not record['created_time']:
+        return None
+    return record
+
+
+def iter_ndjson(handle) -> Iterator[Any]:
+    """Yield one object per line (None for lines that are not valid JSON)"""
+    for line in handle:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            yield None
+
+
+def iter_csv(handle) -> Iterator[Any]:
+    """Yield one dictionary per CSV row (header row names the columns)"""
+    yield from csv.DictReader(handle)
+
+
+def iter_file(path: str, fmt: Optional[str] = None) -> Iterator[Any]:
+    fmt = fmt or detect_format(path)
+    handle = open_text(path)
+    try:
+        yield from (iter_csv(handle) if fmt == FORMAT_CSV else iter_ndjson(handle))
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+
+
+def generate_records(ships: int, interfaces: int, start: datetime, end: datetime,
+                     interval_seconds: float = 1.0, tags: int = 8, seed: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Generate synthetic AMS records shaped like production data
+
+    One record per ship and interface every interval_seconds in [start, end), each
+    with tags DI/AI values plus $ship_posixmicros and $ship_sensornodeid.
+    """
+    rng = random.Random(seed)
+    ship_ids = [f"SEED{index + 1:04d}" for index in range(ships)]
+    interface_ids = [f"bypass_ECS{index + 1:02d}_{'DI' if index % 2 == 0 else 'AI'}" for index in range(interfaces)]
+    step = timedelta(seconds=interval_seconds)
+
+    moment = start
+    while moment < end:
+        micros = (moment - EPOCH.replace(tzinfo=None)) // timedelta(microseconds=1)
+        for ship_id in ship_ids:
+            for interface_id in interface_ids:
+                digital = interface_id.endswith('_DI')
+                payload = {}
+                for tag in range(tags):
+                    if digital:
+                        payload[f"DO{tag:03d}"] = {'desc': f"DO-{tag:03d} DO Digital output {tag}",
+                                                   'unit': '', 'value': rng.random() < 0.5}
+                    else:
+                        payload[f"AI{tag:03d}"] = {'desc': f"AI-{tag:03d} Analog input {tag}",
+                                                   'unit': 'bar', 'value': round(rng.uniform(0, 100), 3)}
+                payload['$ship_posixmicros'] = micros
+                payload['$ship_sensornodeid'] = interface_id
+                yield {
+                    'ship_id': ship_id,
+                    'interface_id': interface_id,
+                    'json_data': payload,
+                    'created_time': moment.isoformat(sep=' '),
+                    'server_created_time': (moment + timedelta(milliseconds=rng.randint(50, 2000))).isoformat(sep=' ')
+                }
+        moment += step
+
+
+def load_batch(batch: List[Dict[str, Any]], label: str, stats: IngestStats,
+               rejects: Optional[RejectWriter] = None):
+    """
+    Load one batch through copy_records
+
+    When the batch fails because of its data (ROW_ERRORS), it is split in halves and
+    retried until the bad records are isolated, so one bad row only rejects itself.
+    Other errors (connection lost, ...) fail the whole batch. Rejected records are
+    written to rejects if given.
+    """
+    try:
+        inserted = copy_records(batch)
+        stats.add(loaded=len(batch), inserted=inserted)
+    except ROW_ERRORS as e:
+        if len(batch) > 1:
+            middle = len(batch) // 2
+            load_batch(batch[:middle], label, stats, rejects)
+            load_batch(batch[middle:], label, stats, rejects)
+            return
+        print(f"{label}: rejected record (ship_id={batch[0].get('ship_id')}, "
+              f"created_time={batch[0].get('created_time')}): {e}")
+        stats.add(failed=1)
+        if rejects is not None:
+            rejects.write(batch, str(e).strip())
+    except Exception as e:
+        print(f"{label}: batch of {len(batch)} records failed: {e}")
+        stats.add(failed=len(batch))
+        if rejects is not None:
+            rejects.write(batch, str(e).strip())
+
+
+def run_ingest(records: Iterable[Any], label: str, batch_size: int = 10000, workers: int = 1,
+               report_interval: float = 5.0, rejects: Optional[RejectWriter] = None) -> Dict[str, Any]:
+    """
+    Load records in batches with parallel COPY workers
+
+    The caller's thread reads and batches records; workers threads each hold one
+    connection and load batches through load_batch. The queue between them is
+    bounded, so memory stays at about (workers * 2) batches. workers is capped at
+    INGEST_MAX_WORKERS, the size of the ingest connection pool.
+
+    Returns:
+        Dictionary with read, inserted, duplicates, skipped, failed, seconds and
+        records_per_second
+    """
+    if workers > Config.INGEST_MAX_WORKERS:
+        print(f"{label}: {workers} workers requested, using INGEST_MAX_WORKERS={Config.INGEST_MAX_WORKERS} "
+              f"(the ingest pool has no more connections)")
+        workers = min(workers, Config.INGEST_MAX_WORKERS)
+
+    stats = IngestStats()
+    batches = queue.Queue(maxsize=max(1, workers) * 2)
+    done = threading.Event()
+
+    def worker():
+        while True:
+            batch = batches.get()
+            if batch is None:
+                return
+            load_batch(batch, label, stats, rejects)
+
+    def reporter():
+        while not done.wait(report_interval):
+            print(format_stats(label, stats.snapshot()))
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(max(1, workers))]
+    for thread in threads:
+        thread.start()
+    if report_interval > 0:
+        threading.Thread(target=reporter, daemon=True).start()
+
+    try:
+        batch: List[Dict[str, Any]] = []
+        for raw in records:
+            stats.add(read=1)
+            record = normalize_record(raw)
+            if record is None:
+                stats.add(skipped=1)
+                continue
+            batch.append(record)
+            if len(batch) >= batch_size:
+                batches.put(batch)
+                batch = []
+        if batch:
+            batches.put(batch)
+    finally:
+        for _ in threads:
+            batches.put(None)
+        for thread in threads:
+            thread.join()
+        done.set()
+
+    return stats.snapshot()
+
+
+def parse_datetime(value: str) -> datetime:
+    """Parse YYYY-MM-DDTHH:MM or YYYY-MM-DD (UTC)"""
+    for fmt in ('%Y-%m-%dT%H:%M', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise argparse.ArgumentTypeError(f"Invalid date: {value} (expected YYYY-MM-DDTHH:MM or YYYY-MM-DD)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk load records into tenant.ams_bypass")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--batch-size', type=int, default=Config.INGEST_BATCH_SIZE,
+                        help="Records per COPY + INSERT transaction")
+    common.add_argument('--workers', type=int, default=2,
+                        help=f"Parallel COPY connections (at most INGEST_MAX_WORKERS={Config.INGEST_MAX_WORKERS})")
+    common.add_argument('--reject-file', default=None,
+                        help="Append records that could not be loaded to this NDJSON file")
+    common.add_argument('--report-interval', type=float, default=5.0,
+                        help="Seconds between progress lines (0 = summary only)")
+
+    load = subparsers.add_parser('load', parents=[common], help="Load NDJSON/CSV files (.gz allowed, - for stdin)")
+    load.add_argument('files', nargs='+')
+    load.add_argument('--format', choices=[FORMAT_NDJSON, FORMAT_CSV], default=None,
+                      help="Input format (default: from file extension)")
+
+    seed = subparsers.add_parser('seed', parents=[common], help="Insert synthetic records for performance testing")
+    seed.add_argument('--ships', type=int, default=10)
+    seed.add_argument('--interfaces', type=int, default=2)
+    seed.add_argument('--tags', type=int, default=8, help="Tags per record")
+    seed.add_argument('--from', dest='from_date', required=True, type=parse_datetime, help="Start, UTC")
+    seed.add_argument('--to', dest='to_date', required=True, type=parse_datetime, help="End, UTC (exclusive)")
+    seed.add_argument('--interval', type=float, default=1.0, help="Seconds between records per ship/interface")
+    seed.add_argument('--seed', type=int, default=None, help="Random seed for reproducible values")
+    args = parser.parse_args(argv)
+
+    results = []
+    rejects = RejectWriter(args.reject_file) if args.reject_file else None
+    try:
+        if args.command == 'load':
+            for path in args.files:
+                result = run_ingest(iter_file(path, args.format), path, args.batch_size, args.workers,
+                                    args.report_interval, rejects)
+                print(format_stats(path, result))
+                results.append(result)
+        else:
+            records = generate_records(args.ships, args.interfaces, args.from_date, args.to_date,
+                                       args.interval, args.tags, args.seed)
+            result = run_ingest(records, 'seed', args.batch_size, args.workers, args.report_interval, rejects)
+            print(format_stats('seed', result))
+            results.append(result)
+    finally:
+        if rejects is not None:
+            rejects.close()
+
+    if len(results) > 1:
+        seconds = sum(result['seconds'] for result in results)
+        total = {name: sum(result[name] for result in results)
+                 for name in ('read', 'inserted', 'duplicates', 'skipped', 'failed')}
+        total['seconds'] = seconds
+        total['records_per_second'] = (total['inserted'] + total['duplicates'] + total['failed']) / seconds if seconds > 0 else 0.0
+        print(format_stats('total', total))
+
+    return 1 if any(result['failed'] for result in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
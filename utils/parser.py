@@ -3,16 +3,32 @@ JSON parser utility module
 Handles JSON data parsing and timestamp conversion
 """
 import json
-from datetime import datetime
+import multiprocessing
+import os
+import threading
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from typing import List, Dict, Any, Optional
 
+from utils.timestamps import convert_posix_micros, convert_posix_micros_batch
 
-def parse_json_data(json_data_text: str) -> List[Dict[str, Any]]:
+# Persistent process pool for parsing large result sets (created on first use)
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+
+# Table row keys, in the order of the compact tuples returned by parse workers
+ROW_FIELDS = ('ship_id', 'tag_name', 'value', 'description', 'unit', 'posix_micros', 'created_time', 'value_type')
+
+
+def parse_json_data(json_data_text: str, convert_time: bool = True) -> List[Dict[str, Any]]:
     """
     Parse JSON text data into table rows
     
     Args:
         json_data_text: JSON string from database
+        convert_time: Format $ship_posixmicros here (False keeps the raw value so
+            callers can convert many records in one batch)
     
     Returns:
         List of dictionaries containing table row data
@@ -36,12 +52,11 @@ def parse_json_data(json_data_text: str) -> List[Dict[str, Any]]:
         
         # Handle $ship_posixmicros
         if key == '$ship_posixmicros':
-            formatted_time = convert_timestamp(value)
             rows.append({
                 'key': key,
                 'description': '-',
                 'unit': '-',
-                'value': formatted_time,
+                'value': convert_timestamp(value) if convert_time else value,
                 'value_type': 'str'
             })
             continue
@@ -85,19 +100,186 @@ def convert_timestamp(posix_micros: int) -> str:
     Returns:
         Formatted datetime string in UTC
     """
-    try:
-        # Convert microseconds to seconds
-        timestamp_seconds = posix_micros / 1_000_000
+    return convert_posix_micros(posix_micros)
+
+
+def build_table_rows(records: List[Dict[str, Any]], with_record_id: bool = False) -> List[Dict[str, Any]]:
+    """
+    Process database records into table rows (one row per JSON tag)
+
+    $ship_posixmicros values of all records are formatted in one batch
+    (vectorized when NumPy is available) instead of once per record.
+
+    Args:
+        records: List of records from execute_query
+        with_record_id: Add the record's id to each row as record_id (RealTime dedupe)
+
+    Returns:
+        List of table row dictionaries
+    """
+    all_table_rows = []
+    # (first row index, end row index, raw posix micros) per record with a timestamp
+    pending_times = []
+    for record in records:
+        ship_id_val = record.get('ship_id')
+        created_time_val = record.get('created_time')
         
-        # Create datetime object in UTC
-        from datetime import timezone
-        dt = datetime.fromtimestamp(timestamp_seconds, tz=timezone.utc)
+        # Parse JSON data
+        parsed_json = parse_json_data(record.get('json_data', ''), convert_time=False)
         
-        # Format as string (UTC)
-        formatted = dt.strftime('%Y-%m-%d %H:%M:%S.%f UTC')
+        # Extract raw $ship_posixmicros value for this record (formatted below)
+        posix_micros_value = ''
+        has_posix_micros = False
+        for json_row in parsed_json:
+            if json_row.get('key') == '$ship_posixmicros':
+                posix_micros_value = json_row.get('value', '')
+                has_posix_micros = True
+                break
         
-        return formatted
-    except (ValueError, TypeError, OSError) as e:
-        print(f"Error converting timestamp: {e}")
-        return str(posix_micros)
+        first_row = len(all_table_rows)
+        
+        if parsed_json:
+            # Create a row for each JSON key
+            for json_row in parsed_json:
+                tag_name = json_row.get('key')
+                
+                # Skip $ship_posixmicros as a separate row, it's shown in its own column
+                if tag_name == '$ship_posixmicros':
+                    continue
+                
+                all_table_rows.append({
+                    'ship_id': ship_id_val,
+                    'tag_name': tag_name,
+                    'value': json_row.get('value'),
+                    'description': json_row.get('description'),
+                    'unit': json_row.get('unit'),
+                    'posix_micros': posix_micros_value,
+                    'created_time': created_time_val,
+                    'value_type': json_row.get('value_type', 'str')
+                })
+        
+        # If no JSON data or only $ship_posixmicros, create at least one row
+        if not parsed_json or (len(parsed_json) == 1 and parsed_json[0].get('key') == '$ship_posixmicros'):
+            all_table_rows.append({
+                'ship_id': ship_id_val,
+                'tag_name': '',
+                'value': '',
+                'description': '',
+                'unit': '',
+                'posix_micros': posix_micros_value,
+                'created_time': created_time_val,
+                'value_type': 'str'
+            })
+        
+        if with_record_id:
+            for row in all_table_rows[first_row:]:
+                row['record_id'] = record.get('id')
+        
+        if has_posix_micros:
+            pending_times.append((first_row, len(all_table_rows), posix_micros_value))
+    
+    formatted_times = convert_posix_micros_batch(raw for _, _, raw in pending_times)
+    for (first_row, end_row, _), formatted in zip(pending_times, formatted_times):
+        for row in all_table_rows[first_row:end_row]:
+            row['posix_micros'] = formatted
+    
+    return all_table_rows
+
+
+class TableRows(Sequence):
+    """
+    Table rows stored as ROW_FIELDS tuples
+
+    Behaves like the list returned by build_table_rows, but the row dictionaries
+    are only built for the rows actually read (one page), not for the whole result.
+    """
 
+    def __init__(self, rows: List[tuple]):
+        self._rows = rows
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [dict(zip(ROW_FIELDS, row)) for row in self._rows[index]]
+        return dict(zip(ROW_FIELDS, self._rows[index]))
+
+
+def _build_table_rows_chunk(chunk: List[tuple]) -> List[tuple]:
+    """
+    Worker entry point: build table rows for (ship_id, created_time, json_data) tuples
+
+    Rows are returned as ROW_FIELDS tuples; unpickling tuples in the web process is
+    much cheaper than unpickling one dictionary per row.
+    """
+    records = [
+        {'ship_id': ship_id, 'created_time': created_time, 'json_data': json_data}
+        for ship_id, created_time, json_data in chunk
+    ]
+    return [tuple(row[field] for field in ROW_FIELDS) for row in build_table_rows(records)]
+
+
+def get_parse_pool(max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """
+    Get the persistent parse process pool
+
+    Workers are started with forkserver (spawn where unavailable) so they do not
+    inherit the web server's threads, locks or database sockets.
+    """
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            _parse_pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=context)
+        return _parse_pool
+
+
+def shutdown_parse_pool():
+    """Shut down the parse process pool (a new one is created on next use)"""
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is not None:
+            _parse_pool.shutdown(wait=False, cancel_futures=True)
+            _parse_pool = None
+
+
+def build_table_rows_parallel(records: List[Dict[str, Any]], threshold: int = 2000,
+                              chunk_size: int = 500, max_workers: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Process database records into table rows, in parallel for large result sets
+
+    Records are split into chunks and parsed in a process pool, sidestepping the
+    GIL. Chunk results are concatenated in submission order, so the rows keep the
+    order of the input records (created_time DESC for searches). Parsing stays
+    inline on a single CPU, where a pool only adds pickling overhead.
+
+    Args:
+        records: List of records from execute_query
+        threshold: Below this many records parsing stays inline
+        chunk_size: Records per worker task
+        max_workers: Process pool size (default: CPU count)
+
+    Returns:
+        List of table row dictionaries (build_table_rows), or a TableRows sequence
+        of the same rows when parsed in the pool
+    """
+    if len(records) < threshold or chunk_size <= 0 or max_workers == 1 or (os.cpu_count() or 1) <= 1:
+        return build_table_rows(records)
+
+    # Send only the fields the worker needs to keep pickling cheap
+    fields = [(r.get('ship_id'), r.get('created_time'), r.get('json_data', '')) for r in records]
+    chunks = [fields[i:i + chunk_size] for i in range(0, len(fields), chunk_size)]
+
+    try:
+        pool = get_parse_pool(max_workers)
+        all_table_rows = []
+        # map() yields results in submission order
+        for chunk_rows in pool.map(_build_table_rows_chunk, chunks):
+            all_table_rows.extend(chunk_rows)
+        return TableRows(all_table_rows)
+    except (BrokenProcessPool, OSError, RuntimeError) as e:
+        print(f"Parallel parse failed, parsing inline: {e}")
+        shutdown_parse_pool()
+        return build_table_rows(records)
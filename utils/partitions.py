@@ -0,0 +1,540 @@
+"""
+Partition management utility module
+Range-partitions tenant.ams_bypass by created_time (daily or monthly), creates
+future partitions ahead of time and detaches/drops partitions past retention
+
+Range scans only touch the partitions overlapping the searched window, and
+vacuum works per partition, so both scale with the window instead of the table.
+execute_query and range_validator need no change: their created_time bounds
+are constants, which lets the planner prune partitions.
+
+Usage:
+    python -m utils.partitions status
+    python -m utils.partitions migrate --interval daily        # one-time, keeps the old table
+    python -m utils.partitions maintain --premake 7 --retention 365 --drop   # from cron
+"""
+import argparse
+import re
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import Config
+from utils.db import WORKLOAD_MAINTENANCE, get_db_connection
+
+config = Config()
+
+INTERVAL_DAILY = 'daily'
+INTERVAL_MONTHLY = 'monthly'
+
+COLUMNS = 'id, ship_id, interface_id, json_data, created_time, server_created_time'
+
+_BOUND_PATTERN = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+_INDEX_TARGET_PATTERN = re.compile(r" INDEX \S+ ON (ONLY )?\S+ ")
+
+# PostgreSQL identifiers are truncated at 63 bytes
+MAX_IDENTIFIER = 63
+
+
+def qualified(name: str) -> str:
+    return f"{config.DB_SCHEMA}.{name}"
+
+
+def floor_period(moment: datetime, interval: str) -> datetime:
+    """Start of the partition period containing moment"""
+    moment = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    return moment.replace(day=1) if interval == INTERVAL_MONTHLY else moment
+
+
+def next_period(start: datetime, interval: str) -> datetime:
+    """Start of the partition period after the one starting at start"""
+    if interval == INTERVAL_MONTHLY:
+        return (start.replace(day=1) + timedelta(days=32)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def shift_periods(start: datetime, interval: str, count: int) -> datetime:
+    """Move a period start count periods forward (or backward if negative)"""
+    if interval == INTERVAL_MONTHLY:
+        month = start.year * 12 + start.month - 1 + count
+        return start.replace(year=month // 12, month=month % 12 + 1, day=1)
+    return start + timedelta(days=count)
+
+
+def partition_name(start: datetime, interval: str) -> str:
+    """ams_bypass_p20250101 (daily) or ams_bypass_p202501 (monthly)"""
+    suffix = start.strftime('%Y%m') if interval == INTERVAL_MONTHLY else start.strftime('%Y%m%d')
+    return f"{config.DB_TABLE}_p{suffix}"
+
+
+def default_partition_name() -> str:
+    return f"{config.DB_TABLE}_default"
+
+
+def suffixed(name: str, suffix: str) -> str:
+    """name + suffix, shortening name so the result fits an identifier"""
+    return name[:MAX_IDENTIFIER - len(suffix)] + suffix
+
+
+def quote_role(role: str) -> str:
+    return role if role == 'PUBLIC' else '"' + role.replace('"', '""') + '"'
+
+
+def table_reloptions(cursor, table: str) -> List[str]:
+    """Storage parameters of a table (e.g. ['fillfactor=90'])"""
+    cursor.execute("SELECT reloptions FROM pg_class WHERE oid = %s::regclass", [qualified(table)])
+    row = cursor.fetchone()
+    return list(row[0] or []) if row else []
+
+
+def secondary_indexes(cursor, table: str) -> List[Tuple[str, str]]:
+    """
+    Indexes of a table that do not back a constraint (primary key, unique)
+
+    Returns:
+        List of (index name, CREATE INDEX statement)
+    """
+    cursor.execute("""
+        SELECT i.relname, pg_get_indexdef(x.indexrelid)
+        FROM pg_index x
+        JOIN pg_class i ON i.oid = x.indexrelid
+        WHERE x.indrelid = %s::regclass
+            AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = x.indexrelid)
+        ORDER BY i.relname
+    """, [qualified(table)])
+    return cursor.fetchall()
+
+
+def is_partitioned(cursor, table: str = None) -> bool:
+    cursor.execute("""
+        SELECT EXISTS (
+            SELECT 1 FROM pg_partitioned_table p
+            JOIN pg_class c ON c.oid = p.partrelid
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = %s AND c.relname = %s
+        )
+    """, [config.DB_SCHEMA, table or config.DB_TABLE])
+    return cursor.fetchone()[0]
+
+
+def list_partitions(cursor, table: str = None) -> List[Dict[str, Any]]:
+    """
+    List the partitions of a partitioned table
+
+    Returns:
+        List of dictionaries (name, lower, upper, is_default, rows, bytes) ordered by lower bound;
+        rows is the planner estimate
+    """
+    cursor.execute("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples::bigint,
+               pg_total_relation_size(c.oid)
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = %s::regclass
+    """, [qualified(table or config.DB_TABLE)])
+
+    partitions = []
+    for name, bound, rows, size in cursor.fetchall():
+        match = _BOUND_PATTERN.search(bound or '')
+        partitions.append({
+            'name': name,
+            'lower': datetime.fromisoformat(match.group(1)) if match else None,
+            'upper': datetime.fromisoformat(match.group(2)) if match else None,
+            'is_default': bound == 'DEFAULT',
+            'rows': max(rows, 0),
+            'bytes': size
+        })
+    partitions.sort(key=lambda p: (p['lower'] is None, p['lower'] or datetime.min))
+    return partitions
+
+
+def create_partition(cursor, lower: datetime, upper: datetime, name: str, table: str = None):
+    """
+    Create the partition [lower, upper) of a table
+
+    Rows already sitting in the default partition for that range are moved into
+    the new partition (attaching would fail otherwise).
+    """
+    parent = qualified(table or config.DB_TABLE)
+    bounds = [lower.isoformat(sep=' '), upper.isoformat(sep=' ')]
+    default = next((p['name'] for p in list_partitions(cursor, table) if p['is_default']), None)
+
+    # A partitioned parent cannot hold storage parameters; migrate puts the original
+    # table's on the default partition, and new partitions take them from there
+    storage = ''
+    has_default_rows = False
+    if default:
+        reloptions = table_reloptions(cursor, default)
+        storage = f" WITH ({', '.join(reloptions)})" if reloptions else ''
+        cursor.execute(f"""
+            SELECT EXISTS (SELECT 1 FROM {qualified(default)} WHERE created_time >= %s AND created_time < %s)
+        """, bounds)
+        has_default_rows = cursor.fetchone()[0]
+
+    if not has_default_rows:
+        cursor.execute(f"CREATE TABLE {qualified(name)} PARTITION OF {parent} "
+                       f"FOR VALUES FROM (%s) TO (%s){storage}", bounds)
+        return
+
+    cursor.execute(f"CREATE TABLE {qualified(name)} (LIKE {parent} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+                   f"{storage}")
+    cursor.execute(f"""
+        WITH moved AS (
+            DELETE FROM {qualified(default)}
+            WHERE created_time >= %s AND created_time < %s
+            RETURNING {COLUMNS}
+        )
+        INSERT INTO {qualified(name)} ({COLUMNS}) SELECT {COLUMNS} FROM moved
+    """, bounds)
+    print(f"Moved {cursor.rowcount} rows from {default} into {name}")
+    cursor.execute(f"ALTER TABLE {parent} ATTACH PARTITION {qualified(name)} "
+                   f"FOR VALUES FROM (%s) TO (%s)", bounds)
+
+
+def ensure_partitions(interval: str, start: datetime, end: datetime, table: str = None) -> List[str]:
+    """
+    Create missing partitions so that every period overlapping [start, end) exists
+
+    Each partition is created in its own transaction.
+
+    Returns:
+        Names of the partitions created
+    """
+    created = []
+    with get_db_connection(WORKLOAD_MAINTENANCE) as conn:
+        with conn.cursor() as cursor:
+            existing = {p['lower'] for p in list_partitions(cursor, table) if not p['is_default']}
+            conn.commit()
+
+            period = floor_period(start, interval)
+            while period < end:
+                upper = next_period(period, interval)
+                if period not in existing:
+                    try:
+                        create_partition(cursor, period, upper, partition_name(period, interval), table)
+                        conn.commit()
+                        created.append(partition_name(period, interval))
+                    except Exception:
+                        conn.rollback()
+                        raise
+                period = upper
+    return created
+
+
+def apply_retention(interval: str, keep: int, drop: bool = False, concurrently: bool = False,
+                    now: Optional[datetime] = None) -> List[str]:
+    """
+    Detach (and optionally drop) partitions entirely older than keep periods
+
+    Each partition is detached in its own transaction, so when one fails the
+    partitions before it stay detached (they are reported before re-raising).
+
+    Args:
+        interval: Partition interval
+        keep: Number of past periods to keep besides the current one
+        drop: Drop detached partitions (otherwise they stay as standalone tables)
+        concurrently: DETACH ... CONCURRENTLY (PostgreSQL 14+, does not block queries);
+                      PostgreSQL refuses it while the table has a default partition
+
+    Returns:
+        Names of the partitions detached
+    """
+    cutoff = shift_periods(floor_period(now or datetime.now(timezone.utc).replace(tzinfo=None), interval), interval, -keep)
+    parent = qualified(config.DB_TABLE)
+    detached = []
+
+    with get_db_connection(WORKLOAD_MAINTENANCE) as conn:
+        with conn.cursor() as cursor:
+            partitions = list_partitions(cursor)
+            conn.commit()
+
+            default = next((p['name'] for p in partitions if p['is_default']), None)
+            if concurrently and default:
+                raise RuntimeError(f"DETACH PARTITION CONCURRENTLY is not possible while {parent} has a "
+                                   f"default partition ({default}); run maintain without --concurrently")
+
+            expired = [p for p in partitions if not p['is_default'] and p['upper'] and p['upper'] <= cutoff]
+
+            # CONCURRENTLY cannot run inside a transaction block
+            conn.autocommit = concurrently
+            try:
+                for partition in expired:
+                    name = qualified(partition['name'])
+                    try:
+                        cursor.execute(f"ALTER TABLE {parent} DETACH PARTITION {name}"
+                                       f"{' CONCURRENTLY' if concurrently else ''}")
+                        if drop:
+                            cursor.execute(f"DROP TABLE {name}")
+                        if not concurrently:
+                            conn.commit()
+                    except Exception as e:
+                        if not concurrently:
+                            conn.rollback()
+                        done = ', '.join(detached) or 'none'
+                        print(f"Retention stopped at {partition['name']}: {e}")
+                        print(f"Already {'dropped' if drop else 'detached'} (not rolled back): {done}")
+                        if concurrently:
+                            print(f"If {partition['name']} is left pending detach, finish it with: "
+                                  f"ALTER TABLE {parent} DETACH PARTITION {name} FINALIZE")
+                        raise
+                    detached.append(partition['name'])
+                    print(f"{'Dropped' if drop else 'Detached'} {partition['name']} "
+                          f"({partition['lower']:%Y-%m-%d} - {partition['upper']:%Y-%m-%d}, ~{partition['rows']} rows)")
+            finally:
+                conn.autocommit = False
+    return detached
+
+
+def maintain(interval: str, premake: int, retention: int = 0, drop: bool = False,
+             concurrently: bool = False) -> Dict[str, List[str]]:
+    """
+    Routine maintenance: create the next premake periods' partitions and apply retention
+
+    Returns:
+        Dictionary with created and detached partition names
+    """
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    current = floor_period(now, interval)
+    created = ensure_partitions(interval, current, shift_periods(current, interval, premake + 1))
+    detached = apply_retention(interval, retention, drop, concurrently, now) if retention > 0 else []
+    return {'created': created, 'detached': detached}
+
+
+def create_partitioned_table(cursor, name: str, source: str):
+    """
+    Create an empty partitioned copy of a table
+
+    Columns, defaults (ids still come from the same sequence), check constraints
+    and comments are copied with LIKE; the other indexes, grants and the table
+    comment are read from the catalog and recreated. Index names get a _new suffix
+    until migrate swaps the tables. Storage parameters go to the default partition.
+    """
+    # Unique constraints on a partitioned table must include the partition key,
+    # so the primary key becomes (id, created_time)
+    cursor.execute(f"""
+        CREATE TABLE {qualified(name)} (
+            LIKE {qualified(source)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING COMMENTS
+                INCLUDING STORAGE INCLUDING STATISTICS,
+            CONSTRAINT {name}_pkey PRIMARY KEY (id, created_time),
+            CONSTRAINT {name}_uq UNIQUE (ship_id, interface_id, created_time)
+        ) PARTITION BY RANGE (created_time)
+    """)
+
+    for index_name, definition in secondary_indexes(cursor, source):
+        if definition.startswith('CREATE UNIQUE') and 'created_time' not in definition:
+            print(f"Skipped unique index {index_name}: a partitioned table needs created_time in it ({definition})")
+            continue
+        target = f" INDEX {suffixed(index_name, '_new')} ON {qualified(name)} "
+        cursor.execute(_INDEX_TARGET_PATTERN.sub(lambda match: target, definition, count=1))
+
+    cursor.execute("""
+        SELECT grantee, string_agg(privilege_type, ', ')
+        FROM information_schema.role_table_grants
+        WHERE table_schema = %s AND table_name = %s
+        GROUP BY grantee
+    """, [config.DB_SCHEMA, source])
+    for grantee, privileges in cursor.fetchall():
+        cursor.execute(f"GRANT {privileges} ON {qualified(name)} TO {quote_role(grantee)}")
+
+    cursor.execute("SELECT obj_description(%s::regclass, 'pg_class')", [qualified(source)])
+    comment = cursor.fetchone()[0]
+    if comment:
+        cursor.execute(f"COMMENT ON TABLE {qualified(name)} IS %s", [comment])
+
+    reloptions = table_reloptions(cursor, source)
+    storage = f" WITH ({', '.join(reloptions)})" if reloptions else ''
+    cursor.execute(f"CREATE TABLE {qualified(default_partition_name())} PARTITION OF {qualified(name)} "
+                   f"DEFAULT{storage}")
+
+
+def wait_for_transactions(conn, xid: int, report_seconds: float = 30.0):
+    """
+    Wait until every transaction with an id below xid has committed or rolled back
+
+    Record ids are allocated before commit; once the writers that were running when
+    max(id) was read have finished, every row up to that id is visible.
+    """
+    started = time.monotonic()
+    reported = started
+    with conn.cursor() as cursor:
+        while True:
+            cursor.execute("SELECT txid_snapshot_xmin(txid_current_snapshot()) >= %s", [xid])
+            finished = cursor.fetchone()[0]
+            conn.rollback()
+            if finished:
+                return
+            if time.monotonic() - reported >= report_seconds:
+                reported = time.monotonic()
+                print(f"Waiting {reported - started:.0f}s for transactions older than xid {xid} "
+                      f"(see pg_stat_activity for long-running transactions)")
+            time.sleep(1)
+
+
+def migrate(interval: str, premake: int = 7, chunk_periods: int = 1) -> Dict[str, Any]:
+    """
+    Migrate the plain ams_bypass table to a range-partitioned one
+
+    1. Create ams_bypass_new (partitioned, same indexes, grants and comments) with
+       partitions from the oldest row to premake periods ahead.
+    2. Wait for the writers running when max(id) was read, so that every row up to
+       it is committed, then copy those rows in chunks of chunk_periods periods, one
+       transaction each (re-running skips rows already copied).
+    3. Under an exclusive lock, copy rows inserted meanwhile and swap the table and
+       index names. The old table stays as ams_bypass_unpartitioned (its indexes
+       with an _unpartitioned suffix) until dropped by hand.
+
+    Returns:
+        Dictionary with copied rows, partitions created and seconds
+    """
+    started = time.monotonic()
+    table = config.DB_TABLE
+    new_table = f"{table}_new"
+    old_table = f"{table}_unpartitioned"
+
+    with get_db_connection(WORKLOAD_MAINTENANCE) as conn:
+        with conn.cursor() as cursor:
+            if is_partitioned(cursor):
+                raise RuntimeError(f"{qualified(table)} is already partitioned")
+
+            cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [qualified(table)])
+            sequence = cursor.fetchone()[0]
+            cursor.execute(f"SELECT MIN(created_time), MAX(created_time), MAX(id) FROM {qualified(table)}")
+            min_time, max_time, max_id = cursor.fetchone()
+            max_id = max_id or 0
+
+            cursor.execute("SELECT to_regclass(%s)", [qualified(new_table)])
+            if cursor.fetchone()[0] is None:
+                create_partitioned_table(cursor, new_table, table)
+            conn.commit()
+
+            # Read after max(id): a writer that allocated an id up to max_id is older than this
+            cursor.execute("SELECT txid_snapshot_xmax(txid_current_snapshot())")
+            snapshot_xmax = cursor.fetchone()[0]
+            conn.rollback()
+        wait_for_transactions(conn, snapshot_xmax)
+
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    first = floor_period(min_time or now, interval)
+    last = shift_periods(floor_period(max(max_time or now, now), interval), interval, premake + 1)
+    created = ensure_partitions(interval, first, last, new_table)
+    print(f"Created {len(created)} partitions ({first:%Y-%m-%d} - {last:%Y-%m-%d})")
+
+    copied = 0
+    with get_db_connection(WORKLOAD_MAINTENANCE) as conn:
+        with conn.cursor() as cursor:
+            chunk_start = first
+            while chunk_start < last:
+                chunk_end = shift_periods(chunk_start, interval, chunk_periods)
+                try:
+                    cursor.execute(f"""
+                        INSERT INTO {qualified(new_table)} ({COLUMNS})
+                        SELECT {COLUMNS} FROM {qualified(table)}
+                        WHERE created_time >= %s AND created_time < %s AND id <= %s
+                        ON CONFLICT DO NOTHING
+                    """, [chunk_start, chunk_end, max_id])
+                    copied += cursor.rowcount
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                print(f"Copied {chunk_start:%Y-%m-%d} - {chunk_end:%Y-%m-%d}: {cursor.rowcount} rows")
+                chunk_start = chunk_end
+
+            # Rows outside [first, last) (far-future clocks) go to the default partition
+            try:
+                cursor.execute(f"""
+                    INSERT INTO {qualified(new_table)} ({COLUMNS})
+                    SELECT {COLUMNS} FROM {qualified(table)}
+                    WHERE (created_time < %s OR created_time >= %s) AND id <= %s
+                    ON CONFLICT DO NOTHING
+                """, [first, last, max_id])
+                copied += cursor.rowcount
+
+                # Swap: writers wait on the lock for the duration of the catch-up copy only.
+                # Every row up to max_id was committed before the chunks were copied, so
+                # only rows above it can be missing
+                cursor.execute(f"LOCK TABLE {qualified(table)} IN ACCESS EXCLUSIVE MODE")
+                cursor.execute(f"""
+                    INSERT INTO {qualified(new_table)} ({COLUMNS})
+                    SELECT {COLUMNS} FROM {qualified(table)}
+                    WHERE id > %s
+                    ON CONFLICT DO NOTHING
+                """, [max_id])
+                copied += cursor.rowcount
+                cursor.execute(f"ALTER TABLE {qualified(table)} RENAME TO {old_table}")
+                cursor.execute(f"ALTER TABLE {qualified(old_table)} RENAME CONSTRAINT {table}_pkey TO {old_table}_pkey")
+                cursor.execute(f"ALTER TABLE {qualified(old_table)} RENAME CONSTRAINT {table}_uq TO {old_table}_uq")
+                cursor.execute(f"ALTER TABLE {qualified(new_table)} RENAME TO {table}")
+                cursor.execute(f"ALTER TABLE {qualified(table)} RENAME CONSTRAINT {new_table}_pkey TO {table}_pkey")
+                cursor.execute(f"ALTER TABLE {qualified(table)} RENAME CONSTRAINT {new_table}_uq TO {table}_uq")
+                for index_name, _ in secondary_indexes(cursor, old_table):
+                    cursor.execute(f"ALTER INDEX {qualified(index_name)} "
+                                   f"RENAME TO {suffixed(index_name, '_unpartitioned')}")
+                    cursor.execute(f"ALTER INDEX IF EXISTS {qualified(suffixed(index_name, '_new'))} "
+                                   f"RENAME TO {index_name}")
+                cursor.execute(f"ALTER SEQUENCE {sequence} OWNED BY {qualified(table)}.id")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    return {'copied': copied, 'partitions': len(created), 'seconds': time.monotonic() - started}
+
+
+def status() -> Tuple[bool, List[Dict[str, Any]]]:
+    """Get (is_partitioned, partitions) for ams_bypass"""
+    with get_db_connection(WORKLOAD_MAINTENANCE) as conn:
+        with conn.cursor() as cursor:
+            partitioned = is_partitioned(cursor)
+            partitions = list_partitions(cursor) if partitioned else []
+        conn.rollback()
+    return partitioned, partitions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage time partitions of tenant.ams_bypass")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--interval', choices=[INTERVAL_DAILY, INTERVAL_MONTHLY], default=Config.PARTITION_INTERVAL)
+    common.add_argument('--premake', type=int, default=Config.PARTITION_PREMAKE,
+                        help="Future periods to create ahead of time")
+
+    subparsers.add_parser('status', help="List partitions")
+
+    migrate_parser = subparsers.add_parser('migrate', parents=[common],
+                                           help="Convert the plain table to a partitioned one")
+    migrate_parser.add_argument('--chunk-periods', type=int, default=1, help="Periods copied per transaction")
+
+    maintain_parser = subparsers.add_parser('maintain', parents=[common],
+                                            help="Create future partitions and apply retention (run from cron)")
+    maintain_parser.add_argument('--retention', type=int, default=Config.PARTITION_RETENTION,
+                                 help="Past periods to keep (0 = keep all)")
+    maintain_parser.add_argument('--drop', action='store_true', default=Config.PARTITION_RETENTION_DROP,
+                                 help="Drop expired partitions instead of only detaching them")
+    maintain_parser.add_argument('--concurrently', action='store_true',
+                                 help="DETACH PARTITION CONCURRENTLY (PostgreSQL 14+, only for tables "
+                                      "without a default partition)")
+    args = parser.parse_args(argv)
+
+    if args.command == 'status':
+        partitioned, partitions = status()
+        if not partitioned:
+            print(f"{qualified(config.DB_TABLE)} is not partitioned")
+            return
+        for partition in partitions:
+            bounds = 'DEFAULT' if partition['is_default'] else f"{partition['lower']} - {partition['upper']}"
+            print(f"{partition['name']:<28} {bounds:<44} ~{partition['rows']:>12} rows "
+                  f"{partition['bytes'] / 1024 / 1024:>10.1f} MB")
+    elif args.command == 'migrate':
+        result = migrate(args.interval, args.premake, args.chunk_periods)
+        print(f"Migrated {result['copied']} rows into {result['partitions']} partitions "
+              f"in {result['seconds']:.1f}s; old table kept as {config.DB_TABLE}_unpartitioned")
+    else:
+        result = maintain(args.interval, args.premake, args.retention, args.drop, args.concurrently)
+        print(f"Created {len(result['created'])} partition(s), "
+              f"{'dropped' if args.drop else 'detached'} {len(result['detached'])} partition(s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+Profiling utility module
+Sampling stack profiler for request threads and a bounded on-disk store of
+slow-request captures
+"""
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+_RECORD_ID = re.compile(r'^[0-9]{13}-[0-9]+-[0-9]+$')
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler for selected threads
+
+    One background thread samples the Python stack of every registered thread
+    each interval seconds (sys._current_frames) and counts identical stacks. It
+    sleeps while no thread is registered, so idle cost is zero.
+    """
+
+    def __init__(self, interval: float = 0.01, max_depth: int = 40):
+        self.interval = interval
+        self.max_depth = max_depth
+        self._targets = {}  # thread id -> Counter of stacks
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def start(self) -> Counter:
+        """Start sampling the calling thread"""
+        samples = Counter()
+        with self._lock:
+            self._targets[threading.get_ident()] = samples
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+        return samples
+
+    def stop(self) -> Counter:
+        """Stop sampling the calling thread and return its stack counts"""
+        with self._lock:
+            return self._targets.pop(threading.get_ident(), None) or Counter()
+
+    def _run(self):
+        while True:
+            self._wakeup.clear()
+            with self._lock:
+                targets = dict(self._targets)
+            if not targets:
+                self._wakeup.wait()
+                continue
+
+            frames = sys._current_frames()
+            for thread_id, samples in targets.items():
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    samples[self._stack(frame)] += 1
+            time.sleep(self.interval)
+
+    def _stack(self, frame) -> tuple:
+        """Stack as (outermost, ..., innermost) 'function (file:line)' entries"""
+        entries = []
+        while frame is not None and len(entries) < self.max_depth:
+            code = frame.f_code
+            entries.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        return tuple(reversed(entries))
+
+
+def summarize_profile(samples: Counter, interval: float, top: int = 25) -> Dict[str, Any]:
+    """
+    Reduce stack counts to the hottest stacks and functions
+
+    Returns:
+        Dictionary with samples, interval_ms, stacks (folded, most frequent first)
+        and functions (innermost frame counts, i.e. where time was spent)
+    """
+    leaves = Counter()
+    for stack, count in samples.items():
+        if stack:
+            leaves[stack[-1]] += count
+    return {
+        'samples': sum(samples.values()),
+        'interval_ms': round(interval * 1000, 1),
+        'stacks': [{'stack': ';'.join(stack), 'count': count} for stack, count in samples.most_common(top)],
+        'functions': [{'function': name, 'count': count} for name, count in leaves.most_common(top)]
+    }
+
+
+class SlowRequestStore:
+    """
+    Bounded on-disk ring of slow-request captures
+
+    Each capture is one JSON file; when more than max_entries exist the oldest are
+    removed. File names sort by capture time, so several worker processes can share
+    one directory.
+    """
+
+    def __init__(self, directory: str, max_entries: int = 200):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def _path(self, record_id: str) -> str:
+        return os.path.join(self.directory, f"{record_id}.json")
+
+    def _write(self, record_id: str, record: Dict[str, Any]):
+        path = self._path(record_id)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(record, f, default=str)
+        os.replace(temp_path, path)
+
+    def _ids(self) -> List[str]:
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(name[:-5] for name in names if name.endswith('.json') and _RECORD_ID.match(name[:-5]))
+
+    def save(self, record: Dict[str, Any]) -> str:
+        """Store a capture and evict the oldest beyond max_entries; returns its id"""
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            self._counter += 1
+            record_id = f"{int(time.time() * 1000):013d}-{os.getpid()}-{self._counter}"
+        record['id'] = record_id
+        self._write(record_id, record)
+
+        if self.max_entries > 0:
+            for old_id in self._ids()[:-self.max_entries]:
+                try:
+                    os.remove(self._path(old_id))
+                except FileNotFoundError:
+                    pass
+        return record_id
+
+    def get(self, record_id: str) -> Optional[Dict[str, Any]]:
+        if not _RECORD_ID.match(record_id or ''):
+            return None
+        try:
+            with open(self._path(record_id), encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def update(self, record: Dict[str, Any]):
+        """Rewrite an existing capture (e.g. after adding an EXPLAIN)"""
+        if _RECORD_ID.match(record.get('id', '')):
+            self._write(record['id'], record)
+
+    def list(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """Get summaries of the newest captures (without queries and profile)"""
+        summaries = []
+        for record_id in reversed(self._ids()[-limit:]):
+            record = self.get(record_id)
+            if record is None:
+                continue
+            summary = {key: value for key, value in record.items() if key not in ('queries', 'profile')}
+            summary['query_count'] = len(record.get('queries', []))
+            summary['query_ms'] = round(sum(q.get('ms', 0) for q in record.get('queries', [])), 1)
+            summaries.append(summary)
+        return summaries
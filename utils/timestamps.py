@@ -0,0 +1,138 @@
+"""
+Timestamp utility module
+Cached timezone lookup, local <-> UTC conversion and batch $ship_posixmicros formatting
+"""
+import os
+from datetime import datetime, timedelta, timezone, tzinfo
+from functools import lru_cache
+from typing import Iterable, List, Optional
+
+try:
+    from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+except ImportError:  # Python 3.8: fixed-offset fallback only
+    ZoneInfo = None
+    ZoneInfoNotFoundError = KeyError
+
+try:
+    import numpy as np
+except ImportError:  # Optional dependency, pure Python fallback is used
+    np = None
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+POSIX_MICROS_FORMAT = '%Y-%m-%d %H:%M:%S.%f UTC'
+
+
+def _server_zone_name() -> Optional[str]:
+    """Resolve the server's IANA zone name (TZ, /etc/timezone or /etc/localtime link)"""
+    name = os.environ.get('TZ', '').lstrip(':')
+    if name:
+        return name
+
+    try:
+        with open('/etc/timezone') as f:
+            name = f.read().strip()
+            if name:
+                return name
+    except OSError:
+        pass
+
+    try:
+        target = os.path.realpath('/etc/localtime')
+        marker = '/zoneinfo/'
+        if marker in target:
+            return target.split(marker, 1)[1]
+    except OSError:
+        pass
+
+    return None
+
+
+@lru_cache(maxsize=64)
+def get_timezone(name: Optional[str] = None) -> tzinfo:
+    """
+    Get a (cached) tzinfo for an IANA zone name, or the server's zone if name is empty
+
+    ZoneInfo zones are DST-aware: the offset is chosen per converted datetime rather
+    than once per process. Without zoneinfo (or for an unknown server zone) the
+    server's current fixed offset is used.
+
+    Raises:
+        ValueError: If name is not a known zone
+    """
+    if name:
+        if ZoneInfo is None:
+            if name.upper() in ('UTC', 'ETC/UTC'):
+                return timezone.utc
+            raise ValueError(f"Time zone {name} requires Python 3.9+ (zoneinfo)")
+        try:
+            return ZoneInfo(name)
+        except (ZoneInfoNotFoundError, ValueError) as e:
+            raise ValueError(f"Unknown time zone: {name}") from e
+
+    server_name = _server_zone_name()
+    if server_name and ZoneInfo is not None:
+        try:
+            return ZoneInfo(server_name)
+        except (ZoneInfoNotFoundError, ValueError):
+            pass
+
+    return datetime.now().astimezone().tzinfo
+
+
+def is_valid_timezone(name: str) -> bool:
+    """Check whether a zone name can be used with get_timezone"""
+    try:
+        get_timezone(name)
+        return True
+    except ValueError:
+        return False
+
+
+def local_to_utc(local_dt: datetime, tz: Optional[tzinfo] = None) -> datetime:
+    """
+    Interpret a naive wall-clock datetime in tz and convert it to aware UTC
+
+    Args:
+        local_dt: Naive datetime (wall clock time in tz)
+        tz: Time zone (default: server zone)
+    """
+    tz = tz or get_timezone()
+    return local_dt.replace(tzinfo=tz).astimezone(timezone.utc)
+
+
+def convert_posix_micros(posix_micros) -> str:
+    """
+    Convert POSIX microseconds to 'YYYY-MM-DD HH:MM:SS.ffffff UTC'
+
+    Uses integer microsecond arithmetic (no float rounding).
+    """
+    try:
+        dt = EPOCH + timedelta(microseconds=int(posix_micros))
+        return dt.strftime(POSIX_MICROS_FORMAT)
+    except (ValueError, TypeError, OverflowError) as e:
+        print(f"Error converting timestamp: {e}")
+        return str(posix_micros)
+
+
+def convert_posix_micros_batch(values: Iterable) -> List[str]:
+    """
+    Convert many POSIX microsecond values in one call
+
+    With NumPy the conversion is vectorized (datetime64[us]); invalid entries fall
+    back to the scalar conversion. Output matches convert_posix_micros.
+    """
+    values = list(values)
+    if not values:
+        return []
+
+    if np is not None:
+        valid = [isinstance(v, int) and not isinstance(v, bool) for v in values]
+        if all(valid):
+            try:
+                stamps = np.array(values, dtype='int64').astype('datetime64[us]')
+                text = np.datetime_as_string(stamps, unit='us')
+                return [t.replace('T', ' ') + ' UTC' for t in text.tolist()]
+            except (OverflowError, ValueError):
+                pass
+
+    return [convert_posix_micros(v) for v in values]